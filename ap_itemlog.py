@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-import dateparser
+import argparse
+import asyncio
 import json
 import time
 import regex as re
@@ -10,91 +11,80 @@ import sys
 import ast
 import logging
 from collections import defaultdict
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Iterable
 import socket
 import requests
 import fnmatch
+import hashlib
 import threading
+import gc
+import gzip
+import pickle
 import yaml
-from cmds.ap_scripts.utils import Game, Item, Player, PlayerSettings, handle_item_tracking, handle_location_tracking, handle_location_hinting
+from cmds.ap_scripts.utils import Game, Item, Player, PlayerSettings, handle_item_tracking, handle_location_tracking, handle_location_hinting, location_registry, preload_games, apply_db_changes
 from cmds.ap_scripts.emitter import event_emitter
+from cmds.ap_scripts.logtail import LogTail
+from cmds.ap_scripts.delivery import WebhookDelivery
+from cmds.ap_scripts.budget import HostBudget
+from cmds.ap_scripts.spool import MessageSpool
+from cmds.ap_scripts.ipc import TrackerServer, socket_path
+from cmds.ap_scripts.logparse import LogLineClassifier, parse_log_timestamp
+from cmds.db_helpers import pool
+from cmds.ap_scripts.spoiler import iter_spoiler_lines, parse_spoiler_log, load_cached_spoiler, cache_spoiler, SeedInfo, WorldSetting, PlayerSetting, LocationPlacement, StartingItem, JigsawSetting, WildPokemon
 from word2number import w2n
-from flask import Flask, jsonify, Response
-import psycopg2 as psql
-
-
-with open('config.yaml', 'r', encoding='UTF-8') as file:
-    cfg = yaml.safe_load(file)
-
-sqlcfg = cfg['bot']['psql']
-try:
-    sqlcon = psql.connect(
-        dbname=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port']
-    )
-except psql.OperationalError:
-    # TODO Disable commands that need SQL connectivity
-    sqlcon = False
+from flask import Flask, jsonify, Response, request
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.serving import run_simple
+
 
 # Disclaimer: Copilot helped me with the initial setup of this file.
 # Everything since is my own code. Thank you :-)
 
-# URL of the log file and Discord webhook URL from environment variables
-log_url = os.getenv('LOG_URL')
-webhook_urls = [os.getenv('WEBHOOK_URL')]
-session_cookie = os.getenv('SESSION_COOKIE')
-
-# Extra info for additional features
-seed_url = os.getenv('SPOILER_URL')
-msg_webhooks = [os.getenv('MSGHOOK_URL')]
-
-# Pull extra configuration if this itemlog is stored in config.yaml, by checking the log_url
-for log in cfg['bot']['archipelago']['itemlogs']:
-    if log['log_url'] == log_url:
-        if 'webhooks' in log and len(log['webhooks']) > 1:
-            webhook_urls.extend(log['webhooks'][1:])
-        if 'msghooks' in log and len(log['msghooks']) > 1:
-            msg_webhooks.extend(log['msghooks'][1:])
-        break
-
-if not (bool(log_url) or bool(webhook_urls) or bool(session_cookie)):
-    logger.error("Something required isn't configured properly!")
-    for var in [("LOG_URL",log_url), ("WEBHOOK_URL",webhook_urls), ("SESSION_COOKIE",session_cookie)]:
-        logger.error(f"{var[0]}: {var[1]}")
-    sys.exit(1)
-
-room_id = log_url.split('/')[-1]
-hostname = log_url.split('/')[2]
-seed_id = None
-
-log_url = f"https://{hostname}/log/{room_id}"
-api_url = f"https://{hostname}/api/room_status/{room_id}"
-spoiler_url = None
-
-if bool(seed_url):
-    seed_id = seed_url.split('/')[-1]
-    spoiler_url = f"https://{hostname}/dl_spoiler/{seed_id}"
-
-seed_address = None
-
-# setup logging
+# One process can track several rooms at once (see run_rooms). Each room is a RoomTracker,
+# and they share the database pool, the classification/location caches in utils,
+# the webhook delivery workers and one HTTP session.
+# Importing this file doesn't need a room configured, connect to anything or add log handlers;
+# that all happens when a tracker starts running (or in main), so it's safe to import for utilities and benchmarks.
+
 logger = logging.getLogger('ap_itemlog')
-handler = logging.StreamHandler()
-handler.setFormatter(logging.Formatter('[%(name)s %(process)d][%(levelname)s] %(message)s'))
-logfile = logging.FileHandler(f"logs/room_{room_id}.log",encoding="UTF-8")
-logfile.setFormatter(logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s'))
-logger.setLevel(logging.INFO)
-logger.addHandler(handler)
-logger.addHandler(logfile)
 
 # Time interval between checks (in seconds)
 INTERVAL = 60
+# Polls speed up to every MIN_INTERVAL seconds while a room is busy (BURST_LINES or more new lines at once),
+# and slow down twofold each quiet poll, up to ONLINE_INTERVAL while anyone's connected or MAX_INTERVAL if nobody is
+MIN_INTERVAL = 5
+BURST_LINES = 10
+ONLINE_INTERVAL = 30
+MAX_INTERVAL = 5 * 60
+# Log and API requests per minute each host gets from the whole bot (bot.archipelago.host_budget, 0 for no limit),
+# shared out between the worker processes by how many rooms they track
+HOST_BUDGET = 120
 # Maximum Discord message length in characters
 MAX_MSG_LENGTH = 2000
 # How long to wait for release items
 RELEASE_DELTA = timedelta(seconds=2)
+# A room that's spun down and had nothing new in its log for this long (in seconds) hibernates:
+# it lets go of its game and only checks the log every PROBE_INTERVAL (bot.archipelago.hibernate_after, 0 to never)
+HIBERNATE_AFTER = 30 * 60
+PROBE_INTERVAL = 5 * 60
+# Where hibernating rooms keep their place in the log, so they stay asleep across restarts
+HIBERNATE_DIR = 'hibernate'
+# How long a bot request waits for a hibernating room to wake up before it's told to try again
+WAKE_WAIT = 8
+# The game is saved next to the spool at most this often (in seconds) while the log's moving, so a restart
+# only has to replay the lines since then instead of the whole log (see save_snapshot)
+SNAPSHOT_EVERY = 5 * 60
+# Bump this if Game, Player or Item change shape, so old snapshots get thrown out
+SNAPSHOT_FORMAT = 1
+# A room whose tracker crashes is started again on its own (see run_room), ROOM_BACKOFF_MIN seconds later at first,
+# then twice as long after each crash in a row, up to ROOM_BACKOFF_MAX. Once it's stayed up ROOM_STABLE_AFTER, that starts over
+ROOM_BACKOFF_MIN = 5
+ROOM_BACKOFF_MAX = 15 * 60
+ROOM_STABLE_AFTER = 10 * 60
+# Errors that mean the whole process is in trouble, not just one room; these stop every room
+# so the bot's supervisor can start the process over
+PROCESS_ERRORS = (MemoryError, BrokenExecutor)
 
 # Timezones for timestamp parsing
 timezones = {
@@ -103,18 +93,39 @@ timezones = {
     'neurario.com': 'Australia/Melbourne',
 }
 
-# Buffer to store release and related sent item messages
-release_buffer = {}
-message_buffer = []
-
-# Store for players, items, settings
-game = Game()
-game.room_id = room_id
-start_time = None
-
-# small functions
-goaled = lambda player : game.players[player].is_finished()
-dim_if_goaled = lambda p : "-# " if goaled(p) else ""
+# Posts to the webhooks in the background, for every room
+delivery = WebhookDelivery()
+# Log, API and spoiler downloads for every room
+http = requests.Session()
+# Keeps every room's polling of a host within HOST_BUDGET, however busy they are
+budget = HostBudget(HOST_BUDGET)
+# Anything that touches a Game or the shared caches in utils runs here, one room at a time,
+# so rooms never step on each other. Downloads happen outside it, so they can overlap.
+processing = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rooms')
+
+# Whether pepper.ap_all_rooms has the log_offset column yet (migrations/001_ap_all_rooms_log_offset.sql).
+# Looked up once per process; without it, we resume by line count alone
+log_offset_column: bool = None
+
+def has_log_offset_column() -> bool:
+    global log_offset_column
+    if log_offset_column is None:
+        with pool.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM information_schema.columns WHERE table_schema = 'pepper' AND table_name = 'ap_all_rooms' AND column_name = 'log_offset'")
+            log_offset_column = cursor.fetchone() is not None
+        if not log_offset_column:
+            logger.warning("pepper.ap_all_rooms has no log_offset column, so restarts re-read the log by line count. Run migrations/001_ap_all_rooms_log_offset.sql to add it.")
+    return log_offset_column
+
+def load_config(path: str = 'config.yaml') -> dict:
+    with open(path, 'r', encoding='UTF-8') as file:
+        return yaml.safe_load(file)
+
+def setup_logging():
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('[%(name)s %(process)d][%(levelname)s] %(message)s'))
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
 
 def join_words(words):
     if len(words) > 2:
@@ -124,154 +135,171 @@ def join_words(words):
     else:
         return words[0]
 
-# Spoiler Log Processing
-
-def process_spoiler_log(seed_url):
-    global game
-    global start_time
+### Emitter events
 
-    spoiler_url = f"https://{hostname}/dl_spoiler/{seed_id}"
+def handle_milestone_message(message):
+    # message_buffer.append(message)
+    pass
 
-    spoiler_log = requests.get(spoiler_url, timeout=10)
-    spoiler_text = spoiler_log.text.split('\n')
+event_emitter.on("milestone", handle_milestone_message)
 
-    parse_mode = "Seed Info"
-    working_player = None
 
-    regex_patterns = {
-        'location': re.compile(r'(.+) \((.+?)\): (.+) \((.+?)\)$'),
-        'starting_item': re.compile(r'^(.+) \((.+?)\)$'),
-        'pokemon_locations': re.compile(r'^Wild Pokemon \((.+?)\):$')
-    }
+class RoomTracker:
+    """Everything needed to follow one Archipelago room: its Game, its place in the log,
+    the messages waiting to go out and where they go."""
+
+    def __init__(self, log_url: str, webhook_urls: list[str], session_cookie: str, seed_url: str = None,
+                 msg_webhooks: list[str] = None, session: requests.Session = None, interval: int = INTERVAL,
+                 hibernate_after: int = HIBERNATE_AFTER):
+        self.room_id = log_url.split('/')[-1]
+        self.hostname = log_url.split('/')[2]
+        self.log_url = f"https://{self.hostname}/log/{self.room_id}"
+        self.api_url = f"https://{self.hostname}/api/room_status/{self.room_id}"
+        self.webhook_urls = [w for w in webhook_urls if w]
+        self.msg_webhooks = [w for w in (msg_webhooks or []) if w]
+        self.session_cookie = session_cookie
+        self.session = session or http
+        self.interval = interval
+        # Time until the next poll, adjusted after every one (see next_interval)
+        self.poll_interval = interval
+        self.hibernate_after = hibernate_after
+
+        # Extra info for additional features
+        self.seed_url = seed_url
+        self.seed_id = seed_url.split('/')[-1] if seed_url else None
+        self.spoiler_url = f"https://{self.hostname}/dl_spoiler/{self.seed_id}" if seed_url else None
+        self.seed_address = None
+        self.start_time = None
+
+        # Store for players, items, settings
+        self.game = Game(self.room_id)
+
+        # Buffer to store release and related sent item messages
+        self.release_buffer = {}
+        self.message_buffer = []
+
+        # Every outgoing message goes through here first, until it's been delivered (opened in prepare)
+        self.spool: MessageSpool = None
+        # Spooled messages from before a restart, sent again once we've caught up
+        self.undelivered: list[dict] = []
+        # Log line count as of the batch being processed, recorded against spooled messages
+        self.source_line = 0
+        # When the game was last saved (see save_snapshot)
+        self.snapshot_at = 0.0
+        # Rebuilt whenever the player list changes
+        self.line_classifier: LogLineClassifier = None
+        self.log_tail = LogTail(self.log_url, cookies={'session': session_cookie}, session=self.session)
+        self.ipc_server: TrackerServer = None
+        # Set once every player is done and everything's been sent
+        self.finished = False
+
+        # Hibernation: `awake` is set while the game is loaded (other threads wait on it),
+        # and wake_up is set to bring a hibernating room back (both are made in run)
+        self.awake = threading.Event()
+        self.wake_up: asyncio.Event = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self.last_activity = time.monotonic()
+        # How many times the game's been loaded; part of the web API's ETags, since revisions start over each time
+        self.loads = 0
+
+        self.logger = logging.getLogger(f"ap_itemlog.{self.room_id}")
+
+    def open_logfile(self):
+        """Each running room logs to its own file as well as the console."""
+        if not self.logger.handlers:
+            os.makedirs('logs', exist_ok=True)
+            logfile = logging.FileHandler(f"logs/room_{self.room_id}.log", encoding="UTF-8")
+            logfile.setFormatter(logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s'))
+            self.logger.addHandler(logfile)
+
+    @classmethod
+    def from_config(cls, log: dict, **kwargs) -> 'RoomTracker':
+        """A tracker for one of the entries in config.yaml's bot.archipelago.itemlogs."""
+        return cls(
+            log_url=log['log_url'],
+            webhook_urls=log.get('webhooks') or [],
+            session_cookie=log.get('session_cookie'),
+            seed_url=log.get('spoiler_url') or None,
+            msg_webhooks=log.get('msghooks') or [],
+            **kwargs
+        )
 
-    def parse_to_type(s):
-        # Try int, float, bool, list, dict, or fallback to str
-        try:
-            return ast.literal_eval(s)
-        except Exception:
-            return s
-        
-    def parse_line(line):
-        current_key, value = line.strip().split(':', 1)
-        value_str = value.lstrip()
-        key = current_key.strip().replace("_", " ")
-
-        return key, value_str
-    
-    def smart_split(s):
-        # Split on commas, ignoring those inside [], (), or {}
-        parts = []
-        bracket_level = 0
-        curr = []
-        for char in s:
-            if char in '[({':
-                bracket_level += 1
-            elif char in '])}':
-                bracket_level -= 1
-            if char == ',' and bracket_level == 0:
-                parts.append(''.join(curr).strip())
-                curr = []
-            else:
-                curr.append(char)
-        if curr:
-            parts.append(''.join(curr).strip())
-        return parts
-
-    def parse_value(value_str):
-        # Dict-like pattern: key: value, key: value, ...
-        if "," in value_str and ":" in value_str and not value_str.startswith("[") and not value_str.startswith("{"):
-            items = smart_split(value_str)
-            result = {}
-            for item in items:
-                if ":" in item:
-                    k, v = item.split(":", 1)
-                    v_parsed = parse_to_type(v.strip())
-                    result[k.strip()] = v_parsed
-                else:
-                    result[item] = None
-            return result
-        # Otherwise, try to parse as list/dict/etc.
-        return parse_to_type(value_str)
-
-    for line in spoiler_text:
-        line = str(line)
-        if len(line) == 0:
-            continue
-
-        if line.startswith("Archipelago Version"):
-            parse_mode = "Seed Info"
-        if line.startswith("Player "):
-            parse_mode = "Players"
-            working_player = line.strip().split(':', 1)[1].strip()
-            logger.info(f"Parsing settings for player {working_player}")
-        if line == "Locations:":
-            parse_mode = "Locations"
-            logger.info("Parsing multiworld locations")
-            continue
-        if line == "Starting Items:":
-            parse_mode = "Starting Items"
-            logger.info("Parsing starting items")
-        if line in ["Entrances:","Medallions:","Fairy Fountain Bottle Fill:", "Shops:", "Level Layout", "Animal Friends"]:
-            parse_mode = None
-        if line.startswith("Dungeon Entrances"):
-            parse_mode = None
-            continue
-        if line.startswith("Spoiler and info for [Jigsaw]"):
-            parse_mode = "Jigsaw Info"
-            working_player_num = 0
-            try:
-                working_player_num = int(line.rsplit(' ', 1)[-1].strip()) - 1
-                working_player = game.players[list(game.players.keys())[working_player_num]].name
-                logger.info(f"Parsing Jigsaw settings for player {working_player}")
-            except (ValueError, IndexError):
-                logger.error(f"Error parsing Jigsaw player number from line: {line}")
-                working_player = None
-            continue
-        if match := regex_patterns['pokemon_locations'].match(line):
-            parse_mode = "Pokemon Locations"
-            working_player = match.group(1)
-            game.players[working_player].settings['Wild Pokemon Locations'] = {}
-            logger.info(f"Parsing Pokemon locations for player {working_player}")
-
-        match parse_mode:
-            case "Seed Info":
-                if line.startswith("Celeste (Open World) APWorld"): continue # don't need to record apworld version information
-                if line.startswith("Archipelago"):
-                    game.version_generator = line.split(' ')[2]
-                    game.seed = parse_to_type(line.split(' ')[-1])
-                    logger.info(f"Parsing seed {game.seed}")
-                    logger.info(f"Generated on Archipelago version {game.version_generator}")
-                    with sqlcon.cursor() as cursor:
-                        game.pushdb(cursor, 'pepper.ap_all_rooms', 'seed', game.seed)
-                        game.pushdb(cursor, 'pepper.ap_all_rooms', 'version', game.version_generator)
-                        sqlcon.commit()
-                else:
-                    current_key, value = line.strip().split(':', 1)
-                    if "," in value.lstrip():
-                        # Parse as a list
-                        game.world_settings[current_key.strip()] = [parse_to_type(v.strip()) for v in value.lstrip().split(',')]
-                    else: game.world_settings[current_key.strip()] = parse_to_type(value.lstrip())
+    @classmethod
+    def from_env(cls, cfg: dict = None, **kwargs) -> 'RoomTracker':
+        """A tracker for the room in LOG_URL, WEBHOOK_URL, SESSION_COOKIE, SPOILER_URL and MSGHOOK_URL.
+        If the room is in config.yaml too (or `cfg`, if given), its extra webhooks are picked up from there."""
+        log_url = os.getenv('LOG_URL')
+        webhook_urls = [os.getenv('WEBHOOK_URL')]
+        session_cookie = os.getenv('SESSION_COOKIE')
+        msg_webhooks = [os.getenv('MSGHOOK_URL')]
+
+        if not log_url:
+            for var in [("LOG_URL",log_url), ("WEBHOOK_URL",webhook_urls), ("SESSION_COOKIE",session_cookie)]:
+                logger.error(f"{var[0]}: {var[1]}")
+            raise ValueError("Something required isn't configured properly!")
+
+        # Pull extra configuration if this itemlog is stored in config.yaml, by checking the log_url
+        if cfg is None:
+            cfg = load_config()
+        for log in cfg['bot']['archipelago']['itemlogs']:
+            if log['log_url'] == log_url:
+                if 'webhooks' in log and len(log['webhooks']) > 1:
+                    webhook_urls.extend(log['webhooks'][1:])
+                if 'msghooks' in log and len(log['msghooks']) > 1:
+                    msg_webhooks.extend(log['msghooks'][1:])
+                break
 
-            case "Players":
-                try:
-                    
-                    key, value_str = parse_line(line)
-                    if key.startswith("Player "): continue  # Skip player header lines
-                    game.players[working_player].settings[key] = parse_value(value_str)
-                    if type(game.players[working_player].settings[key]) == str and "," in game.players[working_player].settings[key]:
-                        # Comma-separated string (no brackets), parse as list
-                        game.players[working_player].settings[key] = smart_split(game.players[working_player].settings[key])
-
-                except ValueError as e:
-                    logger.error(f"Error parsing line:")
-                    logger.error(line)
-                    logger.error(f"Error: {e}")
-                    continue
-            case "Locations":
-                if match := regex_patterns['location'].match(line):
-                    item_location, sender, item, receiver = match.groups()
-                    item_location = item_location.lstrip()
-                    ItemObject = game.get_or_create_item(game.players[sender],game.players[receiver],item,item_location,received_timestamp=start_time)
+        return cls(log_url, webhook_urls, session_cookie, seed_url=os.getenv('SPOILER_URL'), msg_webhooks=msg_webhooks, **kwargs)
+
+    # small functions
+    def goaled(self, player):
+        return self.game.players[player].is_finished()
+
+    def dim_if_goaled(self, p):
+        return "-# " if self.goaled(p) else ""
+
+    # Spoiler Log Processing
+
+    def fetch_spoiler(self, players: list) -> Iterable:
+        """Get the spoiler's records ready to apply, on a download thread (not the processing thread).
+        A seed's spoiler never changes, so it's parsed once as it downloads and written straight to the cache,
+        and the records are read back from there, a few at a time, when they're applied."""
+        with pool.cursor() as cursor:
+            known_version = self.game.pulldb(cursor, 'pepper.ap_all_rooms', 'version')
+        cached = load_cached_spoiler(self.hostname, self.seed_id, known_version)
+        if cached is not None:
+            return cached
+
+        names = [player[0] for player in players]
+        if cache_spoiler(self.hostname, self.seed_id, parse_spoiler_log(iter_spoiler_lines(self.spoiler_url, session=self.session), names)):
+            cached = load_cached_spoiler(self.hostname, self.seed_id)
+            if cached is not None:
+                return cached
+        # Couldn't cache it, so download it again and keep the records until they're applied
+        self.logger.warning("Spoiler couldn't be cached, holding it in memory instead.")
+        return list(parse_spoiler_log(iter_spoiler_lines(self.spoiler_url, session=self.session), names))
+
+    def apply_spoiler(self, records):
+        """Set up the game from parsed spoiler log records (see cmds.ap_scripts.spoiler)."""
+        for record in records:
+            match record:
+                case SeedInfo(version, seed):
+                    self.game.version_generator = version
+                    self.game.seed = seed
+                    self.logger.info(f"Parsing seed {self.game.seed}")
+                    self.logger.info(f"Generated on Archipelago version {self.game.version_generator}")
+                    if pool.available():
+                        with pool.cursor() as cursor:
+                            self.game.pushdb(cursor, 'pepper.ap_all_rooms', 'seed', self.game.seed)
+                            self.game.pushdb(cursor, 'pepper.ap_all_rooms', 'version', self.game.version_generator)
+                case WorldSetting(key, value):
+                    self.game.world_settings[key] = value
+                case PlayerSetting(player, key, value) | JigsawSetting(player, key, value):
+                    self.game.players[player].settings[key] = value
+                case WildPokemon(player, location, value):
+                    self.game.players[player].settings.setdefault('Wild Pokemon Locations', {})[location] = value
+                case LocationPlacement(item_location, sender, item, receiver):
+                    ItemObject = self.game.get_or_create_item(self.game.players[sender],self.game.players[receiver],item,item_location,received_timestamp=self.start_time)
 
                     if item_location == item and sender == receiver:
                         continue # Most likely an event, can be skipped
@@ -283,738 +311,1098 @@ def process_spoiler_log(seed_url):
                         # continue
                         pass
                     else:
-                        if game.players[sender].name == sender:
-                            game.players[sender].add_spoiler(ItemObject)
-                        if game.players[receiver].name == receiver:
-                            game.players[receiver].add_spoiler(ItemObject)
+                        if self.game.players[sender].name == sender:
+                            self.game.players[sender].add_spoiler(ItemObject)
+                        if self.game.players[receiver].name == receiver:
+                            self.game.players[receiver].add_spoiler(ItemObject)
 
                     ItemObject.db_add_location()
-                    
-                    if sender not in game.spoiler_log: game.spoiler_log.update({sender: {}})
-                    game.spoiler_log[sender].update({item_location: ItemObject})
-            case "Starting Items":
-                if match := regex_patterns['starting_item'].match(line):
-                    item, receiver = match.groups()
-                    game.players[receiver].inventory.append(game.get_or_create_item("Archipelago",game.players[receiver],item,"Starting Items",received_timestamp=start_time))
-            case "Jigsaw Info":
-                try:
-                    key, value_str = parse_line(line)
-                    game.players[working_player].settings[key] = parse_to_type(value_str)
-                except ValueError as e:
-                    if line.startswith("Spoiler and info for [Jigsaw]"):
-                        # Not a problem, just the header
-                        continue
-                    else:
-                        logger.error(f"Error parsing Jigsaw line: {line}")
-                        raise e
-            case "Pokemon Locations":
-                # Some Pkmn games list the locations of wild Pokemon in the spoiler log
-                if match := regex_patterns['location'].match(line):
-                    try:
-                        key, value_str = parse_line(line)
-                        game.players[working_player].settings['Wild Pokemon Locations'][key] = parse_to_type(value_str)
-                    except ValueError as e:
-                        logger.error(f"Error parsing Pokemon location line: {line}")
-                        logger.error(f"Error: {e}")
-                        continue
-            case _:
-                continue
-
-    # Some game-specific handling
-    for player in game.players.values():
-        if player.game == "gzDoom":
-
-            # Determine the real Included Levels list by Level Access items
-            levelaccess_mapname_match = re.compile(r'Level Access \((.+?)\)')
-            goal_patterns = list(player.settings['Win conditions']['specific-maps'])
-
-            included_working_list = []
-            goal_working_list = []
-
-            for location in player.locations.keys():
-                map_name = None
-                if not location.startswith("Level Access ("): continue
-
-                if match := levelaccess_mapname_match.match(str(location)):
-                    map_name = match.group(1)
-                    included_working_list.add(map_name)
-
-                    # If the map matches any of the goal patterns, add it to the goal list
-                    for pattern in goal_patterns:
-                        if fnmatch.fnmatch(map_name, pattern):
-                            goal_working_list.add(map_name)
-
-            # Remove duplicates and update Included Levels
-            complete_level_list = included_working_list
-            logger.info(f"Expanded gzDoom Included Levels for {player.name}: {complete_level_list}")
-            logger.info(f"Expanded gzDoom Goal Levels for {player.name}: {goal_working_list}")
-            player.settings["Included levels"] = complete_level_list
-            player.stats.set_stat("all_levels", complete_level_list)
-            player.stats.set_stat("goal_levels", goal_working_list)
-            player.settings['Win conditions']['specific-maps'] = goal_working_list
-
-    logger.info("Done parsing the spoiler log")
-
-def process_new_log_lines(new_lines, skip_msg: bool = False):
-    global release_buffer
-    global players
-    global seed_address
-    global start_time
-
-    # Regular expressions for different log message types
-    regex_patterns = {
-        'sent_items': re.compile(r'\[(.*?)]: \(Team #\d\) (\L<players>) sent (.*?(?= to)) to (\L<players>) \((.+)\)$', players=game.players.keys()),
-            'item_hints': re.compile(
-                r'\[(.*?)]: Notice \(Team #\d\): \[Hint]: (\L<players>)\'s (.*) is at (.*) in (\L<players>)\'s World(?: at (?P<entrance>(.+)))?\. \((?P<hint_status>(.+))\)$', players=game.players.keys()),
-        'goals': re.compile(r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) has completed their goal\.$'),
-        'releases': re.compile(
-            r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) has released all remaining items from their world\.$'),
-        'messages': re.compile(r'\[(.*?)\]: Notice \(all\): (.*?): (.+)$'),
-        'room_shutdown': re.compile(r'\[(.*?)\]: Shutting down due to inactivity.$'),
-        'room_spinup': re.compile(r'\[(.*?)\]: Hosting game at (.+?)$'),
-        'joins': re.compile(r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) (playing|viewing|tracking) (.+?) has joined. Client\(([0-9\.]+)\), (?P<tags>.+)\.$'),
-        'parts': re.compile(r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) has left the game\. Client\(([0-9\.]+)\), (?P<tags>.+)\.$'),
-    }
 
-    def live_classification(item):
-
-        response = item.classification
-        setting = item.receiver.settings
-
-        if response == "conditional progression":
-            # Progression in certain settings, otherwise useful/filler
-            if item.game == "gzDoom":
-                # Weapons : extra copies can be filler
-                if isinstance(item, Item) and player.get_item_count(item.name) > 1:
-                    response = "filler"
-            if item.game == "Here Comes Niko!":
-                if item.name == "Snail Money" and (setting["Enable Achievements"] == "all_achievements" or setting['Snail Shop'] is True):
-                    response = "progression"
-                else: response = "filler"
-            if item.game == "Ocarina of Time":
-                if item.name == "Gold Skulltula Token":
-                    if item.count > 50: # No more checks after 50
-                        response = "filler"
-                    else: response = "progression"
-            if item.game == "Trackmania":
-                medals = ["Bronze Medal", "Silver Medal", "Gold Medal", "Author Medal"]
-                # From TMAP docs: 
-                # "The quicket medal equal to or below target difficulty is made the progression medal."
-                target_difficulty = setting['Target Time Difficulty']
-                progression_medal_lookup = target_difficulty // 100
-                progression_medal = medals[progression_medal_lookup]
-                filler_medals = [item for i, item in enumerate(medals) if i != progression_medal_lookup]
-                if item.name == progression_medal: response = "progression"
-                elif item.name in filler_medals: response = "filler"
-            # After checking everything, if not re-classified, it's probably progression
-            if response == "conditional progression": response = "progression"
-
-            item.classification = response
-        return item
-
-    for line in new_lines:
-        line_start_time = time.time_ns() # for performance logging
-        if match := regex_patterns['sent_items'].match(line):
-            timestamp, sender, item, receiver, item_location = match.groups()
-
-            timestamp = dateparser.parse(timestamp[:-3], # strip milliseconds
-                                         settings={'TIMEZONE': timezones.get(hostname, 'Etc/UTC')})
-
-            # Mark item as collected
-            try:
-                Item = game.get_or_create_item(game.players[sender],game.players[receiver],item,item_location,received_timestamp=timestamp)
-                game.players[sender].collect_item(Item)
-                game.spoiler_log[sender].update({item_location: Item})
-
-                # If it was hinted, update the player's hint table
-                for hintitem in game.players[receiver].hints['receiving']:
-                    if item_location == hintitem.location:
-                        del hintitem
-                        Item.hinted = True
-                        break
-                for hintitem in game.players[sender].hints['sending']:
-                    if item_location == hintitem.location:
-                        del hintitem
-                        Item.hinted = True
-                        break
+                    self.game.add_location(sender, ItemObject)
+                case StartingItem(item, receiver):
+                    self.game.players[receiver].add_to_inventory(self.game.get_or_create_item("Archipelago",self.game.players[receiver],item,"Starting Items",received_timestamp=self.start_time))
 
-            except KeyError as e:
-                logger.error(f"""Sent Item Object Creation error. Parsed item name: '{item}', Receiver: '{receiver}', Location: '{item_location}', Error: '{str(e)}'""", e, exc_info=True)
-                logger.error(f"Line being parsed: {line}")
+        # Some game-specific handling
+        for player in self.game.players.values():
+            if player.game == "gzDoom":
 
+                # Determine the real Included Levels list by Level Access items
+                levelaccess_mapname_match = re.compile(r'Level Access \((.+?)\)')
+                goal_patterns = list(player.settings['Win conditions']['specific-maps'])
 
-            # Update location totals
-            Item.db_add_location(True)
-            game.players[sender].update_locations(game)
-            game.update_locations()
+                included_working_list = []
+                goal_working_list = []
 
-            # Live-Classify if the item is Conditional Progression
-            Item = live_classification(Item)
+                for location in player.locations.keys():
+                    map_name = None
+                    if not location.startswith("Level Access ("): continue
 
-            if not skip_msg: logger.info(f"{sender}: ({str(game.players[sender].collected_locations)}/{str(game.players[sender].total_locations)}/{str(round(game.players[sender].collection_percentage,2))}%) {item_location} -> {receiver}'s {item} ({Item.classification})")
+                    if match := levelaccess_mapname_match.match(str(location)):
+                        map_name = match.group(1)
+                        included_working_list.add(map_name)
 
-            # By vote of spotzone: if it's filler, don't post it
-            if Item.is_filler() or Item.is_currency(): continue
-
-            # If this is part of a release, send it there instead
-            if sender in release_buffer and not skip_msg and (datetime.now(ZoneInfo("UTC")).astimezone() - release_buffer[sender]['timestamp'] <= RELEASE_DELTA):
-                release_buffer[sender]['items'][receiver].append(Item)
-                logger.debug(f"Adding {item} for {receiver} to release buffer.")
-            else:
-                # Update item name based on settings for special items
-                location = item_location
-                if bool(game.players[receiver].settings):
-                    try:
-                        item = handle_item_tracking(game, game.players[receiver], Item)
-                        location = handle_location_tracking(game, game.players[sender], Item)
-                    except KeyError as e:
-                        logger.error(f"Couldn't do tracking for item {item} or location {location}:", e, exc_info=True)
-
-                # Update the message appropriately
-                if Item.classification == "trap":
-                    trap_messages = []
-
-                    def random_nontrap_item(player: Player):
-                        """Get the name of a random non-trap item from the player's spoiler log.
-                        Useful for extra flavor in trap messages."""
-
-                        non_trap_items = [it.name for it in game.players[player.name].spoilers['items'] if it.classification not in ["trap","currency","filler"] and it.found is False]
-
-                        if len(non_trap_items) == 0:
-                            return "a mysterious item"
-                        return random.choice(non_trap_items)
-
-                    def trapmsg_substvars(string: str, sender: str, receiver: str, trap: str):
-                        string = string.replace("$s", sender)
-                        string = string.replace("$r", receiver)
-
-                        # Full trap name
-                        string = string.replace("$t", trap)
-                        # Trap name without the 'Trap' suffix
-                        string = string.replace("$T", trap.replace(" Trap","")) 
-
-                        # Some random non-trap item from the receiver's spoiler log
-                        # Jokes!
-                        string = string.replace("$i", random_nontrap_item(game.players[receiver]))
-
-                        return string
-                    
-
-
-                    if sender == receiver:
-                        trap_messages = [
-                            "**$s** needed more challenge, and collected **their own $t**",
-                            "**$s** thought it was $i, but it was I, **$t**!",
-                            "**$s** is a FOOL! (collected a **$t**)",
-                            "**$s** was **$T'd!**",
-                            "A **$t** destroyed **$s's** world (and everything inside)",
-                        ]
-                    else:
-                        trap_messages = [
-                            "$s slapped **$r** around a bit with **a large $t**",
-                            "**$r**: Congratulations On Your **$t**! Love, $s",
-                            "$s, did **$r** *really* deserve that **$t**?",
-                            "$s definitely *did not* send **$r** a **$t**",
-                            "**$r**, is this a good time for a **$t** from $s?",
-                            "**$r** received a demo of what it's like to get a **$t** from $s",
-                            "$s destroyed **$r's** world (and everything inside) with a **$t**",
-                            "$s did *not* send **~~$i~~** to **$r** (it was a **$t** instead)",
-                        ]
-
-                    message = random.choice(trap_messages)
-                    message = dim_if_goaled(receiver) + trapmsg_substvars(message, sender, receiver, item) + f" ({location})"
-                    if not skip_msg: message_buffer.append(message.replace("_", r"\_"))
-                else:
-                    if sender == receiver:
-                        message = f"**{sender}** found **their own {
-                            "hinted " if bool(game.spoiler_log[sender][item_location].hinted) else ""
-                            }{item}** ({location})"
-                    elif bool(game.spoiler_log[sender][item_location].hinted):
-                        message = f"{dim_if_goaled(receiver)}{sender} found **{receiver}'s hinted {item}** ({location})"
-                    else:
-                        message = f"{dim_if_goaled(receiver)}{sender} sent **{item}** to **{receiver}** ({location})"
-                    if not skip_msg: message_buffer.append(message.replace("_",r"\_"))
-
-                # Handle completion milestones
-                # if game.players[sender].collection_percentage == 100 and game.players[sender].is_finished() is False:
-                #     message = f"**That was their last check! They're probably just waiting to finish now...**"
-                #     message_buffer.append(message)
-
-
-        elif match := regex_patterns['item_hints'].match(line):
-            timestamp = match.groups()[0]
-            receiver = match.groups()[1]
-            item = match.groups()[2]
-            item_location = match.groups()[3]
-            sender = match.groups()[4]
-            if match.group('entrance'):
-                entrance = match.group('entrance')
-            else: entrance = None
-            if match.group('hint_status'):
-                hint_status = match.group('hint_status')
-
-            if hint_status == "found": continue
-
-            Item = game.get_or_create_item(game.players[sender],game.players[receiver],item,item_location,entrance=entrance)
-            if item_location not in game.spoiler_log[sender]:
-                game.spoiler_log[sender][item_location] = Item
-            else: Item = game.spoiler_log[sender].get(item_location)
-
-            # Store the hint in the player's hints dictionary
-            game.players[sender].add_hint("sending", Item)
-            game.players[receiver].add_hint("receiving", Item)
-            game.spoiler_log[sender][item_location].hint()
-
-            if Item.is_filler() or Item.is_currency(): continue
-            # Balatro shop items are hinted as soon as they appear and are usually bought right away, so skip their hints
-            if Item.game == "Balatro" and any([Item.location.startswith(shop) for shop in ['Shop Item', 'Consumable Item']]): continue
-            
-            if game.players[receiver].game == "Hollow Knight":
-                item = item.replace("_", " ").replace("-"," - ")
-            if game.players[sender].game == "Hollow Knight":
-                item_location = item_location.replace("_", " ").replace("-"," - ")
-
-            message = f"**[Hint]** **{receiver}'s {item}** is at {item_location} in {sender}'s World{f" (found at {entrance})" if bool(entrance) else ''}."
-
-            match hint_status:
-                case "avoid":
-                    message += " This item is not useful."
-                case "priority":
-                    Item.update_item_classification("progression")
-                    message += " **This item will unlock more checks.**"
-                case _:
-                    pass
-
-            if bool(Item.location_costs):
-                message += f"\n> -# This will cost {join_words(Item.location_costs)} to obtain."
-            if bool(Item.location_info):
-                message += f"\n> -# {Item.location_info}"
-
-
-
-            if not skip_msg and game.players[receiver].is_finished() is False and not Item.found:
-                message_buffer.append(message)
-                logger.info(f"[HINT] {sender}: {item_location} -> {receiver}'s {item} ({Item.classification})")
-
-
-        elif match := regex_patterns['goals'].match(line):
-            timestamp, sender = match.groups()
-            if sender not in game.players: game.players[sender] = {"goaled": True}
-            game.players[sender].goaled = True
-            game.players[sender].finished_percentage = game.players[sender].collection_percentage
-
-            message = f"**{sender} has finished!** That's {len([p for p in game.players.values() if p.is_goaled()])}/{len(game.players)} goaled! ({len([p for p in game.players.values() if p.is_finished()])}/{len(game.players)} including releases)"
-            if game.players[sender].collected_locations == game.players[sender].total_locations:
-                message += f"\n**Wow!** {sender} 100%ed their game before finishing, too!"
-            if not skip_msg: 
-                logger.info(f"{sender} has finished their game.")
-                message_buffer.append(message)
-        elif match := regex_patterns['releases'].match(line):
-            timestamp, sender = match.groups()
-            game.players[sender].released = True
-            if not skip_msg:
-                logging.info("Release detected.")
-                release_buffer[sender] = {
-                    'timestamp': dateparser.parse(timestamp[:-3], settings={'TIMEZONE': timezones.get(hostname, 'Etc/UTC'), 'RETURN_AS_TIMEZONE_AWARE': True}),
-                    'items': defaultdict(list)
-                }
-        elif match := regex_patterns['room_shutdown'].match(line):
-            game.running = False
-            if not skip_msg:
-                logger.info("Room has spun down due to inactivity.")
-        elif match := regex_patterns['room_spinup'].match(line):
-            timestamp, address = match.groups()
-            game.running = True
-            if not skip_msg:
-                logger.info(f"Room has spun up at {address}.")
-            if address != seed_address:
-                if seed_address is None: seed_address_was = None
-                else: seed_address_was = seed_address
-                seed_address = address
-                logger.info(f"Seed URI has changed: {address}")
-                if not skip_msg:
-                    with sqlcon.cursor() as cursor:
-                        game.pushdb(cursor, 'pepper.ap_all_rooms', 'port', seed_address.split(":")[1])
-                        sqlcon.commit()
-                    if seed_address_was is not None:
-                        message = f"**The seed address has changed.** Use this updated address: `{address}`"
-                        send_chat("Archipelago", message)
-                        message_buffer.append(message)
-            if start_time is None:
-                start_time = dateparser.parse(timestamp[:-3], settings={'TIMEZONE': timezones.get(hostname, 'Etc/UTC'), 'RETURN_AS_TIMEZONE_AWARE': True})
-                if start_time is None:
-                    logger.error(f"Failed to parse start time from timestamp: {timestamp}")
-                logger.info(f"Start time set to {start_time} (epoch)")
-        elif match := regex_patterns['messages'].match(line):
-            timestamp, sender, message = match.groups()
-            if msg_webhooks:
-                if message.startswith("!"): continue # don't send commands
-                else:
-                    if not skip_msg and sender in game.players:
-                        logger.info(f"{sender}: {message}")
-                        send_chat(sender, message)
+                        # If the map matches any of the goal patterns, add it to the goal list
+                        for pattern in goal_patterns:
+                            if fnmatch.fnmatch(map_name, pattern):
+                                goal_working_list.add(map_name)
 
-        elif match := regex_patterns['joins'].match(line):
-            timestamp, player, verb, playergame, client_version, tags = match.groups()
+                # Remove duplicates and update Included Levels
+                complete_level_list = included_working_list
+                self.logger.info(f"Expanded gzDoom Included Levels for {player.name}: {complete_level_list}")
+                self.logger.info(f"Expanded gzDoom Goal Levels for {player.name}: {goal_working_list}")
+                player.settings["Included levels"] = complete_level_list
+                player.stats.set_stat("all_levels", complete_level_list)
+                player.stats.set_stat("goal_levels", goal_working_list)
+                player.settings['Win conditions']['specific-maps'] = goal_working_list
 
-            timestamp = dateparser.parse(timestamp[:-3], # strip milliseconds
-                                         settings={'TIMEZONE': timezones.get(hostname, 'Etc/UTC')})
-            
+        location_registry.flush()
+        self.logger.info("Done parsing the spoiler log")
 
-            try:
-                tags_str = tags
-                tags = ast.literal_eval(tags_str)
-                game.players[player].tags = tags
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse player tags. {player}: {tags_str}")
-                tags = tags_str
-            if not skip_msg and verb == "playing":
-                logger.info(f"{player} ({playergame}) is online.")
-                game.players[player].set_online(True, timestamp)
-            if "Tracker" in tags or verb == "tracking":
-                if not skip_msg:
-                    pass
-                #     message = f"{player} is checking what is in logic."
-                #     message_buffer.append(message)
+    def process_new_log_lines(self, new_lines, skip_msg: bool = False):
 
-        elif match := regex_patterns['parts'].match(line):
-            timestamp, player, version, tags = match.groups()
+        # Only compile the log patterns again if the player list has changed
+        if self.line_classifier is None or self.line_classifier.players != self.game.players.keys():
+            self.line_classifier = LogLineClassifier(self.game.players.keys())
 
-            timestamp = dateparser.parse(timestamp[:-3], # strip milliseconds
-                                         settings={'TIMEZONE': timezones.get(hostname, 'Etc/UTC')})
-            
-            if not skip_msg: logger.info(f"{player} is offline.")
-            game.players[player].set_online(False, timestamp)
+        def live_classification(item):
 
-        else:
-            # Unmatched lines
-            logger.debug(f"Unparsed line: {line}")
+            response = item.classification
+            setting = item.receiver.settings
 
-        line_end_time = time.time_ns()
+            if response == "conditional progression":
+                # Progression in certain settings, otherwise useful/filler
+                if item.game == "gzDoom":
+                    # Weapons : extra copies can be filler
+                    if isinstance(item, Item) and player.get_item_count(item.name) > 1:
+                        response = "filler"
+                if item.game == "Here Comes Niko!":
+                    if item.name == "Snail Money" and (setting["Enable Achievements"] == "all_achievements" or setting['Snail Shop'] is True):
+                        response = "progression"
+                    else: response = "filler"
+                if item.game == "Ocarina of Time":
+                    if item.name == "Gold Skulltula Token":
+                        if item.count > 50: # No more checks after 50
+                            response = "filler"
+                        else: response = "progression"
+                if item.game == "Trackmania":
+                    medals = ["Bronze Medal", "Silver Medal", "Gold Medal", "Author Medal"]
+                    # From TMAP docs: 
+                    # "The quicket medal equal to or below target difficulty is made the progression medal."
+                    target_difficulty = setting['Target Time Difficulty']
+                    progression_medal_lookup = target_difficulty // 100
+                    progression_medal = medals[progression_medal_lookup]
+                    filler_medals = [item for i, item in enumerate(medals) if i != progression_medal_lookup]
+                    if item.name == progression_medal: response = "progression"
+                    elif item.name in filler_medals: response = "filler"
+                # After checking everything, if not re-classified, it's probably progression
+                if response == "conditional progression": response = "progression"
+
+                item.classification = response
+            return item
+
+        for line in new_lines:
+            line_start_time = time.time_ns() # for performance logging
+            if not skip_msg:
+                self.source_line += 1 # Messages from this line get spooled against it
+            kind, match = self.line_classifier.classify(line)
+            if kind == 'sent_items':
+                timestamp, sender, item, receiver, item_location = match.groups()
 
-        # If the line processing took more than 5 ms, log it
+                timestamp = parse_log_timestamp(timestamp, timezones.get(self.hostname, 'Etc/UTC'))
 
-        if line_end_time - line_start_time > 5_000_000:
-            logger.debug(f"Processing line took {(line_end_time - line_start_time)/1_000_000} ms: {line}")
+                # Mark item as collected
+                try:
+                    Item = self.game.get_or_create_item(self.game.players[sender],self.game.players[receiver],item,item_location,received_timestamp=timestamp)
+                    self.game.players[sender].collect_item(Item)
+                    self.game.add_location(sender, Item)
 
-### Common non-loop functions
+                    # If it was hinted, it's found now, so take it out of both players' hints
+                    if self.game.players[receiver].remove_hint('receiving', sender, item_location) is not None:
+                        Item.hinted = True
+                    if self.game.players[sender].remove_hint('sending', sender, item_location) is not None:
+                        Item.hinted = True
 
-def log_to_file(message):
-    global room_id
+                except KeyError as e:
+                    self.logger.error(f"""Sent Item Object Creation error. Parsed item name: '{item}', Receiver: '{receiver}', Location: '{item_location}', Error: '{str(e)}'""", e, exc_info=True)
+                    self.logger.error(f"Line being parsed: {line}")
 
-    os.makedirs('logs', exist_ok=True)  # Ensure logs directory exists
-    with open(f'logs/{room_id}.md', 'a', encoding='UTF-8') as log_file:
-        log_file.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
 
-def send_chat(sender, message):
-    payload = {
-        "username": sender,
-        "content": message
-    }
+                # Update location totals
+                Item.db_add_location(True)
+                self.game.players[sender].update_locations(self.game)
+                self.game.update_locations()
 
-    for webhook in msg_webhooks:
-        if webhook is None or webhook == "": continue
-        try:
-            response = requests.post(webhook, json=payload, timeout=5)
-            response.raise_for_status()
-            # log_to_file(message)  # Log the message to a file
-        except requests.RequestException as e:
-            logging.error(f"Error sending chat message to webhook: {e}")
+                # Live-Classify if the item is Conditional Progression
+                Item = live_classification(Item)
 
+                if not skip_msg: self.logger.info(f"{sender}: ({str(self.game.players[sender].collected_locations)}/{str(self.game.players[sender].total_locations)}/{str(round(self.game.players[sender].collection_percentage,2))}%) {item_location} -> {receiver}'s {item} ({Item.classification})")
 
+                # By vote of spotzone: if it's filler, don't post it
+                if Item.is_filler() or Item.is_currency(): continue
 
-def send_log(message):
-    payload = {
-        "content": message
-    }
+                # If this is part of a release, send it there instead
+                if sender in self.release_buffer and not skip_msg and (datetime.now(ZoneInfo("UTC")).astimezone() - self.release_buffer[sender]['timestamp'] <= RELEASE_DELTA):
+                    self.release_buffer[sender]['items'][receiver].append(Item)
+                    self.logger.debug(f"Adding {item} for {receiver} to release buffer.")
+                else:
+                    # Update item name based on settings for special items
+                    location = item_location
+                    if bool(self.game.players[receiver].settings):
+                        try:
+                            item = handle_item_tracking(self.game, self.game.players[receiver], Item)
+                            location = handle_location_tracking(self.game, self.game.players[sender], Item)
+                        except KeyError as e:
+                            self.logger.error(f"Couldn't do tracking for item {item} or location {location}:", e, exc_info=True)
+
+                    # Update the message appropriately
+                    if Item.classification == "trap":
+                        trap_messages = []
+
+                        def random_nontrap_item(player: Player):
+                            """Get the name of a random non-trap item from the player's spoiler log.
+                            Useful for extra flavor in trap messages."""
+
+                            non_trap_items = [it.name for it in self.game.players[player.name].spoilers['items'] if it.classification not in ["trap","currency","filler"] and it.found is False]
+
+                            if len(non_trap_items) == 0:
+                                return "a mysterious item"
+                            return random.choice(non_trap_items)
+
+                        def trapmsg_substvars(string: str, sender: str, receiver: str, trap: str):
+                            string = string.replace("$s", sender)
+                            string = string.replace("$r", receiver)
+
+                            # Full trap name
+                            string = string.replace("$t", trap)
+                            # Trap name without the 'Trap' suffix
+                            string = string.replace("$T", trap.replace(" Trap","")) 
+
+                            # Some random non-trap item from the receiver's spoiler log
+                            # Jokes!
+                            string = string.replace("$i", random_nontrap_item(self.game.players[receiver]))
+
+                            return string
+                        
+
+
+                        if sender == receiver:
+                            trap_messages = [
+                                "**$s** needed more challenge, and collected **their own $t**",
+                                "**$s** thought it was $i, but it was I, **$t**!",
+                                "**$s** is a FOOL! (collected a **$t**)",
+                                "**$s** was **$T'd!**",
+                                "A **$t** destroyed **$s's** world (and everything inside)",
+                            ]
+                        else:
+                            trap_messages = [
+                                "$s slapped **$r** around a bit with **a large $t**",
+                                "**$r**: Congratulations On Your **$t**! Love, $s",
+                                "$s, did **$r** *really* deserve that **$t**?",
+                                "$s definitely *did not* send **$r** a **$t**",
+                                "**$r**, is this a good time for a **$t** from $s?",
+                                "**$r** received a demo of what it's like to get a **$t** from $s",
+                                "$s destroyed **$r's** world (and everything inside) with a **$t**",
+                                "$s did *not* send **~~$i~~** to **$r** (it was a **$t** instead)",
+                            ]
+
+                        message = random.choice(trap_messages)
+                        message = self.dim_if_goaled(receiver) + trapmsg_substvars(message, sender, receiver, item) + f" ({location})"
+                        if not skip_msg: self.message_buffer.append(message.replace("_", r"\_"))
+                    else:
+                        if sender == receiver:
+                            message = f"**{sender}** found **their own {
+                                "hinted " if bool(self.game.spoiler_log[sender][item_location].hinted) else ""
+                                }{item}** ({location})"
+                        elif bool(self.game.spoiler_log[sender][item_location].hinted):
+                            message = f"{self.dim_if_goaled(receiver)}{sender} found **{receiver}'s hinted {item}** ({location})"
+                        else:
+                            message = f"{self.dim_if_goaled(receiver)}{sender} sent **{item}** to **{receiver}** ({location})"
+                        if not skip_msg: self.message_buffer.append(message.replace("_",r"\_"))
+
+                    # Handle completion milestones
+                    # if self.game.players[sender].collection_percentage == 100 and self.game.players[sender].is_finished() is False:
+                    #     message = f"**That was their last check! They're probably just waiting to finish now...**"
+                    #     self.message_buffer.append(message)
+
+
+            elif kind == 'item_hints':
+                timestamp = match.groups()[0]
+                receiver = match.groups()[1]
+                item = match.groups()[2]
+                item_location = match.groups()[3]
+                sender = match.groups()[4]
+                if match.group('entrance'):
+                    entrance = match.group('entrance')
+                else: entrance = None
+                if match.group('hint_status'):
+                    hint_status = match.group('hint_status')
+
+                if hint_status == "found": continue
+
+                Item = self.game.get_or_create_item(self.game.players[sender],self.game.players[receiver],item,item_location,entrance=entrance)
+                if item_location not in self.game.spoiler_log.get(sender, {}):
+                    self.game.add_location(sender, Item)
+                else: Item = self.game.spoiler_log[sender].get(item_location)
+
+                # Store the hint in the player's hints dictionary
+                self.game.players[sender].add_hint("sending", Item)
+                self.game.players[receiver].add_hint("receiving", Item)
+                self.game.spoiler_log[sender][item_location].hint()
+
+                if Item.is_filler() or Item.is_currency(): continue
+                # Balatro shop items are hinted as soon as they appear and are usually bought right away, so skip their hints
+                if Item.game == "Balatro" and any([Item.location.startswith(shop) for shop in ['Shop Item', 'Consumable Item']]): continue
+                
+                if self.game.players[receiver].game == "Hollow Knight":
+                    item = item.replace("_", " ").replace("-"," - ")
+                if self.game.players[sender].game == "Hollow Knight":
+                    item_location = item_location.replace("_", " ").replace("-"," - ")
+
+                message = f"**[Hint]** **{receiver}'s {item}** is at {item_location} in {sender}'s World{f" (found at {entrance})" if bool(entrance) else ''}."
+
+                match hint_status:
+                    case "avoid":
+                        message += " This item is not useful."
+                    case "priority":
+                        Item.update_item_classification("progression")
+                        message += " **This item will unlock more checks.**"
+                    case _:
+                        pass
 
-    for webhook in webhook_urls:
-        if webhook is None or webhook == "": continue
-        try:
-            response = requests.post(webhook, json=payload, timeout=5)
-            response.raise_for_status()
-            # log_to_file(message)  # Log the message to a file
-        except requests.RequestException as e:
-            logging.error(f"Error sending log message to webhook: {e}")
+                if bool(Item.location_costs):
+                    message += f"\n> -# This will cost {join_words(Item.location_costs)} to obtain."
+                if bool(Item.location_info):
+                    message += f"\n> -# {Item.location_info}"
 
 
-def send_release_messages():
-    global release_buffer
 
-    def handle_currency(receiver, itemlist: dict):
-        currency = 0
+                if not skip_msg and self.game.players[receiver].is_finished() is False and not Item.found:
+                    self.message_buffer.append(message)
+                    self.logger.info(f"[HINT] {sender}: {item_location} -> {receiver}'s {item} ({Item.classification})")
 
-        currency_matches = {
-            'A Hat in Time': (re.compile(r'^([0-9]+) Pons$'), "Pons"),
-            'Final Fantasy': (re.compile(r'^Gold([0-9]+)$'), "Gold"),
-            'Jak and Daxter The Precursor Legacy': (re.compile(r'^([0-9]+) Precursor Orbs?$'), "Precursor Orbs"),
-            "Links Awakening DX": (re.compile(r'^([0-9]+) Rupees$'), "Rupees"),
-            'Link to the Past': (re.compile(r'^Rupees? \(([0-9]+)\)$'), "Rupees"),
-            'Ocarina of Time': (re.compile(r'^Rupees? \(([0-9]+)\)$'), "Rupees"),
-            'Pokemon FireRed and LeafGreen': (re.compile(r'^([0-9]+) Coins?$'), "Coins"),
-            'Sonic Adventure 2 Battle': (re.compile(r'^(\w+) Coins?$'), "Coins"),
-            'Super Mario World': (re.compile(r'^([0-9]+) coins?$'), "Coins"),
-        }
 
-        if game.players[receiver].game in currency_matches:
-            try:
-                for item, count in itemlist.copy().items():
-                    if match := currency_matches[game.players[receiver].game][0].match(item):
-                        if game.players[receiver].game == "Sonic Adventure 2 Battle":
-                            amount = w2n.word_to_num(match.groups()[0]) # why you make me do this
-                        else:
-                            amount = int(match.groups()[0])
-                        currency = currency + (amount * count)
-                        del itemlist[item]
-                if currency > 0:
-                    logger.info(f"Replacing (attempting) currency in {game.players[receiver].game} with '{currency} {currency_matches[game.players[receiver].game][1]}'")
-                    itemlist.update({f"{currency} {currency_matches[game.players[receiver].game][1]}": 1})
-            except KeyError:
-                logger.info(f"No currency handler for {game.players[receiver].game}, but handle_currency matched it anyway somehow!")
-                raise
-
-        return itemlist
-
-    for sender, data in release_buffer.copy().items():
-        if time.time() - data['timestamp'].timestamp() > 1:
-            message = f"**{sender}** has released their remaining items."
-            running_message = message
-            for receiver, items in data['items'].items():
-                if game.players[receiver].is_finished():
-                    continue
-                item_counts = defaultdict(int)
-                for item in items:
-                    if item.is_filler(): continue
-                    item_counts[item.name] += 1
-                handle_currency(receiver,item_counts)
-                item_list = ', '.join(
-                    [f"{item} (x{count})" if count > 1 else item for item, count in item_counts.items()])
-                running_message += f"\n{dim_if_goaled(receiver)}**{receiver}** receives: {item_list}"
-                if len(running_message) > MAX_MSG_LENGTH:
-                    send_log(message)
-                    message = running_message.replace(message, '')
-                    time.sleep(1)
-                else:
-                    message = running_message
-            send_log(message)
-            logger.info(f"{sender} release sent.")
-            del release_buffer[sender]
-
-
-def fetch_log(url):
-    try:
-        cookies = {'session': session_cookie}
-        response = requests.get(url, cookies=cookies,timeout=10)
-        response.raise_for_status()
-        return response.text.splitlines()
-    except requests.RequestException as e:
-        logger.error(f"Error fetching log file: {e}")
-        return []
+            elif kind == 'goals':
+                timestamp, sender = match.groups()
+                if sender not in self.game.players: self.game.players[sender] = {"goaled": True}
+                self.game.players[sender].goaled = True
+                self.game.players[sender].finished_percentage = self.game.players[sender].collection_percentage
 
-### Emitter events
+                message = f"**{sender} has finished!** That's {len([p for p in self.game.players.values() if p.is_goaled()])}/{len(self.game.players)} goaled! ({len([p for p in self.game.players.values() if p.is_finished()])}/{len(self.game.players)} including releases)"
+                if self.game.players[sender].collected_locations == self.game.players[sender].total_locations:
+                    message += f"\n**Wow!** {sender} 100%ed their game before finishing, too!"
+                if not skip_msg: 
+                    self.logger.info(f"{sender} has finished their game.")
+                    self.message_buffer.append(message)
+            elif kind == 'releases':
+                timestamp, sender = match.groups()
+                self.game.players[sender].released = True
+                if not skip_msg:
+                    logging.info("Release detected.")
+                    self.release_buffer[sender] = {
+                        'timestamp': parse_log_timestamp(timestamp, timezones.get(self.hostname, 'Etc/UTC'), aware=True),
+                        'items': defaultdict(list)
+                    }
+            elif kind == 'room_shutdown':
+                self.game.running = False
+                if not skip_msg:
+                    self.logger.info("Room has spun down due to inactivity.")
+            elif kind == 'room_spinup':
+                timestamp, address = match.groups()
+                self.game.running = True
+                if not skip_msg:
+                    self.logger.info(f"Room has spun up at {address}.")
+                if address != self.seed_address:
+                    if self.seed_address is None: seed_address_was = None
+                    else: seed_address_was = self.seed_address
+                    self.seed_address = address
+                    self.logger.info(f"Seed URI has changed: {address}")
+                    if not skip_msg and pool.available():
+                        with pool.cursor() as cursor:
+                            self.game.pushdb(cursor, 'pepper.ap_all_rooms', 'port', self.seed_address.split(":")[1])
+                        if seed_address_was is not None:
+                            message = f"**The seed address has changed.** Use this updated address: `{address}`"
+                            self.send_chat("Archipelago", message)
+                            self.message_buffer.append(message)
+                if self.start_time is None:
+                    self.start_time = parse_log_timestamp(timestamp, timezones.get(self.hostname, 'Etc/UTC'), aware=True)
+                    if self.start_time is None:
+                        self.logger.error(f"Failed to parse start time from timestamp: {timestamp}")
+                    self.logger.info(f"Start time set to {self.start_time} (epoch)")
+            elif kind == 'messages':
+                timestamp, sender, message = match.groups()
+                if self.msg_webhooks:
+                    if message.startswith("!"): continue # don't send commands
+                    else:
+                        if not skip_msg and sender in self.game.players:
+                            self.logger.info(f"{sender}: {message}")
+                            self.send_chat(sender, message)
 
-def handle_milestone_message(message):
-    # message_buffer.append(message)
-    pass
+            elif kind == 'joins':
+                timestamp, player, verb, playergame, client_version, tags = match.groups()
 
-event_emitter.on("milestone", handle_milestone_message)
+                timestamp = parse_log_timestamp(timestamp, timezones.get(self.hostname, 'Etc/UTC'))
+                
 
-### Main function to watch the log file
+                try:
+                    tags_str = tags
+                    tags = ast.literal_eval(tags_str)
+                    self.game.players[player].tags = tags
+                except json.JSONDecodeError:
+                    self.logger.error(f"Failed to parse player tags. {player}: {tags_str}")
+                    tags = tags_str
+                if not skip_msg and verb == "playing":
+                    self.logger.info(f"{player} ({playergame}) is online.")
+                    self.game.players[player].set_online(True, timestamp)
+                if "Tracker" in tags or verb == "tracking":
+                    if not skip_msg:
+                        pass
+                    #     message = f"{player} is checking what is in logic."
+                    #     self.message_buffer.append(message)
 
-def watch_log(url, interval):
-    global release_buffer
-    global players
-    global game
+            elif kind == 'parts':
+                timestamp, player, version, tags = match.groups()
 
-    last_line = 0
+                timestamp = parse_log_timestamp(timestamp, timezones.get(self.hostname, 'Etc/UTC'))
+                
+                if not skip_msg: self.logger.info(f"{player} is offline.")
+                self.game.players[player].set_online(False, timestamp)
 
-    logger.info("Fetching room info.")
-    for player in requests.get(api_url).json()["players"]:
-        game.players[player[0]] = Player(
-            name=player[0],
-            game=player[1]
-        )
-        game.spoiler_log[player[0]] = {}
-    del player
-    if seed_url:
-        logger.info("Processing spoiler log.")
-        process_spoiler_log(seed_url)
-    previous_lines = fetch_log(url)
-    logger.info("Parsing existing log lines before we start watching it...")
-
-    # Get the last line number we processed from the database
-    with sqlcon.cursor() as cursor:
-        try:
-            last_line = int(game.pulldb(cursor, 'pepper.ap_all_rooms', 'last_line'))
-        except TypeError:
-            # Last Line probably hasn't been set yet; this room is new
-            pass
+            else:
+                # Unmatched lines
+                self.logger.debug(f"Unparsed line: {line}")
+
+            line_end_time = time.time_ns()
+
+            # If the line processing took more than 5 ms, log it
+
+            if line_end_time - line_start_time > 5_000_000:
+                self.logger.debug(f"Processing line took {(line_end_time - line_start_time)/1_000_000} ms: {line}")
+
+        # Write out any locations seen in this batch
+        location_registry.flush()
+
+    def log_to_file(self, message):
+        os.makedirs('logs', exist_ok=True)  # Ensure logs directory exists
+        with open(f'logs/{self.room_id}.md', 'a', encoding='UTF-8') as log_file:
+            log_file.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+
+    def deliver(self, kind: str, payload: dict, record: dict = None):
+        """Spool a message, then hand it to the delivery workers. It's acknowledged in the spool
+        once every webhook has it, so anything undelivered gets sent again after a restart."""
+        if record is None and self.spool is not None:
+            record = self.spool.append(kind, payload, self.source_line)
+        on_done = None
+        if record is not None:
+            on_done = lambda delivered: self.spool.ack(record['id']) if delivered else None
+        delivery.send(self.msg_webhooks if kind == 'chat' else self.webhook_urls, payload, on_done)
+
+    def send_chat(self, sender, message):
+        # The spool's last line says every message up to it is spooled, so the log messages
+        # from the lines before this one have to go in ahead of it
+        self.flush_messages()
+        payload = {
+            "username": sender,
+            "content": message
+        }
 
-    process_new_log_lines(previous_lines[:last_line], True) # Read for hints etc
-    release_buffer = {}
-    logger.info(f"Initial log lines: {len(previous_lines[:last_line])}")
-    logger.info(f"Log lines queued up for processing: {len(previous_lines[last_line:])}")
-    for p in game.players.values():
-        p.update_locations(game)
-        p.on_item_collected(None)
-    game.update_locations()
-    logger.info(f"Total Checks: {game.total_locations}")
-    logger.info(f"Checks Collected: {game.collected_locations}")
-    logger.info(f"Completion Percentage: {round(game.collection_percentage,2)}%")
-    logger.info(f"Total Players: {len(game.players)}")
-    logger.info(f"Seed Address: {seed_address}")
-    logger.info(f"Logging messages to {len(webhook_urls)} webhook(s).")
-    logger.info(f"Logging chats to {len(msg_webhooks)} webhook(s).")
-    with sqlcon.cursor() as cursor:
-        try: 
-            game.pushdb(cursor, 'pepper.ap_all_rooms', 'port', seed_address.split(":")[1])
-            sqlcon.commit()
-        except AttributeError:
-            # Seed Address not processed/set yet
-            pass
+        self.deliver('chat', payload)
 
-    message_buffer.clear() # Clear buffer in case we have any old messages
+    def send_log(self, message):
+        payload = {
+            "content": message
+        }
 
-    if len(previous_lines) < 8: # If the seed has just started, post some info
-        message = f'''
-        **So begins another Archipelago...**
-        **Seed ID:** `{game.seed}`
-        **Seed Address:** `{seed_address}`
-        **Archipelago Version:** `{game.version_generator}`
-        **Players:** `{game.world_settings["Players"]}`
-        **Total Checks:** `{game.total_locations}*`'''
-
-        message_buffer.append(message)
-        logger.info("New room: Queuing initial message to Discord.")
-        del message
-    # classification_thread = threading.Thread(target=save_classifications)
-    # classification_thread.start()
-
-
-    logger.info("Ready!")
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    while True:
-        time.sleep(interval)
-        current_lines = fetch_log(url)
-        if len(current_lines) > last_line:
-            new_lines = current_lines[last_line:]
-            with sqlcon.cursor() as cursor:
-                game.pushdb(cursor, 'pepper.ap_all_rooms', 'last_line', len(current_lines))
-                sqlcon.commit()
-            process_new_log_lines(new_lines)
-            if message_buffer:
+        self.deliver('log', payload)
+
+    def send_release_messages(self, force: bool = False):
+        """Post the release messages whose items should all be in by now (or every one, if `force`)."""
+        def handle_currency(receiver, itemlist: dict):
+            currency = 0
+
+            currency_matches = {
+                'A Hat in Time': (re.compile(r'^([0-9]+) Pons$'), "Pons"),
+                'Final Fantasy': (re.compile(r'^Gold([0-9]+)$'), "Gold"),
+                'Jak and Daxter The Precursor Legacy': (re.compile(r'^([0-9]+) Precursor Orbs?$'), "Precursor Orbs"),
+                "Links Awakening DX": (re.compile(r'^([0-9]+) Rupees$'), "Rupees"),
+                'Link to the Past': (re.compile(r'^Rupees? \(([0-9]+)\)$'), "Rupees"),
+                'Ocarina of Time': (re.compile(r'^Rupees? \(([0-9]+)\)$'), "Rupees"),
+                'Pokemon FireRed and LeafGreen': (re.compile(r'^([0-9]+) Coins?$'), "Coins"),
+                'Sonic Adventure 2 Battle': (re.compile(r'^(\w+) Coins?$'), "Coins"),
+                'Super Mario World': (re.compile(r'^([0-9]+) coins?$'), "Coins"),
+            }
+
+            if self.game.players[receiver].game in currency_matches:
                 try:
-                    # Join all messages with newlines
-                    all_messages = '\n'.join(message_buffer)
-                    if len(all_messages) > MAX_MSG_LENGTH:
-                        logger.warning(f"Message buffer exceeded {MAX_MSG_LENGTH} characters, splitting into chunks.")
-                        # Split into chunks not exceeding MAX_MSG_LENGTH
-                        chunks = []
-                        current_chunk = ""
-                        for msg in message_buffer:
-                            # +1 for the newline if not first message
-                            if len(current_chunk) + len(msg) + (1 if current_chunk else 0) > MAX_MSG_LENGTH:
-                                if current_chunk:
-                                    chunks.append(current_chunk)
-                                current_chunk = msg
+                    for item, count in itemlist.copy().items():
+                        if match := currency_matches[self.game.players[receiver].game][0].match(item):
+                            if self.game.players[receiver].game == "Sonic Adventure 2 Battle":
+                                amount = w2n.word_to_num(match.groups()[0]) # why you make me do this
                             else:
-                                if current_chunk:
-                                    current_chunk += '\n' + msg
-                                else:
-                                    current_chunk = msg
+                                amount = int(match.groups()[0])
+                            currency = currency + (amount * count)
+                            del itemlist[item]
+                    if currency > 0:
+                        self.logger.info(f"Replacing (attempting) currency in {self.game.players[receiver].game} with '{currency} {currency_matches[self.game.players[receiver].game][1]}'")
+                        itemlist.update({f"{currency} {currency_matches[self.game.players[receiver].game][1]}": 1})
+                except KeyError:
+                    self.logger.info(f"No currency handler for {self.game.players[receiver].game}, but handle_currency matched it anyway somehow!")
+                    raise
+
+            return itemlist
+
+        for sender, data in self.release_buffer.copy().items():
+            if force or time.time() - data['timestamp'].timestamp() > 1:
+                message = f"**{sender}** has released their remaining items."
+                running_message = message
+                for receiver, items in data['items'].items():
+                    if self.game.players[receiver].is_finished():
+                        continue
+                    item_counts = defaultdict(int)
+                    for item in items:
+                        if item.is_filler(): continue
+                        item_counts[item.name] += 1
+                    handle_currency(receiver,item_counts)
+                    item_list = ', '.join(
+                        [f"{item} (x{count})" if count > 1 else item for item, count in item_counts.items()])
+                    running_message += f"\n{self.dim_if_goaled(receiver)}**{receiver}** receives: {item_list}"
+                    if len(running_message) > MAX_MSG_LENGTH:
+                        self.send_log(message)
+                        message = running_message.replace(message, '')
+                    else:
+                        message = running_message
+                self.send_log(message)
+                self.logger.info(f"{sender} release sent.")
+                del self.release_buffer[sender]
+
+    def fetch_log(self, full: bool = False, **kwargs):
+        try:
+            if full:
+                return self.log_tail.fetch_all(**kwargs)
+            return self.log_tail.fetch()
+        except requests.RequestException as e:
+            self.logger.error(f"Error fetching log file: {e}")
+            return []
+
+    ### Starting up
+
+    def fetch_players(self) -> list:
+        self.logger.info("Fetching room info.")
+        return self.session.get(self.api_url, timeout=10).json()["players"]
+
+    def prepare(self, players: list, spoiler: Iterable = None) -> tuple[int, int]:
+        """Set up the game from the room's players and spoiler records (see fetch_spoiler),
+        and work out where we left off in the log. Returns the line number and byte offset to resume from."""
+        for player in players:
+            self.game.players[player[0]] = Player(
+                name=player[0],
+                game=player[1]
+            )
+            self.game.spoiler_log[player[0]] = {}
+
+        # Everything about this room's games in one go, instead of a query or two per item
+        preload_games({p.game for p in self.game.players.values()})
+
+        if spoiler is not None:
+            self.logger.info("Processing spoiler log.")
+            self.apply_spoiler(spoiler)
+
+        return self.resume_point()
+
+    def resume_point(self) -> tuple[int, int]:
+        """The line number (and its byte offset, if known) we'd got to in the log, from the database or the spool."""
+        last_line = 0
+        last_offset = None
+        # Get the last line number (and its byte offset in the log) we processed from the database
+        with_offset = has_log_offset_column()
+        with pool.cursor() as cursor:
+            try:
+                last_line = int(self.game.pulldb(cursor, 'pepper.ap_all_rooms', 'last_line'))
+                if with_offset:
+                    last_offset = self.game.pulldb(cursor, 'pepper.ap_all_rooms', 'log_offset')
+            except TypeError:
+                # Last Line probably hasn't been set yet; this room is new
+                pass
+
+        # Messages are spooled before last_line is saved, so if the spool got further, we crashed in between.
+        # Everything up to its last line has been processed already (and its messages are in the spool)
+        if self.spool is None:
+            self.spool = MessageSpool(f"spool/{self.room_id}.jsonl")
+            # Anything from before the restart that never made it to Discord goes first (see catch_up).
+            # After hibernating there's no need: the delivery workers still have it
+            self.undelivered = self.spool.unacked()
+        if self.spool.last_line > last_line:
+            self.logger.info(f"Spool is ahead of the database (line {self.spool.last_line} vs {last_line}), resuming from there.")
+            last_line = self.spool.last_line
+            last_offset = None
+        self.source_line = last_line
+        return last_line, last_offset
+
+    def catch_up(self, previous_lines: list[str], last_line: int, fresh: bool = True):
+        """Replay the log up to where we left off (quietly), then queue whatever's new since.
+        `fresh` is False when the game came from a snapshot and previous_lines are only the lines after it."""
+        self.logger.info("Parsing existing log lines before we start watching it...")
+
+        self.process_new_log_lines(previous_lines[:last_line], True) # Read for hints etc
+        self.release_buffer = {}
+        self.logger.info(f"Initial log lines: {len(previous_lines[:last_line])}")
+        self.logger.info(f"Log lines queued up for processing: {len(previous_lines[last_line:])}")
+        for p in self.game.players.values():
+            p.update_locations(self.game)
+            p.on_item_collected(None)
+        self.game.update_locations()
+        self.logger.info(f"Total Checks: {self.game.total_locations}")
+        self.logger.info(f"Checks Collected: {self.game.collected_locations}")
+        self.logger.info(f"Completion Percentage: {round(self.game.collection_percentage,2)}%")
+        self.logger.info(f"Total Players: {len(self.game.players)}")
+        self.logger.info(f"Seed Address: {self.seed_address}")
+        self.logger.info(f"Logging messages to {len(self.webhook_urls)} webhook(s).")
+        self.logger.info(f"Logging chats to {len(self.msg_webhooks)} webhook(s).")
+        with pool.cursor() as cursor:
+            try:
+                self.game.pushdb(cursor, 'pepper.ap_all_rooms', 'port', self.seed_address.split(":")[1])
+            except AttributeError:
+                # Seed Address not processed/set yet
+                pass
+
+        self.message_buffer.clear() # Clear buffer in case we have any old messages
+
+        if fresh and last_line == 0 and len(previous_lines) < 8: # If the seed has just started, post some info
+            message = f'''
+        **So begins another Archipelago...**
+        **Seed ID:** `{self.game.seed}`
+        **Seed Address:** `{self.seed_address}`
+        **Archipelago Version:** `{self.game.version_generator}`
+        **Players:** `{self.game.world_settings["Players"]}`
+        **Total Checks:** `{self.game.total_locations}*`'''
+
+            self.message_buffer.append(message)
+            self.logger.info("New room: Queuing initial message to Discord.")
+            del message
+
+        for record in self.undelivered:
+            self.deliver(record['kind'], record['payload'], record)
+        self.undelivered = []
+
+    ### Watching the log
+
+    def process_batch(self, new_lines: list[str]):
+        """Handle one poll's worth of new lines: process them, spool their messages, and save our place."""
+        if len(new_lines) > 0:
+            # Counted up line by line as they're processed, ending at line_count
+            self.source_line = self.log_tail.line_count - len(new_lines)
+            self.process_new_log_lines(new_lines)
+            self.flush_messages()
+
+        if len(self.release_buffer) > 0:
+            if any(datetime.now(ZoneInfo("UTC")).astimezone() - self.release_buffer[sender]['timestamp'] > RELEASE_DELTA for sender in self.release_buffer.keys()):
+                self.logger.info(f"Release buffer period has already passed, sending.")
+                self.send_release_messages()
+
+        if len(new_lines) > 0:
+            # A release's items are all logged together, so any release in these lines is complete,
+            # and its message has to be spooled before the lines count as done
+            if len(self.release_buffer) > 0:
+                self.send_release_messages(force=True)
+            # Only now that these lines' messages are safely spooled do we count them as done
+            with_offset = has_log_offset_column()
+            with pool.cursor() as cursor:
+                self.game.pushdb(cursor, 'pepper.ap_all_rooms', 'last_line', self.log_tail.line_count)
+                if with_offset:
+                    self.game.pushdb(cursor, 'pepper.ap_all_rooms', 'log_offset', self.log_tail.offset)
+            if time.monotonic() - self.snapshot_at >= SNAPSHOT_EVERY:
+                self.save_snapshot()
+
+        # Check if all players have finished
+        if all(p.is_finished() for p in self.game.players.values()) and len(self.message_buffer) == 0 and len(self.release_buffer) == 0:
+            self.logger.info("All players have finished and are offline, and there's no more messages in the buffers to process. We're done here.")
+            self.wrap_up()
+            self.finished = True
+            return
+
+        self.logger.debug(f"Message buffer has {len(self.message_buffer)} messages queued.")
+
+    def flush_messages(self):
+        """Send everything in the message buffer to the log webhooks, split to fit Discord's message limit."""
+        if not self.message_buffer:
+            return
+        try:
+            # Join all messages with newlines
+            all_messages = '\n'.join(self.message_buffer)
+            if len(all_messages) > MAX_MSG_LENGTH:
+                self.logger.warning(f"Message buffer exceeded {MAX_MSG_LENGTH} characters, splitting into chunks.")
+                # Split into chunks not exceeding MAX_MSG_LENGTH
+                chunks = []
+                current_chunk = ""
+                for msg in self.message_buffer:
+                    # +1 for the newline if not first message
+                    if len(current_chunk) + len(msg) + (1 if current_chunk else 0) > MAX_MSG_LENGTH:
                         if current_chunk:
                             chunks.append(current_chunk)
-                        # Send each chunk, waiting 2 seconds between
-                        for i, chunk in enumerate(chunks):
-                            send_log(chunk)
-                            logger.debug(f"sent chunk {i+1}/{len(chunks)} ({len(chunk)} chars) to webhook")
-                            if i < len(chunks) - 1:
-                                time.sleep(2)
+                        current_chunk = msg
                     else:
-                        send_log(all_messages)
-                        logger.debug(f"sent {len(message_buffer)} messages ({len(all_messages)} chars) to webhook")
-
-                    # Clear the buffer and sync last_line if successful
-                    message_buffer.clear()
-                    last_line = len(current_lines)
-                except requests.RequestException as e:
-                    pass
-            if len(message_buffer) == 0 and len(release_buffer) == 0:
-                # If we have no messages to send but the log has updated, sync last_line anyway
-                last_line = len(current_lines)
-
-        if len(release_buffer) > 0:
-            if any(datetime.now(ZoneInfo("UTC")).astimezone() - release_buffer[sender]['timestamp'] > RELEASE_DELTA for sender in release_buffer.keys()):
-                logger.info(f"Release buffer period has already passed, sending.")
-                send_release_messages()
+                        if current_chunk:
+                            current_chunk += '\n' + msg
+                        else:
+                            current_chunk = msg
+                if current_chunk:
+                    chunks.append(current_chunk)
+                # Chunks go out in order; the delivery worker spaces them out as Discord allows
+                for i, chunk in enumerate(chunks):
+                    self.send_log(chunk)
+                    self.logger.debug(f"queued chunk {i+1}/{len(chunks)} ({len(chunk)} chars) for webhook")
+            else:
+                self.send_log(all_messages)
+                self.logger.debug(f"queued {len(self.message_buffer)} messages ({len(all_messages)} chars) for webhook")
 
-        # Check if all players have finished
-        if all(p.is_finished() for p in game.players.values()) and len(message_buffer) == 0 and len(release_buffer) == 0:
-            logger.info("All players have finished and are offline, and there's no more messages in the buffers to process. We're done here.")
-            
-            # Some maintenance items before we exit
-            for p in game.players.values():
-                if p.released is True:
-                    # Any locations not 'checked' by this point should be marked as uncheckable
-                    logger.info(f"{p.name} ({p.game}) released, marking remaining unchecked locations as uncheckable.")
-                    for loc in p.locations.values():
-                        if loc.found is False and loc.is_location_checkable is None:
-                            logger.info(f"Marking {p.game}: {loc.name} as uncheckable.")
-                            loc.db_add_location(is_check=False)
-            
-            # We're done, exit process
-            logger.info("Exiting process.")
-            sys.exit(0)
-
-        logger.debug(f"Message buffer has {len(message_buffer)} messages queued.")
-
-def process_releases():
-    global release_buffer
-    logger.info("Watching for releases.")
+            # Clear the buffer once it's spooled
+            self.message_buffer.clear()
+        except requests.RequestException as e:
+            pass
+
+    def wrap_up(self):
+        """Some maintenance items before we stop tracking a finished room."""
+        for p in self.game.players.values():
+            if p.released is True:
+                # Any locations not 'checked' by this point should be marked as uncheckable
+                self.logger.info(f"{p.name} ({p.game}) released, marking remaining unchecked locations as uncheckable.")
+                for loc in p.locations.values():
+                    if loc.found is False and loc.is_location_checkable is None:
+                        self.logger.info(f"Marking {p.game}: {loc.name} as uncheckable.")
+                        loc.db_add_location(is_check=False)
+        location_registry.flush()
+
+    async def run(self):
+        """Track the room until every player has finished, hibernating whenever it's been idle for a while.
+        Downloads run on their own threads, and everything else on the shared processing thread,
+        so other rooms keep going meanwhile."""
+        self.loop = asyncio.get_running_loop()
+        self.wake_up = asyncio.Event()
+        self.open_logfile()
+
+        # Up the whole time, so the bot can wake us if we're hibernating
+        self.ipc_server = TrackerServer(socket_path(self.room_id), self.answer_bot)
+        self.ipc_server.start()
+        try:
+            if self.restore_hibernation():
+                await self.sleep_until_woken()
+            while True:
+                await self.load()
+                await self.track()
+                if self.finished:
+                    self.forget_snapshot() # Nothing left to resume
+                    break
+                await self.loop.run_in_executor(processing, self.hibernate)
+                await self.sleep_until_woken()
+        finally:
+            self.awake.clear()
+            self.ipc_server.stop()
+        self.logger.info("Stopped tracking this room.")
+
+    async def load(self):
+        """Build the game up from the room info, spoiler and log, ready to follow the log from where we left off."""
+        self.forget_hibernation()
+        await budget.acquire(self.hostname)
+        players = await asyncio.to_thread(self.fetch_players)
+        if await self.resume_from_snapshot(players):
+            return
+        spoiler = await asyncio.to_thread(self.fetch_spoiler, players) if self.seed_url else None
+        last_line, last_offset = await self.loop.run_in_executor(processing, self.prepare, players, spoiler)
+        # Read the whole log once, and leave the tail just after the last line we processed
+        await budget.acquire(self.hostname)
+        previous_lines = await asyncio.to_thread(self.fetch_log, True, resume_line=last_line, resume_offset=last_offset)
+        await self.loop.run_in_executor(processing, self.catch_up, previous_lines, last_line)
+        del previous_lines
+        # So the next start doesn't have to do all that again
+        await self.loop.run_in_executor(processing, self.save_snapshot)
+        self.ready()
+
+    async def resume_from_snapshot(self, players: list) -> bool:
+        """Load the game from its last snapshot and catch up from there: only the log after the snapshot is
+        downloaded, and only the lines between it and where we left off are replayed. Returns False
+        (with nothing loaded) if there's no usable snapshot, and the game has to be built from scratch."""
+        snapshot = await self.loop.run_in_executor(processing, self.restore_snapshot, players)
+        if snapshot is None:
+            return False
+        last_line, _ = await self.loop.run_in_executor(processing, self.resume_point)
+        if snapshot['line_count'] <= last_line:
+            self.log_tail.line_count = snapshot['line_count']
+            self.log_tail.offset = snapshot['offset']
+            self.log_tail.etag = self.log_tail.last_modified = None
+            await budget.acquire(self.hostname)
+            new_lines = await asyncio.to_thread(self.fetch_log)
+            if self.log_tail.line_count >= last_line:
+                replay = last_line - snapshot['line_count']
+                self.logger.info(f"Resuming from the snapshot at line {snapshot['line_count']}, {replay} line(s) to replay.")
+                await self.loop.run_in_executor(processing, self.catch_up, new_lines, replay, False)
+                await self.loop.run_in_executor(processing, self.process_batch, new_lines[replay:])
+                self.ready()
+                return True
+        self.logger.warning(f"Snapshot (line {snapshot['line_count']}) doesn't line up with the log (line {last_line}), loading it all again.")
+        await self.loop.run_in_executor(processing, self.reset)
+        self.forget_snapshot()
+        return False
+
+    def ready(self):
+        self.loads += 1
+        self.last_activity = time.monotonic()
+        self.awake.set()
+        self.logger.info("Ready!")
+
+    async def track(self):
+        """Follow the log until the room's finished, or it's been idle long enough to hibernate."""
+        self.wake_up.clear()
+        self.poll_interval = self.interval
+        releases = asyncio.create_task(self.watch_releases())
+        try:
+            while not self.finished:
+                await asyncio.sleep(self.poll_interval)
+                await budget.acquire(self.hostname)
+                new_lines = await asyncio.to_thread(self.fetch_log)
+                await self.loop.run_in_executor(processing, self.process_batch, new_lines)
+                interval = self.next_interval(len(new_lines))
+                if interval != self.poll_interval:
+                    self.logger.debug(f"Polling every {interval}s now ({len(new_lines)} new lines).")
+                    self.poll_interval = interval
+                if new_lines:
+                    self.last_activity = time.monotonic()
+                elif self.idle():
+                    return
+        finally:
+            releases.cancel()
+
+    def next_interval(self, new_lines: int) -> float:
+        """How long to wait before polling again, going by how much the last poll brought in."""
+        if new_lines >= BURST_LINES:
+            return MIN_INTERVAL
+        if new_lines > 0:
+            return max(self.poll_interval / 2, MIN_INTERVAL)
+        if any(p.online for p in self.game.players.values()):
+            return min(self.poll_interval * 2, ONLINE_INTERVAL)
+        return min(self.poll_interval * 2, MAX_INTERVAL)
+
+    ### Snapshots
+
+    def snapshot_path(self) -> str:
+        return os.path.join('spool', f"{self.room_id}.state.pickle.gz")
+
+    def save_snapshot(self):
+        """Save the game as of the last line processed, next to the spool, so a restart can pick it back up
+        instead of replaying the whole log. Only called on the processing thread, between batches."""
+        state = {
+            'format': SNAPSHOT_FORMAT,
+            'room_id': self.room_id,
+            'seed_id': self.seed_id,
+            'line_count': self.log_tail.line_count,
+            'offset': self.log_tail.offset,
+            'seed_address': self.seed_address,
+            'start_time': self.start_time,
+            'game': self.game,
+        }
+        path = self.snapshot_path()
+        start = time.perf_counter()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written somewhere else first so a half-written one is never picked up
+            with gzip.open(f"{path}.tmp", 'wb', compresslevel=1) as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{path}.tmp", path)
+        except (OSError, pickle.PicklingError, RecursionError) as e:
+            self.logger.error(f"Couldn't save a snapshot of the game: {e}")
+            return
+        finally:
+            self.snapshot_at = time.monotonic()
+        self.logger.debug(f"Saved a snapshot at line {state['line_count']} in {(time.perf_counter() - start) * 1000:.0f} ms.")
+
+    def restore_snapshot(self, players: list) -> dict | None:
+        """Put the game back as it was in the last snapshot, if there's one for this seed and these players.
+        Returns the rest of the snapshot (where it was in the log), or None if there's nothing usable."""
+        path = self.snapshot_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, 'rb') as file:
+                state = pickle.load(file)
+            if state['format'] != SNAPSHOT_FORMAT or state['room_id'] != self.room_id or state['seed_id'] != self.seed_id:
+                raise ValueError("it's for a different format, room or seed")
+            game = state.pop('game')
+            if list(game.players) != [player[0] for player in players]:
+                raise ValueError("the room's players have changed")
+        except Exception as e:
+            self.logger.warning(f"Discarding the game snapshot: {e}")
+            self.forget_snapshot()
+            return None
+
+        self.game = game
+        self.seed_address = state['seed_address']
+        self.start_time = state['start_time']
+        self.line_classifier = None
+        games = {p.game for p in game.players.values()}
+        preload_games(games)
+        # Classifications may have been changed while we weren't listening
+        game.refresh_classifications(games)
+        self.snapshot_at = time.monotonic()
+        return state
+
+    def forget_snapshot(self):
+        if os.path.exists(self.snapshot_path()):
+            os.remove(self.snapshot_path())
+
+    ### Hibernating
+
+    def idle(self) -> bool:
+        """Spun down, nothing new in the log for hibernate_after seconds, and nothing left to send."""
+        return (bool(self.hibernate_after) and not self.game.running
+                and not self.release_buffer and not self.message_buffer
+                and time.monotonic() - self.last_activity >= self.hibernate_after)
+
+    def hibernation_path(self) -> str:
+        return os.path.join(HIBERNATE_DIR, f"{self.room_id}.json")
+
+    def hibernate(self):
+        """Save our place in the log and a snapshot of the game, and let go of it until sleep_until_woken says otherwise.
+        Waking up loads the snapshot and only reads the log after it (see resume_from_snapshot)."""
+        self.logger.info(f"Room has been idle for {int(time.monotonic() - self.last_activity) // 60} minutes, hibernating.")
+        self.awake.clear()
+        state = {
+            'hibernated_at': time.time(),
+            'line_count': self.log_tail.line_count,
+            'offset': self.log_tail.offset,
+            'etag': self.log_tail.etag,
+            'last_modified': self.log_tail.last_modified,
+            'seed_address': self.seed_address,
+        }
+        os.makedirs(HIBERNATE_DIR, exist_ok=True)
+        with open(f"{self.hibernation_path()}.tmp", 'w', encoding='UTF-8') as file:
+            json.dump(state, file)
+        os.replace(f"{self.hibernation_path()}.tmp", self.hibernation_path())
+        self.save_snapshot()
+
+        self.reset()
+
+    def reset(self):
+        """Let go of the game and everything else that's rebuilt from the log when the room loads again."""
+        self.game = Game(self.room_id)
+        self.line_classifier = None
+        self.release_buffer = {}
+        self.message_buffer = []
+        self.finished = False
+        gc.collect()
+
+    def restore_hibernation(self) -> bool:
+        """If this room was hibernating when the process stopped, pick its place in the log back up
+        (without loading anything else) and return True."""
+        try:
+            with open(self.hibernation_path(), 'r', encoding='UTF-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return False
+        except (OSError, json.JSONDecodeError) as e:
+            self.logger.warning(f"Couldn't read hibernation state, starting normally: {e}")
+            return False
+        self.log_tail.line_count = state['line_count']
+        self.log_tail.offset = state['offset']
+        self.log_tail.etag = state['etag']
+        self.log_tail.last_modified = state['last_modified']
+        self.seed_address = state['seed_address']
+        self.logger.info(f"Room was hibernating (since {datetime.fromtimestamp(state['hibernated_at']).strftime('%Y-%m-%d %H:%M')}), staying asleep until there's something new.")
+        return True
+
+    def forget_hibernation(self):
+        if os.path.exists(self.hibernation_path()):
+            os.remove(self.hibernation_path())
+
+    def probe_log(self) -> bool:
+        try:
+            return self.log_tail.probe()
+        except requests.RequestException as e:
+            self.logger.error(f"Error probing log file: {e}")
+            return False
+
+    async def sleep_until_woken(self):
+        """Check the log every PROBE_INTERVAL while hibernating, until it's changed or the bot asks about the room."""
+        while True:
+            try:
+                await asyncio.wait_for(self.wake_up.wait(), PROBE_INTERVAL)
+                self.logger.info("The bot asked about this room, waking up.")
+                return
+            except asyncio.TimeoutError:
+                pass
+            await budget.acquire(self.hostname)
+            if await asyncio.to_thread(self.probe_log):
+                self.logger.info("Log has changed, waking up.")
+                return
+
+    async def watch_releases(self):
+        self.logger.info("Watching for releases.")
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await asyncio.sleep(10)
+            while len(self.release_buffer) > 0:
+                await asyncio.sleep(self.interval)
+                await loop.run_in_executor(processing, self.send_release_messages)
+
+    ### Answering questions about the room
+
+    def answer_bot(self, message: dict) -> dict:
+        """Answer the bot's /aproom commands over IPC. Every player's summary is always sent (it's small),
+        but inventories and hints are only put together for the players the bot asked about.
+        If the room is hibernating, this wakes it up, and {'waking': True} means ask again shortly.
+
+        Runs on the IPC server's threads, so the answer itself is put together on the processing thread,
+        where nothing can be changing the game while we read it."""
+        deadline = time.monotonic() + WAKE_WAIT
+        if not self.awake.is_set():
+            self.loop.call_soon_threadsafe(self.wake_up.set)
+            if not self.awake.wait(WAKE_WAIT):
+                return {'waking': True}
+        answer = processing.submit(self.build_answer, message)
+        try:
+            return answer.result(max(deadline - time.monotonic(), 1))
+        except FutureTimeout:
+            # Still busy with a big batch (or catching up after waking), so it's the same as waking up
+            answer.cancel()
+            return {'waking': True}
+
+    def build_answer(self, message: dict) -> dict:
+        match message.get('get'):
+            case 'players':
+                names = set(message.get('names') or [])
+                include = set(message.get('include') or [])
+                players = {}
+                for name, player in list(self.game.players.items()):
+                    players[name] = player.summary()
+                    if name not in names:
+                        continue
+                    if 'inventory' in include:
+                        players[name]['inventory'] = player.inventory_dicts()
+                    if 'hints' in include:
+                        players[name]['hints'] = player.hints_dicts()
+                return {'game': self.game.summary(), 'players': players}
+            case _:
+                return {'error': f"Unknown request: {message.get('get')}"}
+
+    def make_webview(self) -> Flask:
+        """This room's web API. run_webview serves it under /<room_id>."""
+        webview = Flask(f"{__name__}.{self.room_id}")
+
+        @webview.before_request
+        def check_awake():
+            if not self.awake.is_set():
+                return jsonify({'error': "This room is hibernating. It'll wake up when there's something new in its log."}), 503
+
+        @webview.route('/inspect', methods=['GET'])
+        def inspect():
+            # For easier reading, return as plain text
+            import pprint
+            return Response(pprint.pformat({k: repr(v) for k, v in vars(self).items() if not callable(v)}), mimetype='text/plain')
+
+        @webview.route('/inspectgame', methods=['GET'])
+        def get_game():
+            return jsonify(self.game.to_dict())
+
+        @webview.route('/players', methods=['GET'])
+        def get_players():
+            summaries = {'game': self.game.summary(), 'players': {name: p.summary() for name, p in list(self.game.players.items())}}
+            return conditional_json(hashed_etag('players', summaries), lambda: summaries)
+
+        @webview.route('/players/<name>/summary', methods=['GET'])
+        def get_player_summary(name: str):
+            player = self.game.players.get(name)
+            if player is None:
+                return jsonify({'error': f"No player named {name}"}), 404
+            summary = player.summary()
+            return conditional_json(hashed_etag(f"{name}-summary", summary), lambda: summary)
+
+        @webview.route('/players/<name>/inventory', methods=['GET'])
+        def get_player_inventory(name: str):
+            """?since=<unix timestamp> only returns items received after then. Paginated with ?offset= and ?limit=."""
+            player = self.game.players.get(name)
+            if player is None:
+                return jsonify({'error': f"No player named {name}"}), 404
+            since = request.args.get('since', type=float)
+
+            def build():
+                items = player.inventory_dicts()
+                if since is not None:
+                    items = [i for i in items if i['received_timestamp'] is not None and i['received_timestamp'] > since]
+                return paginate(items)
+
+            return conditional_json(f"{ETAG_BOOT}.{self.loads}-{name}-inventory-{player.inventory_revision}", build)
+
+        @webview.route('/players/<name>/hints', methods=['GET'])
+        def get_player_hints(name: str):
+            """?type=sending or ?type=receiving for just one side. Paginated with ?offset= and ?limit=."""
+            player = self.game.players.get(name)
+            if player is None:
+                return jsonify({'error': f"No player named {name}"}), 404
+            hint_type = request.args.get('type')
+
+            def build():
+                hints = player.hints_dicts()
+                if hint_type is not None:
+                    return {hint_type: paginate(hints.get(hint_type, []))}
+                return {k: paginate(v) for k, v in hints.items()}
+
+            return conditional_json(f"{ETAG_BOOT}.{self.loads}-{name}-hints-{player.hints_revision}", build)
+
+        @webview.route('/locations/checkable/', methods=['GET'], defaults={'found': False})
+        @webview.route('/locations/checkable/found', methods=['GET'], defaults={'found': True})
+        def get_checkable_locations(found: bool = False):
+            locationtable = {}
+            for player_name, player in self.game.players.items():
+                if player.game not in locationtable:
+                    locationtable[player.game] = {}
+                for location_name, location in player.locations.items():
+                    if found:
+                        locationtable[player.game][location_name] = [location.found, location.is_location_checkable]
+                    else:
+                        locationtable[player.game][location_name] = location.is_location_checkable
+            return jsonify(locationtable)
+
+        return webview
 
-    while True:
-        time.sleep(10)
-        while len(release_buffer) > 0:
-            time.sleep(INTERVAL)
-            send_release_messages()
 
 # Flask stuff
-webview = Flask(__name__)
-
-def safe_globals():
-    # Only show non-private, non-module, non-callable globals
-    return {k: repr(v) for k, v in globals().items()
-            if not k.startswith('__') and
-               not callable(v) and
-               not isinstance(v, type(webview)) and
-               k not in ('webview', 'request', 'Response')}
-
-@webview.route('/inspect', methods=['GET'])
-def inspect():
-    # For easier reading, return as plain text
-    import pprint
-    return Response(pprint.pformat(safe_globals()), mimetype='text/plain')
-
-@webview.route('/inspectgame', methods=['GET'])
-def get_game():
-    return jsonify(game.to_dict())
-
-@webview.route('/locations/checkable/', methods=['GET'], defaults={'found': False})
-@webview.route('/locations/checkable/found', methods=['GET'], defaults={'found': True})
-def get_checkable_locations(found: bool = False):
-    locationtable = {}
-    for player_name, player in game.players.items():
-        if player.game not in locationtable:
-            locationtable[player.game] = {}
-        for location_name, location in player.locations.items():
-            if found:
-                locationtable[player.game][location_name] = [location.found, location.is_location_checkable]
-            else:
-                locationtable[player.game][location_name] = location.is_location_checkable
-    return jsonify(locationtable)
 
-def run_flask():
+# Scoped endpoints, so nobody has to download the whole game for one player's items.
+# ETags come from the players' revision counters (or a hash, for the small summaries), so a client that
+# sends If-None-Match gets a 304 without anything being serialised. The boot time is part of every ETag,
+# since revisions start from 0 again when the tracker restarts (as is the room's load count, for waking from hibernation).
+ETAG_BOOT = str(int(time.time()))
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def conditional_json(etag: str, build):
+    """jsonify(build()) with an ETag, or a 304 if the client already has this version."""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
+def hashed_etag(kind: str, payload) -> str:
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+    return f"{ETAG_BOOT}-{kind}-{digest}"
+
+def paginate(entries: list) -> dict:
+    """Slice a list by the ?offset= and ?limit= query args."""
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    page = entries[offset:offset + limit]
+    return {
+        'total': len(entries),
+        'offset': offset,
+        'limit': limit,
+        'next_offset': offset + limit if offset + limit < len(entries) else None,
+        'entries': page,
+    }
+
+def run_webview(trackers: list[RoomTracker]):
+    """Serve every room's web API from one port, each under /<room_id>."""
+    room_ids = [t.room_id for t in trackers]
+
     # Dynamically select an available port starting from 42069
     port = 42069
     while True:
@@ -1024,9 +1412,9 @@ def run_flask():
                 s.close()
 
                 # Check if the port is already in use by another seed in the database
-                if sqlcon:
-                    with sqlcon.cursor() as cursor:
-                        cursor.execute("SELECT COUNT(*) FROM pepper.ap_all_rooms WHERE flask_port = %s AND room_id != %s AND active = 'true'", (port, room_id))
+                if pool.available():
+                    with pool.cursor() as cursor:
+                        cursor.execute("SELECT COUNT(*) FROM pepper.ap_all_rooms WHERE flask_port = %s AND room_id != ALL(%s) AND active = 'true'", (port, room_ids))
                         if cursor.fetchone()[0] == 0:
                             pass
                         else: raise ValueError(f"Port {port} is already in use by another seed in the database.")
@@ -1036,20 +1424,95 @@ def run_flask():
             except ValueError:
                 port += 1
 
-    logger.info(f"Starting Flask webview on port {port}...")
+    logger.info(f"Starting Flask webview on port {port} for {len(trackers)} room(s)...")
 
     # Store the selected port in the database for use elsewhere
-    if sqlcon:
-        with sqlcon.cursor() as cursor:
-            game.pushdb(cursor, 'pepper.ap_all_rooms', 'flask_port', port)
-            sqlcon.commit()
-    webview.run(host='127.0.0.1', port=port, debug=False, use_reloader=False)
+    if pool.available():
+        with pool.cursor() as cursor:
+            for tracker in trackers:
+                tracker.game.pushdb(cursor, 'pepper.ap_all_rooms', 'flask_port', port)
 
-if __name__ == "__main__":
+    index = Flask(__name__)
+    index.add_url_rule('/', 'rooms', lambda: jsonify(room_ids))
+    app = DispatcherMiddleware(index, {f"/{t.room_id}": t.make_webview() for t in trackers})
+    run_simple('127.0.0.1', port, app, threaded=True, use_reloader=False)
 
-    logger.info(f"logging messages from AP Room ID {room_id}")
+### Running rooms
 
-    release_thread = threading.Thread(target=process_releases)
-    release_thread.start()
+async def watch_db_changes(trackers: list[RoomTracker]):
+    """Pick up classification and location changes the bot tells us about, for every room at once."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(INTERVAL)
+        await loop.run_in_executor(processing, lambda: apply_db_changes(*[t.game for t in trackers]))
+
+async def run_room(tracker: RoomTracker):
+    """Track one room until it's finished. If its tracker crashes, only this room is started again
+    (after a backoff), picking up where it left off; the other rooms in the process carry on."""
+    backoff = 0
+    while True:
+        started = time.monotonic()
+        try:
+            await tracker.run()
+            return
+        except PROCESS_ERRORS:
+            raise
+        except Exception as e:
+            if time.monotonic() - started > ROOM_STABLE_AFTER:
+                backoff = 0
+            backoff = min(max(backoff * 2, ROOM_BACKOFF_MIN), ROOM_BACKOFF_MAX)
+            # Goes to the room's own log file, and on to the console
+            tracker.logger.error(f"Tracker for room {tracker.room_id} crashed: {e!r}. Restarting it in {backoff}s.", exc_info=e)
+        tracker.reset()
+        await asyncio.sleep(backoff)
+
+async def run_rooms(trackers: list[RoomTracker]) -> bool:
+    """Track several rooms in this process, each as its own task, until they've all finished.
+    A room that crashes is restarted on its own (see run_room). Only errors that affect the whole
+    process stop every room; then this returns False, so the process exits with an error
+    and the bot's supervisor starts it again (every room picks up where it left off)."""
+    for tracker in trackers:
+        logger.info(f"logging messages from AP Room ID {tracker.room_id}")
+    threading.Thread(target=run_webview, args=(trackers,), daemon=True).start()
+    db_changes = asyncio.create_task(watch_db_changes(trackers))
+
+    tasks = {asyncio.create_task(run_room(t)): t for t in trackers}
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    ok = True
+    for task in done:
+        if task.exception() is not None:
+            logger.error(f"Stopping every room, since room {tasks[task].room_id} hit a problem with the whole process: {task.exception()!r}", exc_info=task.exception())
+            ok = False
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    db_changes.cancel()
+    # We're done, exit process (once everything has been posted)
+    delivery.flush()
+    logger.info("Exiting process.")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Track Archipelago rooms and post their progress to Discord.")
+    parser.add_argument('--guilds', nargs='+',
+                        help="Track these guilds' rooms from config.yaml, together in this process. Without it, the room comes from the environment (LOG_URL etc).")
+    args = parser.parse_args()
+    setup_logging()
+    cfg = load_config()
+
+    hibernate_after = cfg['bot']['archipelago'].get('hibernate_after', HIBERNATE_AFTER)
+    budget.per_minute = cfg['bot']['archipelago'].get('host_budget', HOST_BUDGET)
+    if args.guilds:
+        itemlogs = cfg['bot']['archipelago']['itemlogs']
+        trackers = [RoomTracker.from_config(log, hibernate_after=hibernate_after) for log in itemlogs if str(log['guild']) in args.guilds]
+        # Our share of the budget, so all the workers together stay within it
+        budget.per_minute *= len(trackers) / max(len(itemlogs), 1)
+    else:
+        try:
+            trackers = [RoomTracker.from_env(cfg, hibernate_after=hibernate_after)]
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
 
-    watch_log(log_url, INTERVAL)
+    sys.exit(0 if asyncio.run(run_rooms(trackers)) else 1)
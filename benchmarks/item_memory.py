@@ -0,0 +1,120 @@
+"""Compare the memory used by a room's worth of Items, before and after Item was slotted.
+
+LegacyItem below is the old layout (a dict subclass with everything in its __dict__ and
+a fresh copy of every name string). Items are built without going through Item.__init__,
+so no database or player settings are needed, only the memory layout is measured.
+
+Usage:
+    python benchmarks/item_memory.py [--players 40] [--locations 500] [--items 120]
+"""
+import argparse
+import datetime
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cmds.ap_scripts.utils import Item
+
+
+class LegacyItem(dict):
+    sender = None
+    receiver = None
+    name = None
+    game = None
+    location = None
+    location_costs: list[str] = []
+    location_info: str = None
+    location_entrance = None
+    is_location_checkable = None
+    classification = None
+    count = 1
+    found = False
+    hinted = False
+    spoiled = False
+    received_timestamp: datetime.datetime = None
+
+
+class FakePlayer:
+    def __init__(self, name: str, game: str):
+        self.name = name
+        self.game = game
+
+
+def fresh(s: str) -> str:
+    """A new copy of a string, like the ones that come out of a regex match"""
+    return ''.join(list(s))
+
+
+def build(cls, players: list, locations: int, item_names: int, intern: bool) -> list:
+    start = datetime.datetime.now()
+    items = []
+    for p, sender in enumerate(players):
+        for l in range(locations):
+            receiver = players[(p + l) % len(players)]
+            obj = cls.__new__(cls)
+            obj.tracked_by = None # Not counted towards any player's location totals
+            name, location, game = fresh(f"Item {l % item_names}"), fresh(f"Location {l}"), fresh(receiver.game)
+            if intern:
+                name, location, game = sys.intern(name), sys.intern(location), sys.intern(game)
+            obj.sender = sender
+            obj.receiver = receiver
+            obj.name = name
+            obj.game = game
+            obj.location = location
+            obj.location_entrance = None
+            obj.location_costs = []
+            obj.location_info = ""
+            obj.is_location_checkable = True
+            obj.classification = "filler"
+            obj.count = 1
+            obj.found = False
+            obj.hinted = False
+            obj.spoiled = False
+            obj.received_timestamp = start
+            items.append(obj)
+    return items
+
+
+def rss() -> int:
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def measure(label: str, cls, players: list, args) -> int:
+    gc.collect()
+    rss_before = rss()
+    tracemalloc.start()
+    items = build(cls, players, args.locations, args.items, intern=cls is Item)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss()
+
+    print(f"{label}: {len(items)} items, {allocated / 1024 / 1024:.1f} MiB allocated "
+          f"({allocated / len(items):.0f} bytes/item), RSS +{(rss_after - rss_before) / 1024 / 1024:.1f} MiB")
+    del items
+    gc.collect()
+    return allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=40, help="Slots in the room")
+    parser.add_argument('--locations', type=int, default=500, help="Locations per slot")
+    parser.add_argument('--items', type=int, default=120, help="Distinct item names per game")
+    args = parser.parse_args()
+
+    players = [FakePlayer(f"Player{n}", f"Game {n % 12}") for n in range(args.players)]
+
+    legacy = measure("dict-based Item", LegacyItem, players, args)
+    slotted = measure("slotted Item   ", Item, players, args)
+    print(f"Slotted Items use {slotted / legacy * 100:.0f}% of the memory ({legacy / slotted:.1f}x less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Replay a recorded Archipelago room log through the log line classifier.
+
+Compares the old approach (trying every pattern in turn) against LogLineClassifier,
+and checks that both agree on every line. With --timestamps, also times dateparser against
+parse_log_timestamp on the line timestamps.
+
+Usage (from the repository root):
+    python benchmarks/replay_log.py path/to/room.log [--players "Name1,Name2"] [--repeat 3] [--timestamps]
+
+If --players isn't given, player names are picked up from the join lines in the log.
+"""
+import argparse
+import os
+import sys
+import time
+
+import regex as re
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cmds.ap_scripts.logparse import LogLineClassifier, parse_log_timestamp
+
+
+def find_players(lines: list[str]) -> set[str]:
+    joins = re.compile(r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) (?:playing|viewing|tracking) ')
+    return {match.group(2) for line in lines if (match := joins.match(line))}
+
+
+def time_pass(classify, lines: list[str], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            classify(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help="Path to a saved room log")
+    parser.add_argument('--players', help="Comma-separated slot names (default: read from join lines)")
+    parser.add_argument('--repeat', type=int, default=3, help="Passes per method; the best one is reported")
+    parser.add_argument('--timestamps', action='store_true', help="Also benchmark timestamp parsing (slow: dateparser runs once per line)")
+    parser.add_argument('--timezone', default='Etc/UTC', help="Host timezone to parse timestamps in")
+    args = parser.parse_args()
+
+    with open(args.log, 'r', encoding='UTF-8') as file:
+        lines = file.read().splitlines()
+
+    players = set(args.players.split(',')) if args.players else find_players(lines)
+    classifier = LogLineClassifier(players)
+    print(f"{len(lines)} lines, {len(players)} players")
+
+    # Both paths have to agree before the timings mean anything
+    mismatches = 0
+    counts = {}
+    for line in lines:
+        old_kind, old_match = classifier.classify_sequential(line)
+        new_kind, new_match = classifier.classify(line)
+        counts[new_kind] = counts.get(new_kind, 0) + 1
+        if old_kind != new_kind or (old_match and old_match.groups() != new_match.groups()):
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"Mismatch ({old_kind} vs {new_kind}): {line}")
+    for kind, count in sorted(counts.items(), key=lambda kv: -kv[1]):
+        print(f"  {kind or 'unmatched'}: {count}")
+
+    sequential = time_pass(classifier.classify_sequential, lines, args.repeat)
+    dispatched = time_pass(classifier.classify, lines, args.repeat)
+
+    print(f"Sequential patterns: {sequential:.3f}s ({sequential / max(len(lines), 1) * 1_000_000:.2f} µs/line)")
+    print(f"Prefix dispatch:     {dispatched:.3f}s ({dispatched / max(len(lines), 1) * 1_000_000:.2f} µs/line)")
+    print(f"Speedup: {sequential / dispatched:.1f}x, mismatches: {mismatches}")
+
+    if args.timestamps:
+        mismatches += compare_timestamps(lines, args.timezone)
+    return 1 if mismatches else 0
+
+
+def compare_timestamps(lines: list[str], tz_name: str) -> int:
+    import dateparser
+
+    stamps = [line[1:line.find("]")] for line in lines if line.startswith("[") and "]: " in line]
+    settings = {'TIMEZONE': tz_name}
+
+    start = time.perf_counter()
+    expected = [dateparser.parse(stamp[:-3], settings=settings) for stamp in stamps]
+    slow = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = [parse_log_timestamp(stamp, tz_name) for stamp in stamps]
+    fast = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, parsed) if a != b)
+    print(f"{len(stamps)} timestamps")
+    print(f"dateparser:          {slow:.3f}s ({slow / max(len(stamps), 1) * 1_000_000:.2f} µs/line)")
+    print(f"parse_log_timestamp: {fast:.3f}s ({fast / max(len(stamps), 1) * 1_000_000:.2f} µs/line)")
+    print(f"Speedup: {slow / max(fast, 1e-9):.1f}x, mismatches: {mismatches}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Replay a recorded Archipelago room log through a RoomTracker, in this process.
+
+Unlike replay_log.py, which only times the line classifier, this runs the tracker itself:
+items are created and collected, hints and goals are tracked and messages are put together
+(but not sent anywhere). Players and their games come from the join lines in the log, and
+their settings from a spoiler log if one is given. If config.yaml points at a database it's
+used for classifications and locations; without one, items are just left unclassified.
+
+With --rooms N, N copies of the room are replayed side by side, like a worker tracking several
+rooms, to see what each extra room costs in memory.
+
+Usage (config.yaml is looked for in the current directory, and only once the database is first used):
+    python benchmarks/replay_room.py path/to/room.log [--spoiler path/to/spoiler.txt] [--batch 200] [--rooms 1] [--quiet]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+import regex as re
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from ap_itemlog import RoomTracker
+from cmds.ap_scripts.spoiler import parse_spoiler_log
+from cmds.ap_scripts.utils import Player
+
+
+def find_players(lines: list[str]) -> dict[str, str]:
+    """Slot name -> game, from the join lines (any kind, since the room API would list trackers and viewers too)."""
+    joins = re.compile(r'\[.*?\]: Notice \(all\): (.+?) \(Team #\d+\) (?:playing|viewing|tracking) (.+?) has joined\.')
+    return {match.group(1): match.group(2) for line in lines if (match := joins.match(line))}
+
+
+def make_tracker(n: int, players: dict[str, str], spoiler: list[str] = None) -> RoomTracker:
+    tracker = RoomTracker(f"https://archipelago.gg/room/replay{n}", [], None)
+    for name, game in players.items():
+        tracker.game.players[name] = Player(name=name, game=game)
+        tracker.game.spoiler_log[name] = {}
+    if spoiler:
+        tracker.apply_spoiler(parse_spoiler_log(spoiler, list(players)))
+    return tracker
+
+
+def replay(tracker: RoomTracker, lines: list[str], batch: int, quiet: bool) -> tuple[float, int]:
+    """Feed the log through in batches, like polls would. Returns the time taken and how many messages were made."""
+    messages = 0
+    start = time.perf_counter()
+    for i in range(0, len(lines), batch):
+        tracker.process_new_log_lines(lines[i:i + batch], quiet)
+        messages += len(tracker.message_buffer)
+        tracker.message_buffer.clear()
+        tracker.release_buffer.clear()
+    return time.perf_counter() - start, messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help="Path to a saved room log")
+    parser.add_argument('--spoiler', help="Path to the room's spoiler log, for player settings and item placements")
+    parser.add_argument('--batch', type=int, default=200, help="Lines per simulated poll")
+    parser.add_argument('--rooms', type=int, default=1, help="Copies of the room to replay in this process")
+    parser.add_argument('--quiet', action='store_true', help="Replay like a tracker catching up after a restart (no messages)")
+    parser.add_argument('--verbose', action='store_true', help="Show the tracker's own logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('ap_itemlog').setLevel(logging.CRITICAL)
+
+    with open(args.log, 'r', encoding='UTF-8') as file:
+        lines = file.read().splitlines()
+    spoiler = None
+    if args.spoiler:
+        with open(args.spoiler, 'r', encoding='UTF-8') as file:
+            spoiler = file.read().splitlines()
+
+    players = find_players(lines)
+    print(f"{len(lines)} lines, {len(players)} players, {args.rooms} room(s)")
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for n in range(args.rooms):
+        try:
+            tracker = make_tracker(n, players, spoiler)
+        except KeyError as e:
+            print(f"The spoiler log doesn't go with this room log: it has a player {e} who never joined the room.")
+            return 1
+        elapsed, messages = replay(tracker, lines, args.batch, args.quiet)
+        items = sum(len(p.inventory) for p in tracker.game.players.values())
+        used = tracemalloc.get_traced_memory()[0] - baseline
+        print(f"Room {n + 1}: {elapsed:.3f}s ({elapsed / max(len(lines), 1) * 1_000_000:.1f} µs/line), "
+              f"{messages} messages, {items} items collected, {used / 1024 / 1024:.1f} MiB traced so far")
+    tracemalloc.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,8 +20,7 @@ import yaml
 from discord import HTTPException
 from discord.ext import tasks, commands
 
-from ap_itemlog import room_id
-from cmds.ap_scripts.utils import Player, Item, CollectedItem, handle_item_tracking, handle_location_tracking
+from cmds.ap_scripts.utils import Player, Item, handle_item_tracking, handle_location_tracking
 
 logger = logging.getLogger('archilogger')
 
@@ -113,6 +112,7 @@ class ItemLog:
 
         def __init__(self, log_channel: discord.TextChannel | discord.Thread,
                      chat_channel: discord.TextChannel | discord.Thread,
+                     room_id: str,
                      mqtt_details: tuple[str, int, str, str] = None):
             super().__init__()
             self.log_channel = log_channel
@@ -213,7 +213,7 @@ class ItemLog:
                 raise ValueError(f"URL did not validate: {url}")
 
         self.log = self.LogInput(cfg['bot']['archipelago']['session_cookie'], log_url)
-        self.out = self.LogOutput(log_channel, chat_channel)
+        self.out = self.LogOutput(log_channel, chat_channel, log_url.split('/')[-1])
 
         self.room_id = log_url.split('/')[-1]
         self.host = log_url.split('/')[2]
@@ -339,7 +339,7 @@ class ItemLog:
                 case "Starting Items":
                     if match := regex_patterns['starting_item'].match(line):
                         item, receiver = match.groups()
-                        ItemObject = CollectedItem("Archipelago",self.players[receiver],item,"Starting Items")
+                        ItemObject = Item("Archipelago",self.players[receiver],item,"Starting Items")
                         self.players[receiver].items[item] = ItemObject
                 case _:
                     continue
@@ -379,7 +379,7 @@ class ItemLog:
                     SentItemObject = Item(sender,receiver,item,item_location)
                     SentItemObject.found = True
                     self.spoiler_log[str(sender)].update({item_location: SentItemObject})
-                    ReceivedItemObject = CollectedItem(sender,receiver,item,item_location)
+                    ReceivedItemObject = Item(sender,receiver,item,item_location)
                     if item in receiver.items: receiver.items[item].collect(sender, item_location)
                     else: receiver.items[item] = ReceivedItemObject
                     # players[sender].out(SentItemObject)
@@ -0,0 +1,44 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger('ap_itemlog')
+
+
+class HostBudget:
+    """Caps how often the rooms in this process hit each Archipelago host, however fast they'd like to poll.
+
+    A token bucket per host: tokens come back at `per_minute` a minute, up to `burst` saved up,
+    and every request takes one (or waits until there is one). A budget of 0 means no limit.
+    Only used from the event loop, so nothing here needs a lock."""
+
+    def __init__(self, per_minute: float, burst: int = 10):
+        self.per_minute = per_minute
+        self.burst = burst
+        self.buckets: dict[str, tuple[float, float]] = {} # host -> (tokens, when they were counted)
+        self.waits: dict[str, int] = {} # host -> how many requests have had to wait, for the logs
+
+    def take(self, host: str) -> float:
+        """Take a token if there is one. Returns 0 if we did, otherwise how long until there will be."""
+        if self.per_minute <= 0:
+            return 0 # No limit
+        rate = self.per_minute / 60
+        now = time.monotonic()
+        tokens, counted = self.buckets.get(host, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - counted) * rate)
+        if tokens >= 1:
+            self.buckets[host] = (tokens - 1, now)
+            return 0
+        self.buckets[host] = (tokens, now)
+        return (1 - tokens) / rate
+
+    async def acquire(self, host: str):
+        """Wait for our turn to send a request to `host`."""
+        wait = self.take(host)
+        if wait:
+            self.waits[host] = self.waits.get(host, 0) + 1
+            if self.waits[host] % 100 == 1:
+                logger.info(f"Request budget for {host} is used up ({self.per_minute:g}/min), polls are being spread out.")
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.take(host)
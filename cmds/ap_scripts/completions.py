@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+
+from bisect import bisect_left, bisect_right
+from typing import Iterable
+
+from cmds.db_helpers import asyncdb
+
+logger = logging.getLogger('discord.ap')
+
+# Trackers add items and locations without telling the bot, so indexes are reloaded after a while anyway
+INDEX_TTL = 600 # seconds
+
+
+class NameIndex:
+    """A sorted list of names that can be searched by prefix and substring without going back to Postgres.
+
+    Names are kept sorted case-insensitively, so prefix matches are a bisect. Substring matches come from
+    a single str.find loop over every name joined into one string, instead of checking names one at a time."""
+
+    def __init__(self, names: Iterable[str]):
+        self.names = sorted({n for n in names if n}, key=lambda n: (n.lower(), n))
+        self.lowered = [n.lower() for n in self.names]
+        self.haystack = '\n'.join(self.lowered)
+        self.starts = [] # Where each name begins in the haystack
+        position = 0
+        for name in self.lowered:
+            self.starts.append(position)
+            position += len(name) + 1
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.names)
+
+    def expired(self) -> bool:
+        return time.time() - self.loaded_at > INDEX_TTL
+
+    def search(self, current: str, limit: int = 25) -> list[str]:
+        """Names starting with `current` first, then any others containing it, up to `limit`."""
+        if not current:
+            return self.names[:limit]
+        needle = current.lower()
+
+        found = []
+        i = bisect_left(self.lowered, needle)
+        while i < len(self.lowered) and self.lowered[i].startswith(needle) and len(found) < limit:
+            found.append(i)
+            i += 1
+
+        prefixed = set(found)
+        position = self.haystack.find(needle)
+        while position != -1 and len(found) < limit:
+            i = bisect_right(self.starts, position) - 1
+            if i not in prefixed and position + len(needle) <= self.starts[i] + len(self.lowered[i]):
+                found.append(i)
+            # Carry on from the next name, so each one only matches once
+            if i + 1 >= len(self.starts):
+                break
+            position = self.haystack.find(needle, self.starts[i + 1])
+
+        return [self.names[i] for i in found]
+
+
+class CompletionIndex:
+    """Lazily loaded name indexes for the /archipelago db autocompletes: one for the list of games,
+    and one for each game's items and locations. Commands that write to those tables call invalidate()."""
+
+    def __init__(self):
+        self.games: NameIndex = None
+        self.items: dict[str, NameIndex] = {}
+        self.locations: dict[str, NameIndex] = {}
+        self.lock = asyncio.Lock()
+
+    async def load(self, table: dict, game: str, query: str) -> NameIndex:
+        index = table.get(game)
+        if index is not None and not index.expired():
+            return index
+        async with self.lock:
+            # Someone else may have loaded it while we waited
+            index = table.get(game)
+            if index is None or index.expired():
+                rows = await asyncdb.run(query, (game,), fetch='all')
+                index = table[game] = NameIndex(row[0] for row in rows)
+                logger.debug(f"Loaded {len(index)} names for {game} into the autocomplete index")
+        return index
+
+    async def search_games(self, current: str, limit: int = 25) -> list[str]:
+        if self.games is None or self.games.expired():
+            async with self.lock:
+                if self.games is None or self.games.expired():
+                    rows = await asyncdb.run("SELECT DISTINCT game FROM archipelago.item_classifications;", fetch='all')
+                    self.games = NameIndex(row[0] for row in rows)
+        return self.games.search(current, limit)
+
+    async def search_items(self, game: str, current: str, limit: int = 25) -> list[str]:
+        index = await self.load(self.items, game, "SELECT item FROM archipelago.item_classifications WHERE game = %s;")
+        return index.search(current, limit)
+
+    async def search_locations(self, game: str, current: str, limit: int = 25) -> list[str]:
+        index = await self.load(self.locations, game, "SELECT location FROM archipelago.game_locations WHERE game = %s;")
+        return index.search(current, limit)
+
+    def invalidate(self, game: str = None):
+        """Forget what we have for a game (and the game list), or for everything if no game is given."""
+        self.games = None
+        if game is None:
+            self.items.clear()
+            self.locations.clear()
+        else:
+            self.items.pop(game, None)
+            self.locations.pop(game, None)
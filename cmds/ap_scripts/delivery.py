@@ -0,0 +1,124 @@
+import logging
+import queue
+import threading
+import time
+import requests
+
+from requests.adapters import HTTPAdapter
+from typing import Callable, Iterable
+
+logger = logging.getLogger('ap_itemlog')
+
+
+class WebhookDelivery:
+    """Posts messages to Discord webhooks in the background, so the log loop never waits on Discord.
+
+    Each webhook gets its own queue and worker thread, so messages to one webhook stay in order
+    while different webhooks are posted to at the same time. Workers keep to Discord's rate limits
+    (X-RateLimit-* and Retry-After) for their webhook instead of sleeping a fixed amount.
+    All of them share one pooled HTTP session."""
+
+    def __init__(self, max_queue: int = 500, timeout: int = 5, max_retries: int = 5):
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=16))
+
+        self.queues: dict[str, queue.Queue] = {}
+        self.lock = threading.Lock()
+
+    def send(self, webhooks: Iterable[str], payload: dict, on_done: Callable[[bool], None] = None):
+        """Queue a message for every webhook in the list.
+        Once every webhook has had it, on_done is called with whether they all got it."""
+        webhooks = [webhook for webhook in webhooks if webhook]
+        status = {'remaining': len(webhooks), 'delivered': True, 'on_done': on_done}
+        if not webhooks and on_done is not None:
+            on_done(True)
+        for webhook in webhooks:
+            try:
+                # Never wait here: this runs on the thread that processes every room's log.
+                # If Discord is that far behind, the message counts as undelivered, so a spooled one
+                # stays in the spool and gets sent again after a restart
+                self.queue_for(webhook).put_nowait((payload, status))
+            except queue.Full:
+                logger.warning(f"Webhook queue is full, not sending message for now: {payload.get('content', '')[:100]}")
+                self.finished(status, False)
+
+    def finished(self, status: dict, delivered: bool):
+        with self.lock:
+            status['delivered'] = status['delivered'] and delivered
+            status['remaining'] -= 1
+            done = status['remaining'] == 0
+        if done and status['on_done'] is not None:
+            try:
+                status['on_done'](status['delivered'])
+            except Exception as e:
+                logger.error(f"Error in webhook delivery callback: {e}")
+
+    def queue_for(self, webhook: str) -> queue.Queue:
+        with self.lock:
+            if webhook not in self.queues:
+                self.queues[webhook] = queue.Queue(maxsize=self.max_queue)
+                threading.Thread(target=self.worker, args=(webhook, self.queues[webhook]), daemon=True).start()
+            return self.queues[webhook]
+
+    def flush(self, timeout: float = 60) -> bool:
+        """Wait (up to timeout) for everything queued so far to be sent. Returns False if we gave up."""
+        deadline = time.time() + timeout
+        for webhook_queue in list(self.queues.values()):
+            while webhook_queue.unfinished_tasks > 0:
+                if time.time() > deadline:
+                    logger.warning("Gave up waiting for webhook messages to send.")
+                    return False
+                time.sleep(0.1)
+        return True
+
+    def worker(self, webhook: str, webhook_queue: queue.Queue):
+        ready_at = 0.0 # When this webhook's rate limit lets us post again
+        while True:
+            payload, status = webhook_queue.get()
+            delivered = False
+            try:
+                for attempt in range(self.max_retries):
+                    if (wait := ready_at - time.time()) > 0:
+                        time.sleep(wait)
+                    try:
+                        response = self.session.post(webhook, json=payload, timeout=self.timeout)
+                    except requests.RequestException as e:
+                        logger.error(f"Error sending message to webhook: {e}")
+                        ready_at = time.time() + 2 ** attempt
+                        continue
+
+                    ready_at = max(ready_at, self.rate_limit_reset(response))
+                    if response.status_code == 429:
+                        retry_after = float(response.headers.get('Retry-After', 1))
+                        logger.warning(f"Rate limited by Discord, retrying in {retry_after}s.")
+                        ready_at = time.time() + retry_after
+                        continue
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError as e:
+                        logger.error(f"Error sending message to webhook: {e}")
+                        if response.status_code >= 500:
+                            ready_at = time.time() + 2 ** attempt
+                            continue
+                        # Discord won't ever take this one (bad request, webhook deleted...), so don't hold on to it
+                    delivered = True
+                    break
+                else:
+                    logger.error(f"Giving up on webhook message after {self.max_retries} attempts.")
+            finally:
+                self.finished(status, delivered)
+                webhook_queue.task_done()
+
+    @staticmethod
+    def rate_limit_reset(response: requests.Response) -> float:
+        """If that was our last request in this rate limit bucket, when we can send the next one."""
+        try:
+            if int(response.headers.get('X-RateLimit-Remaining', 1)) > 0:
+                return 0.0
+            return time.time() + float(response.headers.get('X-RateLimit-Reset-After', 0))
+        except ValueError:
+            return 0.0
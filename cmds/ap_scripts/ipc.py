@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+from typing import Callable
+
+logger = logging.getLogger('ap_itemlog')
+
+# Each room's tracker listens on its own Unix socket here, named after the room ID,
+# so the bot can find it without looking anything up
+SOCKET_DIR = 'run'
+
+# Every message is a 4-byte big-endian length, then that many bytes of JSON
+HEADER = struct.Struct('>I')
+MAX_MESSAGE = 64 * 1024 * 1024
+
+
+def socket_path(room_id: str) -> str:
+    return os.path.join(SOCKET_DIR, f"{room_id}.sock")
+
+
+def pack(message: dict) -> bytes:
+    body = json.dumps(message, default=str).encode('utf-8')
+    return HEADER.pack(len(body)) + body
+
+
+def unpack_length(header: bytes) -> int:
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE:
+        raise ValueError(f"IPC message too large ({length} bytes)")
+    return length
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("IPC connection closed mid-message")
+        data.extend(chunk)
+    return bytes(data)
+
+
+class TrackerServer:
+    """Answers requests from the bot about a running room, over a Unix socket.
+
+    `handler` takes the request dict and returns the response dict. It runs on the server's
+    threads while the log loop keeps going, so it should only read from the game."""
+
+    def __init__(self, path: str, handler: Callable[[dict], dict]):
+        self.path = path
+        self.handler = handler
+        self.server: socketserver.ThreadingUnixStreamServer = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path) # Left over from a tracker that didn't shut down cleanly
+
+        handler = self.handler
+
+        class RequestHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        header = self.request.recv(HEADER.size, socket.MSG_WAITALL)
+                        if not header:
+                            return # Bot hung up
+                        request = json.loads(recv_exactly(self.request, unpack_length(header)))
+                    except (ConnectionError, ValueError) as e:
+                        logger.warning(f"Bad IPC request: {e}")
+                        return
+                    try:
+                        response = handler(request)
+                    except Exception as e:
+                        logger.error(f"Error answering IPC request {request}: {e}", exc_info=True)
+                        response = {'error': str(e)}
+                    self.request.sendall(pack(response))
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+            request_queue_size = 64 # Several commands can ask at once
+
+        self.server = Server(self.path, RequestHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"Listening for bot requests on {self.path}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def request(room_id: str, message: dict, timeout: float = 10) -> dict:
+    """Ask a room's tracker something, from the bot. Raises ConnectionError if it isn't running."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(socket_path(room_id)), timeout)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        raise ConnectionError(f"No tracker is running for room {room_id}") from e
+    try:
+        writer.write(pack(message))
+        await writer.drain()
+        header = await asyncio.wait_for(reader.readexactly(HEADER.size), timeout)
+        body = await asyncio.wait_for(reader.readexactly(unpack_length(header)), timeout)
+    except asyncio.IncompleteReadError as e:
+        raise ConnectionError(f"Tracker for room {room_id} hung up") from e
+    finally:
+        writer.close()
+    response = json.loads(body)
+    if 'error' in response:
+        raise ConnectionError(f"Tracker for room {room_id} couldn't answer: {response['error']}")
+    return response
@@ -0,0 +1,116 @@
+import regex as re
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable
+from zoneinfo import ZoneInfo
+
+
+def build_patterns(players: Iterable[str]) -> dict:
+    """Regular expressions for the different log message types.
+    The order here is the order process_new_log_lines used to try them in."""
+    players = list(players)
+    return {
+        'sent_items': re.compile(r'\[(.*?)]: \(Team #\d\) (\L<players>) sent (.*?(?= to)) to (\L<players>) \((.+)\)$', players=players),
+        'item_hints': re.compile(
+            r'\[(.*?)]: Notice \(Team #\d\): \[Hint]: (\L<players>)\'s (.*) is at (.*) in (\L<players>)\'s World(?: at (?P<entrance>(.+)))?\. \((?P<hint_status>(.+))\)$', players=players),
+        'goals': re.compile(r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) has completed their goal\.$'),
+        'releases': re.compile(
+            r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) has released all remaining items from their world\.$'),
+        'messages': re.compile(r'\[(.*?)\]: Notice \(all\): (.*?): (.+)$'),
+        'room_shutdown': re.compile(r'\[(.*?)\]: Shutting down due to inactivity.$'),
+        'room_spinup': re.compile(r'\[(.*?)\]: Hosting game at (.+?)$'),
+        'joins': re.compile(r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) (playing|viewing|tracking) (.+?) has joined. Client\(([0-9\.]+)\), (?P<tags>.+)\.$'),
+        'parts': re.compile(r'\[(.*?)\]: Notice \(all\): (.*?) \(Team #\d\) has left the game\. Client\(([0-9\.]+)\), (?P<tags>.+)\.$'),
+    }
+
+
+class LogLineClassifier:
+    """Works out what kind of log line we're looking at without trying every pattern on it.
+
+    Every line is '[timestamp]: <message>', and the start of the message already tells us
+    which few patterns could match. Within those, a cheap substring check rules out the
+    ones that can't, so most lines only ever run one regex (and unparseable lines, none)."""
+
+    def __init__(self, players: Iterable[str]):
+        self.players = frozenset(players)
+        self.patterns = build_patterns(self.players)
+
+        # Literal start of the message -> candidates in priority order,
+        # each with a test that has to pass before the pattern is worth running
+        notice_all = len("Notice (all): ")
+        self.dispatch = (
+            ("(Team #", (
+                ('sent_items', lambda body: " sent " in body),
+            )),
+            ("Notice (Team #", (
+                ('item_hints', lambda body: "[Hint]: " in body),
+            )),
+            ("Notice (all): ", (
+                ('goals', lambda body: body.endswith(" has completed their goal.")),
+                ('releases', lambda body: body.endswith(" has released all remaining items from their world.")),
+                ('messages', lambda body: ": " in body[notice_all:]),
+                ('joins', lambda body: " has joined. Client(" in body),
+                ('parts', lambda body: " has left the game. Client(" in body),
+            )),
+            ("Shutting down", (
+                ('room_shutdown', lambda body: True),
+            )),
+            ("Hosting game", (
+                ('room_spinup', lambda body: True),
+            )),
+        )
+
+    def classify(self, line: str):
+        """Returns (kind, match) for a log line, or (None, None) if nothing matches."""
+        if not line.startswith("["):
+            return None, None
+        split = line.find("]: ")
+        if split < 0:
+            return None, None
+        body = line[split + 3:]
+
+        for prefix, candidates in self.dispatch:
+            if not body.startswith(prefix):
+                continue
+            for kind, could_match in candidates:
+                if could_match(body) and (match := self.patterns[kind].match(line)):
+                    return kind, match
+            break
+        return None, None
+
+    def classify_sequential(self, line: str):
+        """The old way: try every pattern in turn. Kept around to benchmark against."""
+        for kind, pattern in self.patterns.items():
+            if match := pattern.match(line):
+                return kind, match
+        return None, None
+
+
+@lru_cache(maxsize=None)
+def get_zone(tz_name: str) -> ZoneInfo:
+    return ZoneInfo(tz_name)
+
+
+@lru_cache(maxsize=4096)
+def _parse_log_second(second: str, tz_name: str, aware: bool) -> datetime:
+    stamp = datetime.strptime(second, "%Y-%m-%d %H:%M:%S")
+    return stamp.replace(tzinfo=get_zone(tz_name)) if aware else stamp
+
+
+def parse_log_timestamp(timestamp: str, tz_name: str = 'Etc/UTC', aware: bool = False) -> datetime | None:
+    """Parse a log timestamp ('2025-01-31 23:59:59,123') to the second, in the host's timezone.
+
+    Log lines always use the same format, so this skips dateparser unless the timestamp
+    doesn't fit it. Lots of lines share a second (releases especially), so results are cached.
+    Same result as dateparser with {'TIMEZONE': tz_name}, plus 'RETURN_AS_TIMEZONE_AWARE' if aware."""
+    try:
+        return _parse_log_second(timestamp[:19], tz_name, aware)
+    except ValueError:
+        pass
+
+    import dateparser
+    settings = {'TIMEZONE': tz_name}
+    if aware:
+        settings['RETURN_AS_TIMEZONE_AWARE'] = True
+    return dateparser.parse(timestamp[:-3], settings=settings) # strip milliseconds
@@ -0,0 +1,131 @@
+import logging
+import requests
+
+logger = logging.getLogger('ap_itemlog')
+
+
+class LogTail:
+    """Follows an Archipelago room log by byte offset instead of re-downloading all of it.
+
+    Each fetch asks the server only for what was appended since the last one (HTTP Range),
+    and skips the download entirely if the log hasn't changed (ETag / Last-Modified).
+    If the server ignores the Range header, or the log is shorter than what we've already
+    read, we fall back to the full log and work out the new lines from the line count."""
+
+    def __init__(self, url: str, cookies: dict = None, session: requests.Session = None, timeout: int = 10):
+        self.url = url
+        self.cookies = cookies or {}
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+        self.offset: int = 0 # bytes consumed, always on a line boundary
+        self.line_count: int = 0 # lines consumed
+        self.etag: str = None
+        self.last_modified: str = None
+
+    def _get(self, headers: dict = None) -> requests.Response:
+        response = self.session.get(self.url, cookies=self.cookies, headers=headers or {}, timeout=self.timeout)
+        if response.status_code not in (304, 416):
+            response.raise_for_status()
+        if response.status_code in (200, 206):
+            self.etag = response.headers.get('ETag', self.etag)
+            self.last_modified = response.headers.get('Last-Modified', self.last_modified)
+        return response
+
+    @staticmethod
+    def _complete(content: bytes) -> bytes:
+        """Trim a trailing half-written line, so we only ever consume whole lines."""
+        end = content.rfind(b'\n')
+        return content[:end + 1] if end >= 0 else b''
+
+    def fetch_all(self, resume_line: int = 0, resume_offset: int = None) -> list[str]:
+        """Download the whole log and return every complete line in it.
+
+        Afterwards the tail is positioned just after line `resume_line`, so the next
+        fetch() returns everything from there on. `resume_offset` is the byte offset we saved
+        alongside that line number last time; it's used as long as it still lands on a line break."""
+        response = self._get()
+        content = self._complete(response.content)
+        text = content.decode('utf-8', errors='replace')
+        lines = text.splitlines()
+
+        resume_line = min(resume_line, len(lines))
+        if resume_line > 0 and resume_offset is not None and 0 < resume_offset <= len(content) and content[resume_offset - 1] == 0x0A:
+            self.offset = resume_offset
+        else:
+            self.offset = sum(len(line.encode('utf-8')) for line in text.splitlines(keepends=True)[:resume_line])
+        self.line_count = resume_line
+        if resume_line < len(lines):
+            # There's more to read than we've consumed, so the next fetch can't be conditional on this copy
+            self.etag = self.last_modified = None
+
+        return lines
+
+    def fetch(self) -> list[str]:
+        """Return any complete lines added to the log since the last fetch."""
+        headers = {'Range': f"bytes={self.offset}-"}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        elif self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        response = self._get(headers)
+
+        match response.status_code:
+            case 304:
+                # Nothing new
+                return []
+            case 416:
+                # Nothing past our offset. If the log is now shorter than that, start over
+                total = response.headers.get('Content-Range', '').rpartition('/')[2]
+                if total.isdigit() and int(total) < self.offset:
+                    logger.warning(f"Log is shorter than our last read ({total} < {self.offset} bytes), re-reading it in full.")
+                    return self._resync(self._get())
+                return []
+            case 206:
+                if not response.headers.get('Content-Range', '').startswith(f"bytes {self.offset}-"):
+                    # Not the range we asked for, so we can't trust where it starts
+                    logger.warning("Log server returned an unexpected range, re-reading it in full.")
+                    return self._resync(self._get())
+                chunk = self._complete(response.content)
+            case _:
+                # Server ignored the Range header and sent everything
+                if len(response.content) < self.offset:
+                    logger.warning(f"Log is shorter than our last read ({len(response.content)} < {self.offset} bytes), re-reading it in full.")
+                    return self._resync(response)
+                chunk = self._complete(response.content[self.offset:])
+
+        self.offset += len(chunk)
+        new_lines = chunk.decode('utf-8', errors='replace').splitlines()
+        self.line_count += len(new_lines)
+        return new_lines
+
+    def probe(self) -> bool:
+        """Whether the log has (probably) grown since we last read it, from a HEAD request.
+        Used by hibernating rooms, since it costs the server next to nothing."""
+        # Uncompressed, so Content-Length can be compared with our offset
+        headers = {'Accept-Encoding': 'identity'}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        elif self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        response = self.session.head(self.url, cookies=self.cookies, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+        if self.etag and response.headers.get('ETag') == self.etag:
+            return False
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit():
+            return int(length) > self.offset
+        return True
+
+    def _resync(self, response: requests.Response) -> list[str]:
+        """Line up with a full copy of the log, going by line count rather than bytes."""
+        content = self._complete(response.content)
+        lines = content.decode('utf-8', errors='replace').splitlines()
+        new_lines = lines[self.line_count:]
+        self.offset = len(content)
+        self.line_count = len(lines)
+        return new_lines
@@ -0,0 +1,347 @@
+import ast
+import gzip
+import logging
+import os
+import pickle
+import regex as re
+import requests
+
+from typing import Any, Iterable, Iterator, NamedTuple
+
+logger = logging.getLogger('ap_itemlog')
+
+# Parsed spoilers are kept here so a restarted tracker doesn't have to fetch them again
+CACHE_DIR = os.path.join('cache', 'spoilers')
+# Bump this if the records change shape, so old cache files get thrown out
+CACHE_FORMAT = 2
+# Oldest (least recently used) files go first once the cache is bigger than this
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+# Records yielded by parse_spoiler_log, in the order they appear in the spoiler
+
+class SeedInfo(NamedTuple):
+    version: str
+    seed: Any
+
+class WorldSetting(NamedTuple):
+    key: str
+    value: Any
+
+class PlayerSetting(NamedTuple):
+    player: str
+    key: str
+    value: Any
+
+class LocationPlacement(NamedTuple):
+    location: str
+    sender: str
+    item: str
+    receiver: str
+
+class StartingItem(NamedTuple):
+    item: str
+    receiver: str
+
+class JigsawSetting(NamedTuple):
+    player: str
+    key: str
+    value: Any
+
+class WildPokemon(NamedTuple):
+    player: str
+    location: str
+    value: Any
+
+
+patterns = {
+    'location': re.compile(r'(.+) \((.+?)\): (.+) \((.+?)\)$'),
+    'starting_item': re.compile(r'^(.+) \((.+?)\)$'),
+    'pokemon_locations': re.compile(r'^Wild Pokemon \((.+?)\):$')
+}
+
+# Whole-line section headers -> the section they start (None: a section we don't read)
+section_headers = {
+    "Locations:": "Locations",
+    "Starting Items:": "Starting Items",
+    "Entrances:": None,
+    "Medallions:": None,
+    "Fairy Fountain Bottle Fill:": None,
+    "Shops:": None,
+    "Level Layout": None,
+    "Animal Friends": None,
+}
+# Headers that only have a fixed start. Checked in one go before working out which one it is
+section_prefixes = ("Archipelago Version", "Player ", "Dungeon Entrances", "Spoiler and info for [Jigsaw]", "Wild Pokemon (")
+
+
+def parse_to_type(s):
+    # Try int, float, bool, list, dict, or fallback to str
+    try:
+        return ast.literal_eval(s)
+    except Exception:
+        return s
+
+def parse_line(line):
+    current_key, value = line.strip().split(':', 1)
+    value_str = value.lstrip()
+    key = current_key.strip().replace("_", " ")
+
+    return key, value_str
+
+def smart_split(s):
+    # Split on commas, ignoring those inside [], (), or {}
+    parts = []
+    bracket_level = 0
+    curr = []
+    for char in s:
+        if char in '[({':
+            bracket_level += 1
+        elif char in '])}':
+            bracket_level -= 1
+        if char == ',' and bracket_level == 0:
+            parts.append(''.join(curr).strip())
+            curr = []
+        else:
+            curr.append(char)
+    if curr:
+        parts.append(''.join(curr).strip())
+    return parts
+
+def parse_value(value_str):
+    # Dict-like pattern: key: value, key: value, ...
+    if "," in value_str and ":" in value_str and not value_str.startswith("[") and not value_str.startswith("{"):
+        items = smart_split(value_str)
+        result = {}
+        for item in items:
+            if ":" in item:
+                k, v = item.split(":", 1)
+                v_parsed = parse_to_type(v.strip())
+                result[k.strip()] = v_parsed
+            else:
+                result[item] = None
+        return result
+    # Otherwise, try to parse as list/dict/etc.
+    return parse_to_type(value_str)
+
+
+def iter_spoiler_lines(url: str, session: requests.Session = None, timeout: int = 10) -> Iterator[str]:
+    """Stream the spoiler log line by line as it downloads, instead of holding all of it."""
+    with (session or requests).get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            yield line.decode('utf-8', errors='replace')
+
+
+def parse_spoiler_log(lines: Iterable[str], players: list[str]) -> Iterator[NamedTuple]:
+    """Turn spoiler log lines into records.
+
+    `players` is the room's slot names in slot order, which the Jigsaw section needs
+    to work out which player it's talking about."""
+    section = "Seed Info"
+    working_player = None
+
+    for line in lines:
+        if len(line) == 0:
+            continue
+
+        # Section headers
+        if line in section_headers:
+            section = section_headers[line]
+            if section == "Locations":
+                logger.info("Parsing multiworld locations")
+                continue
+            if section == "Starting Items":
+                logger.info("Parsing starting items")
+            continue
+        if line.startswith(section_prefixes):
+            if line.startswith("Archipelago Version"):
+                section = "Seed Info"
+            elif line.startswith("Player "):
+                section = "Players"
+                working_player = line.strip().split(':', 1)[1].strip()
+                logger.info(f"Parsing settings for player {working_player}")
+                continue
+            elif line.startswith("Dungeon Entrances"):
+                section = None
+                continue
+            elif line.startswith("Spoiler and info for [Jigsaw]"):
+                section = "Jigsaw Info"
+                try:
+                    working_player = players[int(line.rsplit(' ', 1)[-1].strip()) - 1]
+                    logger.info(f"Parsing Jigsaw settings for player {working_player}")
+                except (ValueError, IndexError):
+                    logger.error(f"Error parsing Jigsaw player number from line: {line}")
+                    working_player = None
+                continue
+            elif match := patterns['pokemon_locations'].match(line):
+                section = "Pokemon Locations"
+                working_player = match.group(1)
+                logger.info(f"Parsing Pokemon locations for player {working_player}")
+                continue
+
+        match section:
+            case "Seed Info":
+                if line.startswith("Celeste (Open World) APWorld"): continue # don't need to record apworld version information
+                if line.startswith("Archipelago"):
+                    yield SeedInfo(line.split(' ')[2], parse_to_type(line.split(' ')[-1]))
+                elif ':' in line:
+                    current_key, value = line.strip().split(':', 1)
+                    if "," in value.lstrip():
+                        # Parse as a list
+                        yield WorldSetting(current_key.strip(), [parse_to_type(v.strip()) for v in value.lstrip().split(',')])
+                    else: yield WorldSetting(current_key.strip(), parse_to_type(value.lstrip()))
+
+            case "Players":
+                try:
+                    key, value_str = parse_line(line)
+                except ValueError as e:
+                    logger.error(f"Error parsing line:")
+                    logger.error(line)
+                    logger.error(f"Error: {e}")
+                    continue
+                value = parse_value(value_str)
+                if type(value) == str and "," in value:
+                    # Comma-separated string (no brackets), parse as list
+                    value = smart_split(value)
+                yield PlayerSetting(working_player, key, value)
+
+            case "Locations":
+                if match := patterns['location'].match(line):
+                    item_location, sender, item, receiver = match.groups()
+                    yield LocationPlacement(item_location.lstrip(), sender, item, receiver)
+
+            case "Starting Items":
+                if match := patterns['starting_item'].match(line):
+                    yield StartingItem(*match.groups())
+
+            case "Jigsaw Info":
+                try:
+                    key, value_str = parse_line(line)
+                except ValueError as e:
+                    logger.error(f"Error parsing Jigsaw line: {line}")
+                    raise e
+                yield JigsawSetting(working_player, key, parse_to_type(value_str))
+
+            case "Pokemon Locations":
+                # Some Pkmn games list the locations of wild Pokemon in the spoiler log
+                if patterns['location'].match(line):
+                    try:
+                        key, value_str = parse_line(line)
+                    except ValueError as e:
+                        logger.error(f"Error parsing Pokemon location line: {line}")
+                        logger.error(f"Error: {e}")
+                        continue
+                    yield WildPokemon(working_player, key, parse_to_type(value_str))
+
+
+def cache_path(host: str, seed_id: str) -> str | None:
+    if not re.fullmatch(r'[\w.-]+', f"{host}{seed_id}"):
+        return None # Not something we want to put in a filename
+    return os.path.join(CACHE_DIR, f"{host}_{seed_id}.pickle.gz")
+
+
+def load_cached_spoiler(host: str, seed_id: str, version: str = None) -> Iterator | None:
+    """Records for a seed we've parsed before, or None if there's nothing usable cached.
+    If we know the seed's generator version, the cached copy has to match it.
+
+    The records are read from the file one at a time as they're used, rather than all at once."""
+    path = cache_path(host, seed_id)
+    if path is None or not os.path.exists(path):
+        return None
+    file = None
+    try:
+        file = gzip.open(path, 'rb')
+        header = pickle.load(file)
+        if header['format'] != CACHE_FORMAT or header['seed_id'] != seed_id:
+            raise ValueError("cache is for a different format or seed")
+        # The version is in the seed info, which is (almost) always the first record
+        head = []
+        while not head or not isinstance(head[-1], SeedInfo):
+            try:
+                head.append(pickle.load(file))
+            except EOFError:
+                break
+        if version is not None and head and isinstance(head[-1], SeedInfo) and head[-1].version != version:
+            raise ValueError(f"cache is for version {head[-1].version}, seed is {version}")
+    except Exception as e:
+        if file is not None:
+            file.close()
+        logger.warning(f"Discarding cached spoiler for {seed_id}: {e}")
+        os.remove(path)
+        return None
+
+    os.utime(path) # Recently used, so keep it around
+    return read_cached_records(file, path, seed_id, head)
+
+
+def read_cached_records(file, path: str, seed_id: str, head: list) -> Iterator:
+    count = len(head)
+    with file:
+        yield from head
+        try:
+            while True:
+                try:
+                    record = pickle.load(file)
+                except EOFError:
+                    break
+                count += 1
+                yield record
+        except Exception:
+            # Too late to go back to the download, so get rid of it and let the room start over
+            logger.error(f"Cached spoiler for {seed_id} is damaged, discarding it.")
+            os.remove(path)
+            raise
+    logger.info(f"Loaded spoiler for {seed_id} from cache ({count} records).")
+
+
+def cache_spoiler(host: str, seed_id: str, records: Iterable) -> bool:
+    """Write a seed's records to the cache as they come in (say, straight from parse_spoiler_log),
+    one pickle each, so the spoiler never has to be held in memory. Returns whether it was cached.
+
+    The file only takes the place of any old copy once it's complete, so a half-written one is never picked up."""
+    path = cache_path(host, seed_id)
+    if path is None:
+        return False
+    count = 0
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with gzip.open(f"{path}.tmp", 'wb') as file:
+            pickle.dump({'format': CACHE_FORMAT, 'seed_id': seed_id}, file, protocol=pickle.HIGHEST_PROTOCOL)
+            for record in records:
+                pickle.dump(record, file, protocol=pickle.HIGHEST_PROTOCOL)
+                count += 1
+        os.replace(f"{path}.tmp", path)
+    except BaseException as e:
+        try:
+            os.remove(f"{path}.tmp")
+        except OSError:
+            pass
+        if not isinstance(e, OSError) or isinstance(e, requests.RequestException):
+            raise # The download or parse failed, that's for the caller
+        logger.error(f"Couldn't cache spoiler for {seed_id}: {e}")
+        return False
+    logger.info(f"Cached spoiler for {seed_id} ({count} records, {os.path.getsize(path)} bytes).")
+    evict_cached_spoilers(keep=path)
+    return True
+
+
+def evict_cached_spoilers(max_bytes: int = CACHE_MAX_BYTES, keep: str = None):
+    """Delete the least recently used cached spoilers until the cache fits in max_bytes."""
+    try:
+        files = [os.path.join(CACHE_DIR, f) for f in os.listdir(CACHE_DIR) if f.endswith('.pickle.gz')]
+        files = sorted(((os.stat(f), f) for f in files), key=lambda sf: sf[0].st_mtime)
+    except OSError:
+        return
+    total = sum(stat.st_size for stat, _ in files)
+    for stat, path in files:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= stat.st_size
+            logger.info(f"Evicted cached spoiler {os.path.basename(path)}")
+        except OSError:
+            pass
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger('ap_itemlog')
+
+
+class MessageSpool:
+    """Append-only record of outgoing webhook messages, so nothing is lost if we crash or Discord is down.
+
+    Every message is written here (with the log line it came from) before it's handed to the
+    delivery workers, and acknowledged once it has been posted. On startup, anything not
+    acknowledged is sent again, and the highest line number tells us how far into the log
+    we'd got. One JSON object per line: a message record, {"ack": id}, or {"checkpoint": line}
+    (written when the file is emptied, so we still know how far we'd got)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending: dict[int, dict] = {} # message id -> record, for messages not yet acknowledged
+        self.next_id = 0
+        self.last_line = 0 # highest log line we've spooled messages for
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.load()
+        self.file = open(self.path, 'a', encoding='UTF-8')
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='UTF-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Most likely the last line, half-written when we went down
+                    logger.warning(f"Skipping unreadable spool line: {line[:100]}")
+                    continue
+                if 'checkpoint' in record:
+                    self.last_line = max(self.last_line, record['checkpoint'])
+                elif 'ack' in record:
+                    self.pending.pop(record['ack'], None)
+                else:
+                    self.pending[record['id']] = record
+                    self.next_id = max(self.next_id, record['id'] + 1)
+                    self.last_line = max(self.last_line, record['line'])
+        if self.pending:
+            logger.info(f"Spool has {len(self.pending)} message(s) that were never delivered.")
+        # Start the file over with only what's still outstanding
+        self.rewrite()
+
+    def write(self, record: dict):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def rewrite(self):
+        with open(f"{self.path}.tmp", 'w', encoding='UTF-8') as file:
+            file.write(json.dumps({'checkpoint': self.last_line}) + '\n')
+            for record in self.pending.values():
+                file.write(json.dumps(record) + '\n')
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def append(self, kind: str, payload: dict, line: int) -> dict:
+        """Record a message before sending it. `kind` says which webhooks it goes to."""
+        with self.lock:
+            record = {'id': self.next_id, 'line': line, 'kind': kind, 'payload': payload}
+            self.next_id += 1
+            self.pending[record['id']] = record
+            self.last_line = max(self.last_line, line)
+            self.write(record)
+        return record
+
+    def ack(self, record_id: int):
+        """Mark a message as delivered."""
+        with self.lock:
+            if self.pending.pop(record_id, None) is None:
+                return
+            self.write({'ack': record_id})
+            if not self.pending:
+                # Everything's been delivered, so there's no need to keep the history
+                self.file.truncate(0)
+                self.write({'checkpoint': self.last_line})
+
+    def unacked(self) -> list[dict]:
+        """Messages that were spooled but never delivered, oldest first."""
+        with self.lock:
+            return sorted(self.pending.values(), key=lambda r: r['id'])
@@ -0,0 +1,169 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger('discord.ap')
+
+# Itemlog workers that die are started again, BACKOFF_MIN seconds later at first,
+# then twice as long after each crash in a row, up to BACKOFF_MAX
+BACKOFF_MIN = 5
+BACKOFF_MAX = 15 * 60
+# A worker that's stayed up this long counts as healthy again, and its backoff starts over
+STABLE_AFTER = 10 * 60
+# Memory each room in a worker is allowed before the worker is restarted (bot.archipelago.memory_per_room_mb)
+MEMORY_PER_ROOM_MB = 512
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def read_proc(pid: int) -> tuple[float, int] | None:
+    """(CPU seconds used, resident memory in bytes) for a process, from /proc.
+    None if it's gone, or there's no /proc to read."""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as file:
+            stat = file.read()
+        with open(f"/proc/{pid}/statm", 'r') as file:
+            statm = file.read()
+    except OSError:
+        return None
+    # The process name can have spaces in it, so only split what comes after it.
+    # That starts at field 3 (state); utime and stime are fields 14 and 15
+    fields = stat[stat.rindex(')') + 2:].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu, int(statm.split()[1]) * PAGE_SIZE
+
+
+class Worker:
+    """An itemlog process, and the guilds whose rooms it tracks."""
+
+    def __init__(self, guilds: list[int], command: list[str], memory_limit: int):
+        self.guilds = guilds
+        self.command = command
+        self.memory_limit = memory_limit # bytes
+        self.process: subprocess.Popen = None
+        # 'running', 'backing off' (waiting to restart), 'finished' (every room is done) or 'stopped'
+        self.state = 'stopped'
+        self.started_at: float = None
+        self.restarts = 0
+        self.backoff = 0
+        self.restart_at: float = None
+        self.last_exit: str = None
+        self.cpu_percent = 0.0
+        self.rss = 0
+        self._last_sample: tuple[float, float] = None # (when, CPU seconds)
+
+    def start(self):
+        self.process = subprocess.Popen(self.command)
+        self.state = 'running'
+        self.started_at = time.time()
+        self.restart_at = None
+        self._last_sample = None
+        self.cpu_percent = 0.0
+        self.rss = 0
+
+    def stop(self, timeout: float = 10):
+        """Ask the process to stop, and kill it if it hasn't after `timeout` seconds."""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def sample(self):
+        """Update cpu_percent (since the last sample) and rss."""
+        stats = read_proc(self.process.pid)
+        if stats is None:
+            return
+        cpu, self.rss = stats
+        now = time.monotonic()
+        if self._last_sample is not None and now > self._last_sample[0]:
+            self.cpu_percent = (cpu - self._last_sample[1]) / (now - self._last_sample[0]) * 100
+        self._last_sample = (now, cpu)
+
+
+class Supervisor:
+    """Keeps the itemlog workers going. check() is called every so often (see Archipelago.watch_workers):
+    it reaps workers that exited, restarts crashed ones with exponential backoff,
+    and restarts any that have gone over their memory limit.
+    Everything that looks at or changes the workers holds the lock, since it's called from more than one thread."""
+
+    def __init__(self, memory_per_room_mb: int = MEMORY_PER_ROOM_MB):
+        self.memory_per_room = memory_per_room_mb * 1024 * 1024
+        self.workers: list[Worker] = []
+        self.lock = threading.Lock()
+
+    def add(self, guilds: list[int], command: list[str]) -> Worker:
+        worker = Worker(guilds, command, self.memory_per_room * len(guilds))
+        with self.lock:
+            self.workers.append(worker)
+            worker.start()
+        return worker
+
+    def check(self):
+        with self.lock:
+            self._check()
+
+    def _check(self):
+        now = time.time()
+        for worker in self.workers:
+            if worker.state == 'running':
+                code = worker.process.poll()
+                if code is None:
+                    worker.sample()
+                    if worker.rss > worker.memory_limit:
+                        logger.warning(f"Itemlog worker {worker.process.pid} (guilds {worker.guilds}) is using {worker.rss // 1024 // 1024} MiB, over its {worker.memory_limit // 1024 // 1024} MiB limit. Restarting it.")
+                        worker.stop()
+                        self.schedule_restart(worker, f"over memory limit ({worker.rss // 1024 // 1024} MiB)")
+                    elif worker.backoff and now - worker.started_at > STABLE_AFTER:
+                        worker.backoff = 0
+                elif code == 0:
+                    worker.state = 'finished'
+                    worker.last_exit = "finished"
+                    logger.info(f"Itemlog worker {worker.process.pid} (guilds {worker.guilds}) is done: all its rooms have finished.")
+                else:
+                    self.schedule_restart(worker, f"exited with code {code}")
+            elif worker.state == 'backing off' and now >= worker.restart_at:
+                worker.restarts += 1
+                worker.start()
+                logger.info(f"Restarted itemlog worker for guilds {worker.guilds} as {worker.process.pid} (restart #{worker.restarts}).")
+
+    def schedule_restart(self, worker: Worker, reason: str):
+        worker.backoff = min(max(worker.backoff * 2, BACKOFF_MIN), BACKOFF_MAX)
+        worker.restart_at = time.time() + worker.backoff
+        worker.state = 'backing off'
+        worker.last_exit = reason
+        logger.warning(f"Itemlog worker {worker.process.pid} (guilds {worker.guilds}) {reason}. Restarting in {worker.backoff}s.")
+
+    def stop_all(self):
+        """Stop every worker for good (when the bot shuts down)."""
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+                worker.state = 'stopped'
+
+    def table(self) -> list[tuple]:
+        """(guilds, pid, state, uptime, restarts, CPU %, RSS MiB, limit MiB, last exit) for every worker."""
+        now = time.time()
+        rows = []
+        with self.lock:
+            for worker in self.workers:
+                running = worker.state == 'running'
+                uptime = f"{int(now - worker.started_at) // 3600}h{int(now - worker.started_at) % 3600 // 60:02d}m" if running else '-'
+                rows.append((
+                    ', '.join(str(g) for g in worker.guilds),
+                    worker.process.pid if worker.process else '-',
+                    worker.state if worker.state != 'backing off' else f"restart in {max(worker.restart_at - now, 0):.0f}s",
+                    uptime,
+                    worker.restarts,
+                    f"{worker.cpu_percent:.1f}" if running else '-',
+                    worker.rss // 1024 // 1024 if running else '-',
+                    worker.memory_limit // 1024 // 1024,
+                    worker.last_exit or '-',
+                ))
+        return rows
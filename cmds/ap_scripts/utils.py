@@ -1,44 +1,213 @@
 import datetime
+import sys
+import threading
 import time
 import re
 import fnmatch
 import math
 import psycopg2 as psql
+from psycopg2.extras import execute_values
 import logging
-import yaml
 import discord
 
 from typing import Iterable, Any
+from collections import Counter
 
 from cmds.ap_scripts.emitter import event_emitter
+from cmds.db_helpers import pool
 # from cmds.ap_scripts.name_translations import gzDoomMapNames
 from zoneinfo import ZoneInfo
 
 # setup logging
 logger = logging.getLogger('ap_itemlog')
 
-with open('config.yaml', 'r', encoding='UTF-8') as file:
-    cfg = yaml.safe_load(file)
-
-
-sqlcfg = cfg['bot']['psql']
-try:
-    sqlcon = psql.connect(
-        dbname=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port']
-    )
-except psql.OperationalError:
-    # TODO Disable commands that need SQL connectivity
-    sqlcon = False
+# Held open for LISTEN, outside the pool (see preload_games)
+listen_con = None
 
 
 classification_cache = {}
 cache_timeout = 1*60*60 # 1 hour(s)
-
-item_table = {}
+# Games whose classifications were bulk-loaded at startup.
+# Their cache entries don't expire; changes arrive through NOTIFY instead (see apply_db_changes)
+preloaded_games: set[str] = set()
+
+# Channels the bot uses to tell running trackers that a game's rows were changed under them
+CLASSIFICATION_CHANNEL = 'ap_item_classifications'
+LOCATION_CHANNEL = 'ap_game_locations'
+
+# Every item name seen so far, per game. Only names, not Items, since it's shared by every room
+# in the process and an Item would keep its whole game alive after the room lets go of it
+item_table: dict[str, set[str]] = {}
+
+
+class LocationRegistry:
+    """Write-behind cache for archipelago.game_locations.
+
+    Checkability lookups are answered from memory (the table is loaded once per game),
+    and new observations are queued up and written out in one INSERT per batch,
+    rather than a SELECT/INSERT/UPDATE/commit round trip for every single location."""
+
+    def __init__(self, batch_size: int = 1000):
+        self.batch_size = batch_size
+        self.locations: dict[tuple[str, str], bool] = {}
+        self.loaded_games: set[str] = set()
+        self.pending: dict[tuple[str, str], bool] = {}
+        self.table_checked = False
+
+    def load_games(self, games: Iterable[str], reload: bool = False):
+        """Pull every known location for these games into memory, in one query.
+        With reload, rows already in memory are replaced (except ones we haven't written yet)."""
+        games = [g for g in set(games) if g and (reload or g not in self.loaded_games)]
+        if not games or not pool.available():
+            return
+        with pool.cursor() as cursor:
+            if not self.table_checked:
+                cursor.execute("CREATE TABLE IF NOT EXISTS archipelago.game_locations (game bpchar, location bpchar, is_checkable boolean)")
+                self.table_checked = True
+            cursor.execute("SELECT game, location, is_checkable FROM archipelago.game_locations WHERE game = ANY(%s);", (games,))
+            rows = cursor.fetchall()
+
+        if reload:
+            for key in [k for k in self.locations if k[0] in games and k not in self.pending]:
+                del self.locations[key]
+        for game, location, is_checkable in rows:
+            self.locations.setdefault((game, location), is_checkable)
+        self.loaded_games.update(games)
+        logger.debug(f"locationsdb: loaded {len(rows)} locations for {len(games)} game(s)")
+
+    def load_game(self, game: str):
+        """Pull every known location for this game into memory."""
+        if game not in self.loaded_games:
+            self.load_games([game])
+
+    def is_checkable(self, game: str, location: str) -> bool:
+        self.load_game(game)
+        return self.locations.get((game, location)) or False
+
+    def observe(self, game: str, location: str, is_check: bool = False):
+        """Record that a location exists, and whether it was actually checked in a playthrough.
+        Unknown locations are added as-is; known ones are only ever upgraded to checkable."""
+        self.load_game(game)
+        key = (game, location)
+        if key not in self.locations:
+            logger.debug(f"locationsdb: queueing {game}: {location} (checkable: {is_check})")
+            self.locations[key] = is_check
+            self.pending[key] = is_check or self.pending.get(key, False)
+        elif is_check is True and self.locations[key] is not True:
+            logger.debug(f"Request to update checkable status for {game}: {location} (to: {str(is_check)})")
+            self.locations[key] = True
+            self.pending[key] = True
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write any queued observations to the database in one go."""
+        if not self.pending or not pool.available():
+            return
+        rows = [(game, location, is_checkable) for (game, location), is_checkable in self.pending.items()]
+        try:
+            with pool.cursor() as cursor:
+                execute_values(cursor,
+                    "INSERT INTO archipelago.game_locations (game, location, is_checkable) VALUES %s "
+                    "ON CONFLICT (game, location) DO UPDATE SET is_checkable = TRUE WHERE EXCLUDED.is_checkable;",
+                    rows, page_size=self.batch_size)
+        except psql.Error as e:
+            # Keep the queue and try again on the next flush
+            logger.error(f"locationsdb: failed to write {len(rows)} locations: {e}")
+            return
+        logger.info(f"locationsdb: wrote {len(rows)} locations")
+        self.pending.clear()
+
+location_registry = LocationRegistry()
+
+
+def load_classifications(games: Iterable[str]):
+    """Pull every known classification for these games into classification_cache, in one query.
+    Replaces whatever was cached for them before."""
+    games = [g for g in set(games) if g]
+    if not games or not pool.available():
+        return
+    with pool.cursor() as cursor:
+        cursor.execute("CREATE TABLE IF NOT EXISTS archipelago.item_classifications (game bpchar, item bpchar, classification varchar(32))")
+        cursor.execute("SELECT game, item, classification FROM archipelago.item_classifications WHERE game = ANY(%s);", (games,))
+        rows = cursor.fetchall()
+
+    now = time.time()
+    for game in games:
+        classification_cache[game] = {}
+    for game, item, classification in rows:
+        classification_cache[game][item] = (classification.lower() if classification else None, now)
+    preloaded_games.update(games)
+    logger.debug(f"itemsdb: loaded {len(rows)} classifications for {len(games)} game(s)")
+
+
+def preload_games(games: Iterable[str]):
+    """Load everything we know about a room's games up front, so items can be set up
+    without going back to the database for each one. Also starts listening for changes."""
+    games = set(games)
+    if not pool.available():
+        return
+    logger.info(f"Preloading classifications and locations for {len(games)} game(s).")
+    load_classifications(games)
+    location_registry.load_games(games)
+    if listen_con is None or listen_con.closed:
+        listen() # One connection for every room in the process
+
+
+def listen():
+    """Open (or reopen) the connection we get change notifications on.
+    It has to stay open to keep receiving them, so it doesn't come from the pool."""
+    global listen_con
+    if listen_con is not None and not listen_con.closed:
+        listen_con.close()
+    try:
+        listen_con = pool.connect(autocommit=True)
+        with listen_con.cursor() as cursor:
+            cursor.execute(f"LISTEN {CLASSIFICATION_CHANNEL}; LISTEN {LOCATION_CHANNEL};")
+    except psql.OperationalError as e:
+        logger.error(f"Couldn't listen for database changes: {e}")
+        listen_con = None
+
+
+def notify_changed(cursor, channel: str, game: str):
+    """Let any running trackers know this game's rows have changed."""
+    cursor.execute("SELECT pg_notify(%s, %s);", (channel, game))
+
+
+def apply_db_changes(*games: 'Game'):
+    """Reload any games the bot has told us were changed in the database since we last looked,
+    and refresh the items of every room (Game) passed in. Returns the games that had their classifications reloaded."""
+    if listen_con is None:
+        return set()
+    try:
+        listen_con.poll()
+    except psql.Error as e:
+        logger.error(f"Couldn't poll for database changes, reconnecting: {e}")
+        # We may have missed notifications while it was down, so reload everything we preloaded
+        listen()
+        changed = set(preloaded_games)
+        location_registry.load_games(changed, reload=True)
+        load_classifications(changed)
+        for game in games:
+            game.refresh_classifications(changed)
+        return changed
+
+    changed = {CLASSIFICATION_CHANNEL: set(), LOCATION_CHANNEL: set()}
+    while listen_con.notifies:
+        notify = listen_con.notifies.pop(0)
+        if notify.channel in changed and notify.payload in preloaded_games:
+            changed[notify.channel].add(notify.payload)
+
+    if changed[LOCATION_CHANNEL]:
+        logger.info(f"Reloading locations for {', '.join(changed[LOCATION_CHANNEL])}")
+        location_registry.load_games(changed[LOCATION_CHANNEL], reload=True)
+    if changed[CLASSIFICATION_CHANNEL]:
+        logger.info(f"Reloading classifications for {', '.join(changed[CLASSIFICATION_CHANNEL])}")
+        load_classifications(changed[CLASSIFICATION_CHANNEL])
+        for game in games:
+            game.refresh_classifications(changed[CLASSIFICATION_CHANNEL])
+    return changed[CLASSIFICATION_CHANNEL]
 
 # def push_to_database(cursor: psql.cursor, game: Game, database: str, column: str, payload):
 #     try:
@@ -63,21 +232,37 @@ class Game(dict):
     start_timestamp: float = None
 
     # This is a cache for Item instances, so we don't have to create new ones every time
-    # Unique by (sender, location)
-    # Store it in the Game class to keep duplicate instances minimal
+    # Unique by (sender, location, item)
     item_instance_cache = {}
 
-    def init_db(self):
-        cursor = sqlcon.cursor()
+    def __init__(self, room_id: str = None):
+        super().__init__()
+        # Several rooms can share a process, so nothing mutable can live on the class
+        self.room_id = room_id
+        self.world_settings = {}
+        self.spoiler_log = {}
+        self.players = {}
+        self.milestones = set()
+        self.item_instance_cache = {}
 
+    def init_db(self):
         # DBs to do:
         # {room_id}
         # {room_id}_locations
         # {room_id}_items
         # {room_id}_p_{player}
 
-        cursor.execute(
-            f"CREATE TABLE IF NOT EXISTS games.{self.room_id} (setting bpchar, value bpchar, classification varchar(32))")
+        with pool.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS games.{self.room_id} (setting bpchar, value bpchar, classification varchar(32))")
+
+    def add_location(self, sender: str, item):
+        """Put an item in the spoiler log at its location in the sender's world,
+        and count it towards the sender's location totals."""
+        if sender not in self.spoiler_log: self.spoiler_log[sender] = {}
+        self.spoiler_log[sender][item.location] = item
+        if sender in self.players:
+            self.players[sender].add_location(item)
 
     def update_locations(self):
         self.collected_locations = sum([p.collected_locations for p in self.players.values()])
@@ -97,15 +282,21 @@ class Game(dict):
 
     def to_dict(self):
         return {
-            "seed": self.seed,
-            "room_id": self.room_id,
+            **self.summary(),
             "version_generator": self.version_generator,
             "version_server": self.version_server,
             "world_settings": self.world_settings,
-            "start_timestamp": self.start_timestamp,
-            "running": self.running,
             "spoiler_log": {k: {lk: lv.to_dict() for lk, lv in v.items()} for k, v in self.spoiler_log.items()},
             "players": {k: v.to_dict() for k, v in self.players.items()},
+        }
+
+    def summary(self):
+        """The room's progress without any items or locations, for quick status checks."""
+        return {
+            "seed": self.seed,
+            "room_id": self.room_id,
+            "start_timestamp": self.start_timestamp,
+            "running": self.running,
             "collected_locations": self.collected_locations,
             "total_locations": self.total_locations,
             "collection_percentage": self.collection_percentage,
@@ -137,13 +328,16 @@ class Game(dict):
             logger.error(f"Error pulling from database: {e}")
             return None
         
-    def refresh_classifications(self):
-        """Refresh the item classifications for all items in the game.
+    def refresh_classifications(self, games: Iterable[str] = None):
+        """Refresh the item classifications for all items in the game (or just the given games).
         Useful if classifications have been changed during runtime and need to be applied."""
 
         logger.info("Refreshing item classifications.")
         for item in self.item_instance_cache.values():
-            item.set_item_classification()
+            if games is None or item.game in games:
+                item.classification = item.set_item_classification()
+        for player in self.players.values():
+            player.reserialize()
         logger.info("Item classifications refreshed.")
         
 
@@ -155,7 +349,13 @@ class Player(dict):
     name = None
     game = None
     inventory: list = []
+    inventory_counts: Counter = None # item name -> how many we have
+    inventory_index: dict[str, list[int]] = None # item name -> positions in inventory
     locations = {}
+    # Running totals over self.locations, kept up to date by add_location and the Items themselves
+    location_count: int = 0
+    checkable_location_count: int = 0
+    found_location_count: int = 0
     hints = {}
     spoilers = {"items": [], "locations": {}}
     online = False
@@ -169,6 +369,9 @@ class Player(dict):
     total_locations: int = 0
     collection_percentage: float = 0.0
     finished_percentage: float = 0.0
+    # Bumped whenever the inventory or hints change, so the web API can tell clients nothing's new (ETags)
+    inventory_revision: int = 0
+    hints_revision: int = 0
 
     class PlayerState(dict):
         """A class to hold the player's state in the game.
@@ -202,36 +405,70 @@ class Player(dict):
         self.name = name
         self.game = game
         self.inventory = []
+        self.inventory_counts = Counter()
+        self.inventory_index = {}
         self.locations = {}
+        self.location_count = 0
+        self.checkable_location_count = 0
+        self.found_location_count = 0
+        # Unfound hints, keyed by (sender, location)
         self.hints = {
-            "sending": [],
-            "receiving": []
+            "sending": {},
+            "receiving": {}
         }
+        self.spoilers = {"items": [], "locations": {}}
+        self.tags = []
         self.settings = PlayerSettings()
         self.goaled = False
         self.released = False
         self.milestones = set()
         self.stats = Player.PlayerState()
+        self.inventory_revision = 0
+        self.hints_revision = 0
+        # Serialised copies for the web API: inventory dicts are only ever appended to,
+        # hints are rebuilt when hints_revision moves on. The web API and the bot's requests
+        # are answered on their own threads, so they take turns with the lock
+        self._inventory_dicts = []
+        self._hints_dicts = (-1, {})
+        self._serialise_lock = threading.Lock()
 
     def __str__(self):
         return self.name
 
+    def __getstate__(self):
+        # For pickling (the room's snapshot): the lock can't be, and the serialised copies are just rebuilt
+        state = self.__dict__.copy()
+        del state['_serialise_lock']
+        state['_inventory_dicts'] = []
+        state['_hints_dicts'] = (-1, {})
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._serialise_lock = threading.Lock()
+
     def to_dict(self):
         return {
-            "name": self.name,
-            "game": self.game,
+            **self.summary(),
             "inventory": [i.to_dict() for i in self.inventory],
             "locations": {k: v.to_dict() for k, v in self.locations.items()},
-            "hints": {k: [i.to_dict() for i in v] for k, v in self.hints.items()},
+            "hints": {k: [i.to_dict() for i in v.values()] for k, v in self.hints.items()},
             "spoilers": {
                 "items": [i.to_dict() for i in self.spoilers['items']],
                 "locations": {k: v.to_dict() for k, v in self.spoilers['locations'].items()},
             },
+            "settings": dict(self.settings) if self.settings else {},
+        }
+
+    def summary(self):
+        """Everything about the player except their items, locations, hints and settings."""
+        return {
+            "name": self.name,
+            "game": self.game,
             "online": self.online,
             "last_online": self.last_online.timestamp() if self.last_online else None,
             "tags": self.tags,
             "stats": self.stats.to_dict(),
-            "settings": dict(self.settings) if self.settings else {},
             "goaled": self.goaled,
             "released": self.released,
             "collected_locations": self.collected_locations,
@@ -255,13 +492,29 @@ class Player(dict):
         else:
             return self.last_online
 
-    def update_locations(self, game: Game):
-        self.locations = {l.location: l for l in game.spoiler_log[self.name].values()}
-
-        location_count = len(self.locations)
-        checkable_location_count = len([l for l in self.locations.values() if l.is_location_checkable is True])
-
-        if (checkable_location_count / location_count) < 0.95:
+    def add_location(self, item: 'Item'):
+        """Track the item at one of this player's locations. Replaces whatever was there before."""
+        previous = self.locations.get(item.location)
+        if previous is item:
+            return
+        if previous is not None:
+            self.count_location(previous, -1)
+            previous.tracked_by = None
+        self.locations[item.location] = item
+        item.tracked_by = self
+        self.count_location(item, 1)
+
+    def count_location(self, item: 'Item', change: int):
+        self.location_count += change
+        if item.is_location_checkable is True: self.checkable_location_count += change
+        if item.found is True: self.found_location_count += change
+
+    def update_locations(self, game: Game = None):
+        """Work out location totals and completion from the running counts."""
+        location_count = self.location_count
+        checkable_location_count = self.checkable_location_count
+
+        if location_count == 0 or (checkable_location_count / location_count) < 0.95:
             # If the amount of checkable locations does not pass a certain threshold,
             # The world has likely not been fully played through to determine checkability
             # In this case just use the unfiltered total location count
@@ -270,7 +523,7 @@ class Player(dict):
             self.total_locations = checkable_location_count
 
         if not (self.goaled or self.released):
-            self.collected_locations = len([l for l in self.locations.values() if l.found is True])
+            self.collected_locations = self.found_location_count
             self.collection_percentage = (self.collected_locations / self.total_locations) * 100 if self.total_locations > 0 else 0.0
 
         self.check_milestones()
@@ -287,12 +540,20 @@ class Player(dict):
 
     def add_hint(self, hint_type: str, item):
         if hint_type not in self.hints:
-            self.hints[hint_type] = list()
-        self.hints[hint_type].append(item)
+            self.hints[hint_type] = dict()
+        self.hints[hint_type][(str(item.sender), item.location)] = item
         self.on_hints_updated()
 
+    def remove_hint(self, hint_type: str, sender: str, location: str):
+        """Drop a hint once its location is found. Returns the hinted item, or None if it wasn't hinted."""
+        item = self.hints.get(hint_type, {}).pop((str(sender), location), None)
+        if item is not None:
+            self.on_hints_updated()
+        return item
+
     def on_hints_updated(self):
         # This method will be called whenever hints are updated
+        self.hints_revision += 1
         logger.debug(f"Hints for player {self.name} have been updated.")
         handle_hint_update(self)
 
@@ -309,25 +570,64 @@ class Player(dict):
     def on_item_collected(self, item):
         if item is not None:
             pass # TODO: Handle item collection logic here, e.g., updating stats, notifying other players, etc.
-        handle_state_tracking(self)
+        try:
+            handle_state_tracking(self)
+        except KeyError as e:
+            # Settings come from the spoiler log; without one there's no summary to work out, but the item still counts
+            logger.debug(f"Couldn't update {self.name}'s progress summary, missing setting {e}")
+
+    def add_to_inventory(self, item):
+        """Add an item to the inventory, keeping the name counts and index up to date.
+        Always use this rather than appending to inventory directly."""
+        self.inventory_counts[item.name] += 1
+        self.inventory_index.setdefault(item.name, []).append(len(self.inventory))
+        self.inventory.append(item)
+        self.inventory_revision += 1
+
+    def inventory_dicts(self) -> list[dict]:
+        """to_dict() of every item in the inventory, in the order received.
+        Only items added since the last call get serialised."""
+        with self._serialise_lock:
+            if len(self._inventory_dicts) > len(self.inventory):
+                self._inventory_dicts = [] # Inventory was replaced, start over
+            for item in self.inventory[len(self._inventory_dicts):]:
+                self._inventory_dicts.append(item.to_dict())
+            return list(self._inventory_dicts) # A copy, so it can't grow while the caller's using it
+
+    def hints_dicts(self) -> dict[str, list[dict]]:
+        """Hints by type ('sending'/'receiving'), serialised once per hints_revision."""
+        with self._serialise_lock:
+            revision, hints = self._hints_dicts
+            if revision != self.hints_revision:
+                hints = {k: [i.to_dict() for i in list(v.values())] for k, v in list(self.hints.items())}
+                self._hints_dicts = (self.hints_revision, hints)
+            return hints
+
+    def reserialize(self):
+        """Throw away the serialised inventory and hints, for when items change underneath them
+        (like a classification refresh)."""
+        with self._serialise_lock:
+            self._inventory_dicts = []
+            self._hints_dicts = (-1, {})
+        self.inventory_revision += 1
+        self.hints_revision += 1
 
     def get_item_count(self, item_name: str) -> int:
         """Get the count of a specific item in the player's inventory."""
-        return sum(1 for item in self.inventory if item.name == item_name)
+        return self.inventory_counts[item_name]
     
     def has_item(self, item_name: str) -> bool:
         """Check if the player has at least one of the specified item in their inventory."""
-        return any(item.name == item_name for item in self.inventory)
+        return self.inventory_counts[item_name] > 0
     
     def get_collected_items(self, items: Iterable[Any]) -> list:
-        """For a list of items requested, return the items that are present in the inventory."""
-        collected_items = []
-
-        for collected_item in self.inventory:
-            if collected_item.name in items:
-                collected_items.append(collected_item)
+        """For a list of items requested, return the items that are present in the inventory.
+        Returned in the order they were received, same as the inventory."""
+        positions = []
+        for name in set(items):
+            positions.extend(self.inventory_index.get(name, ()))
         
-        return collected_items
+        return [self.inventory[i] for i in sorted(positions)]
     
     def add_spoiler(self, item: 'Item'):
         """Add an item to the player's spoiler log."""
@@ -347,52 +647,80 @@ class Player(dict):
             logger.error(f"Attempted to add spoiler for player {self.name} but they are not involved with the item: {item.name} at {item.sender}: {item.location} for {item.receiver}")
             return False
 
-class Item(dict):
-    """An Archipelago item in the multiworld"""
+class Item:
+    """An Archipelago item in the multiworld
 
-    sender = None
-    receiver = None
-    name = None
-    game = None
-    location = None
-    location_costs: list[str] = []
-    location_info: str = None
-    location_entrance = None
-    is_location_checkable = None
-    classification = None
-    count = 1
-    found = False
-    hinted = False
-    spoiled = False
-    received_timestamp: datetime.datetime = None
+    There's one of these for every location in the seed, so it's slotted (no per-instance
+    __dict__) and the game/item/location names are interned, so that every copy of the
+    same name shares one string."""
+
+    __slots__ = ('sender', 'receiver', 'name', 'game', 'location', 'location_costs', 'location_info',
+                 'location_entrance', '_is_location_checkable', 'classification', 'count',
+                 '_found', 'hinted', 'spoiled', 'received_timestamp', 'tracked_by')
 
     def __init__(self, sender: Player|str, receiver: Player, item: str, location: str, entrance: str = None, received_timestamp: float = None):
-        self.sender = sender
-        self.receiver = receiver
-        self.name = item
-        self.game = receiver.game
-        self.location = location
-        self.is_location_checkable = self.get_location_checkable()
-        self.location_entrance = entrance
-        self.location_costs, self.location_info = handle_location_hinting(self.receiver, self)
-        self.classification = self.set_item_classification(self)
+        self.tracked_by: Player = None # Player whose location totals include this item
+        self.sender: Player|str = sender
+        self.receiver: Player = receiver
+        self.name: str = sys.intern(item)
+        self.game: str = sys.intern(receiver.game) if receiver.game else receiver.game
+        self.location: str = sys.intern(location)
+        self.location_entrance: str = entrance
+        self.location_costs: list[str] = []
+        self.location_info: str = None
+        self.is_location_checkable = None
+        self.classification: str = None
         self.count: int = 1
         self.found = False
         self.hinted = False
         self.spoiled = False
-        self.received_timestamp = received_timestamp
+        self.received_timestamp: datetime.datetime = received_timestamp
+
+        self.is_location_checkable = self.get_location_checkable()
+        self.location_costs, self.location_info = handle_location_hinting(self.receiver, self)
+        self.classification = self.set_item_classification(self)
 
         if self.game is None:
             logger.warning(f"Item object for {self.name} has no game associated with it?")
 
-        if self.game not in item_table:
-            item_table[self.game] = {}
-        if self.name not in item_table[self.game]:
-            item_table[self.game][self.name] = self
+        item_table.setdefault(self.game, set()).add(self.name)
 
     def __str__(self):
         return self.name
 
+    def __setstate__(self, state):
+        # Unpickled from a room's snapshot, without going through __init__, so intern and register the names here
+        _, slots = state
+        for key, value in slots.items():
+            object.__setattr__(self, key, value)
+        for key in ('name', 'game', 'location'):
+            if isinstance(getattr(self, key, None), str):
+                object.__setattr__(self, key, sys.intern(getattr(self, key)))
+        item_table.setdefault(self.game, set()).add(self.name)
+
+    # found and is_location_checkable feed into the sender's location totals,
+    # so changing either one adjusts those as it goes
+
+    @property
+    def found(self) -> bool:
+        return self._found
+
+    @found.setter
+    def found(self, value: bool):
+        if self.tracked_by is not None and (value is True) != (getattr(self, '_found', None) is True):
+            self.tracked_by.found_location_count += 1 if value is True else -1
+        self._found = value
+
+    @property
+    def is_location_checkable(self) -> bool:
+        return self._is_location_checkable
+
+    @is_location_checkable.setter
+    def is_location_checkable(self, value: bool):
+        if self.tracked_by is not None and (value is True) != (getattr(self, '_is_location_checkable', None) is True):
+            self.tracked_by.checkable_location_count += 1 if value is True else -1
+        self._is_location_checkable = value
+
     def to_dict(self):
         return {
             "sender": str(self.sender) if hasattr(self.sender, 'name') else self.sender,
@@ -415,7 +743,7 @@ class Item(dict):
     def collect(self):
         """Mark this item as collected and add it to the receiver's inventory."""
         self.found = True
-        self.receiver.inventory.append(self)
+        self.receiver.add_to_inventory(self)
 
     def hint(self):
         self.hinted = True
@@ -436,11 +764,7 @@ class Item(dict):
                 # So let's assume they they are all checkable
                 return True 
             case _:
-                with sqlcon.cursor() as cursor:
-                    cursor.execute("SELECT is_checkable FROM archipelago.game_locations WHERE game = %s AND location = %s;", (self.sender.game, self.location))
-                    response = cursor.fetchone()
-                    # logger.info(f"locationsdb: {self.sender.game}: {self.location} is checkable: {response[0]}") # debugging in info, yes i know
-                    return response[0] if response else False
+                return location_registry.is_checkable(self.sender.game, self.location)
 
     def db_add_location(self, is_check: bool = False):
         """Add this item's location to the database if it doesn't already exist.
@@ -450,26 +774,11 @@ class Item(dict):
         If the location already exists, but the 'checkable' value is wrong,
         this function will update the value in the database.
 
-        This should help to establish accurate location counts when we start tracking those."""
-        cursor = sqlcon.cursor()
-
-        cursor.execute("CREATE TABLE IF NOT EXISTS archipelago.game_locations (game bpchar, location bpchar, is_checkable boolean)")
+        This should help to establish accurate location counts when we start tracking those.
 
-        is_checkable: bool = None
-
-        try:
-            cursor.execute("SELECT * FROM archipelago.game_locations WHERE game = %s AND location = %s;", (self.sender.game, self.location))
-            game, location, is_checkable = cursor.fetchone()
-            if is_checkable != is_check and is_check == True:
-                logger.debug(f"Request to update checkable status for {self.sender.game}: {self.location} (to: {str(is_check)})")
-                cursor.execute("UPDATE archipelago.game_locations set is_checkable = %s WHERE game = %s AND location = %s;", (str(is_check), game, location))
-        except TypeError:
-            logger.debug("Nothing found for this location, likely")
-            logger.info(f"locationsdb: adding {self.sender.game}: {self.location} to the db")
-            cursor.execute("INSERT INTO archipelago.game_locations VALUES (%s, %s, %s)", (self.sender.game, self.location, str(is_check)))
-        finally:
-            sqlcon.commit()
-        logger.debug(f"locationsdb: classified {self.sender.game}: {self.location} as {is_checkable}")
+        Writes are batched by location_registry, so call location_registry.flush()
+        once you're done with a group of these."""
+        location_registry.observe(self.sender.game, self.location, is_check)
         self.is_location_checkable = self.get_location_checkable()
 
 
@@ -496,7 +805,10 @@ class Item(dict):
         if self.game is None:
             return None
 
-        if self.game in classification_cache and self.name in classification_cache[self.game]:
+        if self.game in preloaded_games and self.name in classification_cache[self.game]:
+            # Bulk-loaded, and kept up to date by apply_db_changes
+            return classification_cache[self.game][self.name][0]
+        elif self.game in classification_cache and self.name in classification_cache[self.game]:
             if bool(classification_cache[self.game][self.name][1]) and (time.time() - classification_cache[self.game][self.name][1] > cache_timeout):
                 if classification_cache[self.game][self.name][0] is None:
                     logger.warning(f"Invalidating cache for {self.game}: {self.name}")
@@ -511,20 +823,19 @@ class Item(dict):
                 if self.name == "Filler": response = "filler"
                 else: response = "progression"
             case "SlotLock"|"APBingo": response = "progression" # metagames are generally always progression
+            case _ if not pool.available():
+                pass # Can't look it up, so leave it unclassified for now
             case _:
-                cursor = sqlcon.cursor()
-
-                cursor.execute("CREATE TABLE IF NOT EXISTS archipelago.item_classifications (game bpchar, item bpchar, classification varchar(32))")
-
-                try:
-                    cursor.execute("SELECT classification FROM archipelago.item_classifications WHERE game = %s AND item = %s;", (self.game, self.name))
-                    response = cursor.fetchone()[0]
-                except TypeError:
-                    logger.debug("Nothing found for this item, likely")
-                    logger.info(f"itemsdb: adding {self.game}: {self.name} to the db")
-                    cursor.execute("INSERT INTO archipelago.item_classifications VALUES (%s, %s, %s)", (self.game, self.name, None))
-                finally:
-                    sqlcon.commit()
+                with pool.cursor() as cursor:
+                    cursor.execute("CREATE TABLE IF NOT EXISTS archipelago.item_classifications (game bpchar, item bpchar, classification varchar(32))")
+
+                    try:
+                        cursor.execute("SELECT classification FROM archipelago.item_classifications WHERE game = %s AND item = %s;", (self.game, self.name))
+                        response = cursor.fetchone()[0]
+                    except TypeError:
+                        logger.debug("Nothing found for this item, likely")
+                        logger.info(f"itemsdb: adding {self.game}: {self.name} to the db")
+                        cursor.execute("INSERT INTO archipelago.item_classifications VALUES (%s, %s, %s)", (self.game, self.name, None))
         logger.debug(f"itemsdb: classified {self.game}: {self.name} as {response}")
         if self.game not in classification_cache:
             classification_cache[self.game] = {}
@@ -550,14 +861,16 @@ class Item(dict):
             return False
 
         logger.info(f"Request to update classification for {self.game}: {self.name} (to: {classification})")
-        cursor = sqlcon.cursor()
-
-        cursor.execute("CREATE TABLE IF NOT EXISTS archipelago.item_classifications (game bpchar, item bpchar, classification varchar(32))")
-
         try:
-            cursor.execute("UPDATE archipelago.item_classifications set classification = %s where game = %s and item = %s;", (classification, self.game, self.name))
+            if not pool.available():
+                return False
+            with pool.cursor() as cursor:
+                cursor.execute("CREATE TABLE IF NOT EXISTS archipelago.item_classifications (game bpchar, item bpchar, classification varchar(32))")
+                cursor.execute("UPDATE archipelago.item_classifications set classification = %s where game = %s and item = %s;", (classification, self.game, self.name))
+                notify_changed(cursor, CLASSIFICATION_CHANNEL, self.game)
         finally:
-            sqlcon.commit()
+            if self.game in classification_cache:
+                classification_cache[self.game][self.name] = (classification, time.time())
             self.set_item_classification(self.receiver)
         return True
 
@@ -732,7 +1045,7 @@ def handle_item_tracking(game: Game, player: Player, item: Item):
                         return f"{item} ({count}/{required})"
                 case "DOOM 1993":
                     if item.endswith(" - Complete"):
-                        count = len([i for i in player.inventory if str(i).endswith(" - Complete")])
+                        count = sum(c for i, c in player.inventory_counts.items() if i.endswith(" - Complete"))
                         required = 0
                         for episode in 1, 2, 3, 4:
                             if settings[f"Episode {episode}"] is True:
@@ -740,7 +1053,7 @@ def handle_item_tracking(game: Game, player: Player, item: Item):
                         return f"{item} ({count}/{required})"
                 case "DOOM II":
                     if item.endswith(" - Complete"):
-                        count = len([i for i in player.inventory if str(i).endswith(" - Complete")])
+                        count = sum(c for i, c in player.inventory_counts.items() if i.endswith(" - Complete"))
                         required = 0
                         if settings["Episode 1"] is True:
                             required = required + 11 # MAP01-MAP11
@@ -757,11 +1070,11 @@ def handle_item_tracking(game: Game, player: Player, item: Item):
                 case "gzDoom":
                     item_regex = re.compile(r"^([a-zA-Z]+) \((\S+)\)$")
                     if item.startswith("Level Access"):
-                        count = len([i for i in player.inventory if str(i).startswith("Level Access")])
+                        count = sum(c for i, c in player.inventory_counts.items() if i.startswith("Level Access"))
                         total = len(settings['Included levels'])
                         return f"{item} ({count}/{total})"
                     if item.startswith("Level Clear"):
-                        count = len([i for i in player.inventory if str(i).startswith("Level Clear")])
+                        count = sum(c for i, c in player.inventory_counts.items() if i.startswith("Level Clear"))
                         required_num = 0
                         required_maps = []
                         req_maps_formatted = []
@@ -784,7 +1097,7 @@ def handle_item_tracking(game: Game, player: Player, item: Item):
                         subitem,map = item_match.groups()
                         collected_string = str()
                         keys = [f"{color}{key}" for color in ["Blue","Yellow","Red"] for key in ["Skull", "Card"]]
-                        map_keys = sorted([i for i in item_table['gzDoom'].keys() if (i.endswith(f"({map})") and any([key in i for key in keys]))])
+                        map_keys = sorted([i for i in item_table['gzDoom'] if (i.endswith(f"({map})") and any([key in i for key in keys]))])
                         for i in map_keys:
                             if player.has_item(i): collected_string += i[0]
                             else: collected_string += "_"
@@ -833,7 +1146,7 @@ def handle_item_tracking(game: Game, player: Player, item: Item):
                 case "Mega Man 2":
                     if item.endswith("Access Codes"):
                         total = 8
-                        count = len([i for i in player.inventory if str(i).endswith("Access Codes")])
+                        count = sum(c for i, c in player.inventory_counts.items() if i.endswith("Access Codes"))
                         return f"{item} ({count}/{total})"
                 case "Muse Dash":
                     if item == "Music Sheet":
@@ -954,7 +1267,7 @@ def handle_item_tracking(game: Game, player: Player, item: Item):
 
                         return f"{item} ({count}/{next_req})"
                     if item in ["Blue Questagon", "Red Questagon", "Green Questagon"]:
-                        count = len(i for i in ["Blue Questagon", "Red Questagon", "Green Questagon"] if i in player.inventory)
+                        count = len([i for i in ["Blue Questagon", "Red Questagon", "Green Questagon"] if player.has_item(i)])
                         required = 3
                         return f"{item} (*{count}/{required}*)"
                     if item == "Sword Upgrade":
@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Iterable
+from urllib.parse import quote
+
+logger = logging.getLogger('discord.ap')
+
+# Community item classifications, one progression.txt per game
+WORLD_DATA_URL = "https://raw.githubusercontent.com/silasary/world_data/refs/heads/main/worlds"
+# Copies of the files we've fetched, with their ETags, so unchanged files aren't downloaded again
+CACHE_DIR = os.path.join('cache', 'world_data')
+# How many files to fetch at once
+FETCH_WORKERS = 8
+
+
+def parse_progression(text: str) -> dict[str, str]:
+    """Each line is in the format 'Item Name: classification'.
+    Everything up to the final ':' is the item name."""
+    classifications = {}
+    for line in text.splitlines():
+        if ':' in line:
+            item, classification = line.rsplit(':', 1)
+            classifications[item.strip()] = classification.strip().lower()
+    return classifications
+
+
+class WorldDataFetcher:
+    """Fetches progression.txt for many games at once.
+
+    `source` is the base URL of the world_data repository's worlds/ folder, or a local directory
+    laid out the same way ({source}/{game}/progression.txt), which is handy for testing."""
+
+    def __init__(self, source: str = WORLD_DATA_URL, workers: int = FETCH_WORKERS, timeout: int = 10, cache_dir: str = CACHE_DIR):
+        self.source = source
+        self.workers = workers
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.local = not source.startswith(('http://', 'https://'))
+
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=workers))
+
+    def fetch_all(self, games: Iterable[str]) -> dict[str, dict[str, str]]:
+        """Classifications for every game that has a progression.txt. Games without one are left out."""
+        games = list(games)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(self.fetch, games)
+            return {game: parse_progression(text) for game, text in zip(games, results) if text is not None}
+
+    def fetch(self, game: str) -> str | None:
+        if self.local:
+            try:
+                with open(os.path.join(self.source, game, 'progression.txt'), 'r', encoding='UTF-8') as file:
+                    return file.read()
+            except FileNotFoundError:
+                return None
+
+        cached_text, etag = self.load_cached(game)
+        headers = {'If-None-Match': etag} if etag else {}
+        try:
+            response = self.session.get(f"{self.source}/{quote(game)}/progression.txt", headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.error(f"Couldn't fetch community classifications for {game}: {e}")
+            return cached_text
+
+        if response.status_code == 304:
+            logger.debug(f"Community classifications for {game} haven't changed.")
+            return cached_text
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            logger.error(f"Couldn't fetch community classifications for {game}: HTTP {response.status_code}")
+            return cached_text
+
+        self.save_cached(game, response.text, response.headers.get('ETag'))
+        logger.info(f"Retrieved community classifications for {game} from world_data repository.")
+        return response.text
+
+    def cache_path(self, game: str) -> str:
+        return os.path.join(self.cache_dir, f"{quote(game, safe='')}.json")
+
+    def load_cached(self, game: str) -> tuple[str | None, str | None]:
+        try:
+            with open(self.cache_path(game), 'r', encoding='UTF-8') as file:
+                cached = json.load(file)
+            return cached['text'], cached['etag']
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def save_cached(self, game: str, text: str, etag: str | None):
+        if not etag:
+            return
+        path = self.cache_path(game)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(f"{path}.tmp", 'w', encoding='UTF-8') as file:
+                json.dump({'etag': etag, 'text': text}, file)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.error(f"Couldn't cache community classifications for {game}: {e}")
@@ -2,7 +2,6 @@ from datetime import datetime, timedelta
 import json
 import os
 import sys
-import subprocess
 import requests
 import logging
 import signal
@@ -11,18 +10,24 @@ import traceback
 import typing
 from io import BytesIO
 import psycopg2 as psql
-from psycopg2.extras import Json as psql_json
+from psycopg2.extras import Json as psql_json, execute_values
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from tabulate import tabulate
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import Context
 from discord.ext.commands._types import BotT
 
 # from cmds.ap_scripts.archilogger import ItemLog
 from cmds.ap_scripts.emitter import event_emitter
+from cmds.ap_scripts.completions import CompletionIndex
+from cmds.ap_scripts.world_data import WorldDataFetcher, WORLD_DATA_URL
+from cmds.ap_scripts import ipc
+from cmds.ap_scripts.utils import notify_changed, CLASSIFICATION_CHANNEL, LOCATION_CHANNEL
+from cmds.ap_scripts.supervisor import Supervisor, MEMORY_PER_ROOM_MB
+from cmds.db_helpers import pool, asyncdb
 from collections import defaultdict
 import time
 
@@ -33,19 +38,17 @@ logger = logging.getLogger('discord.ap')
 with open('config.yaml', 'r', encoding='UTF-8') as file:
     cfg = yaml.safe_load(file)
 
-sqlcfg = cfg['bot']['psql']
-try:
-    sqlcon = psql.connect(
-        dbname=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port']
-    )
-    sqlcon.set_session(autocommit=True)
-except psql.OperationalError:
-    # TODO Disable commands that need SQL connectivity
-    sqlcon = False
+# How many games import_datapackage stages between progress updates
+IMPORT_PROGRESS_EVERY = 25
+# How many rooms each itemlog worker process tracks (bot.archipelago.rooms_per_worker)
+ROOMS_PER_WORKER = 12
+# How often the itemlog workers are checked on (seconds)
+SUPERVISE_EVERY = 15
+# How many times to ask a hibernating room for its game table while it wakes up (each waits a few seconds)
+WAKE_ATTEMPTS = 6
+
+# Game, item and location names for the db autocompletes, so typing doesn't hit the database
+completion_index = CompletionIndex()
 
 def join_words(words):
     if len(words) > 2:
@@ -66,6 +69,27 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     def __init__(self, bot):
         self.ctx = bot
 
+    async def cog_load(self):
+        self.watch_workers.start()
+
+    async def cog_unload(self):
+        # The workers keep running; a reloaded cog picks the supervisor back up from extras
+        self.watch_workers.cancel()
+
+    @property
+    def supervisor(self) -> Supervisor:
+        return self.ctx.extras.get('ap_supervisor')
+
+    @tasks.loop(seconds=SUPERVISE_EVERY)
+    async def watch_workers(self):
+        if self.supervisor is None:
+            return
+        # Stopping a worker can take a few seconds, so keep it off the event loop
+        await asyncio.to_thread(self.supervisor.check)
+        for worker in self.supervisor.workers:
+            for guild in worker.guilds:
+                self.ctx.procs['archipelago'][guild] = worker.process
+
     messages = {
         "no_slots_linked": 
             """None of your linked Archipelago slots are linked to this game.
@@ -127,43 +151,26 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
     # First some helpers
     async def db_table_complete(self, ctx: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
-        cursor = sqlcon.cursor()
-        cursor.execute("select tablename from pg_catalog.pg_tables where schemaname = 'public'")
-        response = cursor.fetchall()
+        response = await asyncdb.run("select tablename from pg_catalog.pg_tables where schemaname = 'public'", fetch='all')
         return [app_commands.Choice(name=opt[0],value=opt[0]) for opt in response]
 
     async def db_game_complete(self, ctx: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
-        cursor = sqlcon.cursor()
-        cursor.execute("select game, count(*) from archipelago.item_classifications group by game;")
-        response = sorted([opt[0] for opt in cursor.fetchall()])
-        if len(current) == 0:
-            return [app_commands.Choice(name=opt,value=opt) for opt in response[:20]]
-        else:
-            return [app_commands.Choice(name=opt,value=opt) for opt in response if current.lower() in opt.lower()][:20]
+        response = await completion_index.search_games(current)
+        return [app_commands.Choice(name=opt[:100],value=opt) for opt in response]
 
     async def db_item_complete(self, ctx: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
-        cursor = sqlcon.cursor()
         game_selection = ctx.data['options'][0]['options'][0]['options'][0]['value']
-        cursor.execute(f"select item from archipelago.item_classifications where game = '{str(game_selection)}';")
-        response = sorted([opt[0] for opt in cursor.fetchall()])
-        if len(current) == 0:
-            return [app_commands.Choice(name=opt,value=opt) for opt in response[:20]]
-        elif "%" in current or "?" in current:
+        if "%" in current or "?" in current:
             return [app_commands.Choice(name=f"{current} (Multi-Selection)",value=current)]
-        else:
-            return [app_commands.Choice(name=opt,value=opt) for opt in response if current.lower() in opt.lower()][:20]
+        response = await completion_index.search_items(str(game_selection), current)
+        return [app_commands.Choice(name=opt[:100],value=opt) for opt in response]
 
     async def db_location_complete(self, ctx: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
-        cursor = sqlcon.cursor()
         game_selection = ctx.data['options'][0]['options'][0]['options'][0]['value']
-        cursor.execute(f"select location from archipelago.game_locations where game = '{str(game_selection)}';")
-        response = sorted([opt[0] for opt in cursor.fetchall()])
-        if len(current) == 0:
-            return [app_commands.Choice(name=opt,value=opt) for opt in response[:20]]
-        elif "%" in current or "?" in current:
+        if "%" in current or "?" in current:
             return [app_commands.Choice(name=f"{current} (Multi-Selection)",value=current)]
-        else:
-            return [app_commands.Choice(name=opt,value=opt) for opt in response if current.lower() in opt.lower()][:20]
+        response = await completion_index.search_locations(str(game_selection), current)
+        return [app_commands.Choice(name=opt[:100],value=opt) for opt in response]
 
     async def db_classification_complete(self, ctx: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         permitted_values = [
@@ -189,13 +196,12 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     async def db_select(self, interaction: discord.Interaction, table: str, selection: str, where: str = None, public: bool = False):
         """Run a basic PostgreSQL SELECT command on a table."""
 
-        cursor = sqlcon.cursor()
         logger.info(f"executed SQL command from discord: SELECT {selection} FROM {table} {f'WHERE {where}' if bool(where) else ''};")
-        cursor.execute(f"SELECT {selection} FROM {table} {f'WHERE {where}' if bool(where) else ''};")
-        response = cursor.fetchall()
-
-        # Set headers (for prettiness)
-        headers = [desc[0].replace("_", " ").title() for desc in cursor.description]
+        def select(cursor):
+            cursor.execute(f"SELECT {selection} FROM {table} {f'WHERE {where}' if bool(where) else ''};")
+            # Set headers (for prettiness)
+            return cursor.fetchall(), [desc[0].replace("_", " ").title() for desc in cursor.description]
+        response, headers = await asyncdb.with_cursor(select, autocommit=True)
 
         str_response = tabulate(response,headers=headers)
         try:
@@ -212,20 +218,21 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     @app_commands.autocomplete(game=db_game_complete,item=db_item_complete,classification=db_classification_complete)
     async def db_update_item_classification(self, interaction: discord.Interaction, game: str, item: str, classification: str):
         """Update the classification of an item."""
-        cursor = sqlcon.cursor()
+        def update(cursor, query):
+            cursor.execute(query, (classification.lower(), game, item))
+            notify_changed(cursor, CLASSIFICATION_CHANNEL, game)
+            return cursor.rowcount
 
         if '%' in item or '?' in item:
-            cursor.execute("UPDATE archipelago.item_classifications SET classification = %s where game = %s and item like %s", (classification.lower(), game, item))
-            count = cursor.rowcount
+            count = await asyncdb.with_cursor(update, "UPDATE archipelago.item_classifications SET classification = %s where game = %s and item like %s")
+            completion_index.invalidate(game)
             logger.info(f"Classified {str(count)} item(s) matching '{item}' in {game} to {classification}")
             return await interaction.response.send_message(f"Classification for {game}'s {str(count)} items matching '{item}' was successful.",ephemeral=True)
         else:
-            try:
-                cursor.execute("UPDATE archipelago.item_classifications SET classification = %s where game = %s and item = %s", (classification.lower(), game, item))
-                logger.info(f"Classified '{item}' in {game} to {classification}")
-                return await interaction.response.send_message(f"Classification for {game}'s '{item}' was successful.",ephemeral=True)
-            finally:
-                pass
+            await asyncdb.with_cursor(update, "UPDATE archipelago.item_classifications SET classification = %s where game = %s and item = %s")
+            completion_index.invalidate(game)
+            logger.info(f"Classified '{item}' in {game} to {classification}")
+            return await interaction.response.send_message(f"Classification for {game}'s '{item}' was successful.",ephemeral=True)
 
     @is_aphost()
     @app_commands.default_permissions(send_messages=True)
@@ -235,13 +242,10 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     @app_commands.autocomplete(game=db_game_complete,item=db_item_complete)
     async def db_set_item_description(self, interaction: discord.Interaction, game: str, item: str):
         """Set the description of an item using a Discord popup window."""
-        cursor = sqlcon.cursor()
-
         existing_description = None
 
         # Check if a description already exists
-        cursor.execute("SELECT description FROM archipelago.item_classifications WHERE game = %s AND item = %s", (game, item))
-        result = cursor.fetchone()
+        result = await asyncdb.run("SELECT description FROM archipelago.item_classifications WHERE game = %s AND item = %s", (game, item), fetch='one')
         if result and result[0]:
             # If a description already exists, we'll put it as the modal placeholder
             existing_description = result[0]
@@ -261,8 +265,8 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
             async def on_submit(self, interaction: discord.Interaction):
                 description = self.description.value
-                cursor.execute("UPDATE archipelago.item_classifications SET description = %s WHERE game = %s AND item = %s",
-                               (description, self.game, self.item))
+                await asyncdb.run("UPDATE archipelago.item_classifications SET description = %s WHERE game = %s AND item = %s",
+                                  (description, self.game, self.item))
                 await interaction.response.send_message(f"Description for {self.game}'s '{self.item}' has been set.", ephemeral=True)
                 logger.info(f"User {interaction.user.display_name} ({interaction.user.id}) set description for {game}'s {item}.")
 
@@ -278,20 +282,21 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     @app_commands.autocomplete(game=db_game_complete,location=db_location_complete)
     async def db_update_location_checkability(self, interaction: discord.Interaction, game: str, location: str, is_checkable: bool):
         """Update the checkability of a game's location. Non-checkable locations are classified as Events in Archipelago."""
-        cursor = sqlcon.cursor()
+        def update(cursor, query):
+            cursor.execute(query, (is_checkable, game, location))
+            notify_changed(cursor, LOCATION_CHANNEL, game)
+            return cursor.rowcount
 
         if '%' in location:
-            cursor.execute("UPDATE archipelago.game_locations SET is_checkable = %s where game = %s and location like %s", (is_checkable, game, location))
-            count = cursor.rowcount
+            count = await asyncdb.with_cursor(update, "UPDATE archipelago.game_locations SET is_checkable = %s where game = %s and location like %s")
+            completion_index.invalidate(game)
             logger.info(f"Classified {str(count)} locations(s) matching '{location}' in {game} to {'not ' if is_checkable is False else ''}checkable")
             return await interaction.response.send_message(f"Classification for {game}'s {str(count)} locations matching '{location}' was successful.",ephemeral=True)
         else:
-            try:
-                cursor.execute("UPDATE archipelago.game_locations SET is_checkable = %s where game = %s and location = %s", (is_checkable, game, location))
-                logger.info(f"Classified '{location}' in {game} to {'not ' if is_checkable is False else ''}checkable")
-                return await interaction.response.send_message(f"Classification for {game}'s '{location}' was successful.",ephemeral=True)
-            finally:
-                pass
+            await asyncdb.with_cursor(update, "UPDATE archipelago.game_locations SET is_checkable = %s where game = %s and location = %s")
+            completion_index.invalidate(game)
+            logger.info(f"Classified '{location}' in {game} to {'not ' if is_checkable is False else ''}checkable")
+            return await interaction.response.send_message(f"Classification for {game}'s '{location}' was successful.",ephemeral=True)
 
     # Uncomment this command when the itemlog is running off Pepper too
     # So we can crossreference the itemlog message with the mentioned items/etc
@@ -312,7 +317,7 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     #     game = room['game']
     #     item_name = item.content.strip()
 
-    #     with sqlcon.cursor() as cursor:
+    #     with pool.cursor(autocommit=True) as cursor:
     #         cursor.execute("SELECT classification, description FROM archipelago.item_classifications WHERE game = %s AND item = %s", (game, item_name))
     #         result = cursor.fetchone()
 
@@ -332,55 +337,81 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     async def import_datapackage(self, interaction: discord.Interaction, url: str = "https://archipelago.gg/datapackage"):
         """Import items and locations from an Archipelago datapackage into the database."""
 
-        with sqlcon.cursor() as cursor:
-
-            deferpost = await interaction.response.defer(ephemeral=True, thinking=True,)
-            newpost = await interaction.original_response()
-
-            data = requests.get(url, timeout=5)
-            datapackage = data.json()
-
-            games = list(datapackage['games'].keys())
-            if "Archipelago" in games:
-                del datapackage['games']["Archipelago"] # Skip the Archipelago data
-                games.remove("Archipelago")
-
-            msg = f"The datapackage provided has data for:\n\n{", ".join(games)}\n\nImport in progress..."
-            if len(msg) > 2000:
-                msg = f"The datapackage provided has data for {len(games)} games. Import in progress..."
-            await newpost.edit(content=msg)
-
-            for game, data in datapackage['games'].items():
-                games_list = list(datapackage['games'].keys())
-                if "Archipelago" in games_list: games_list.remove("Archipelago")
-                current_index = games_list.index(game)
-                next_game = games_list[current_index + 1] if current_index + 1 < len(games_list) else None
-
-                # Retrieve community progression data if it exists
-                comm_classification_table = {}
-                classification = None
-
-
-                if game == "Archipelago": continue
-                for item in data['item_name_groups']['Everything']:
-                    logger.info(f"Importing {game}: {item} to item_classification")
-                    cursor.execute(
-                        "INSERT INTO archipelago.item_classifications (game, item, classification) VALUES (%s, %s, %s) ON CONFLICT (game, item) DO UPDATE SET classification = COALESCE(EXCLUDED.classification, archipelago.item_classifications.classification);",
-                        (game, item, classification))
-                for location in data['location_name_groups']['Everywhere']:
-                    logger.info(f"Importing {game}: {location} to game_locations")
-                    # Any location that shows up in the datapackage appears to be checkable
-                    cursor.execute(
-                        "INSERT INTO archipelago.game_locations (game, location, is_checkable) VALUES (%s, %s, %s) ON CONFLICT (game, location) DO UPDATE SET is_checkable = EXCLUDED.is_checkable;",
-                        (game, location, True))
-                # Find the next game to import, if any
-
-                if next_game:
-                    await newpost.edit(content=f"Imported {game}, working on {next_game}...")
-                else:
-                    pass
+        deferpost = await interaction.response.defer(ephemeral=True, thinking=True,)
+        newpost = await interaction.original_response()
 
-        return await newpost.edit(content="Import *should* be complete!")
+        def fetch_datapackage():
+            # The whole response is read in and then parsed, so it's done on a thread to keep the bot responsive
+            response = requests.get(url, timeout=5)
+            response.raise_for_status()
+            return response.json()
+
+        datapackage = await asyncio.to_thread(fetch_datapackage)
+        datapackage['games'].pop("Archipelago", None) # Skip the Archipelago data
+        games = list(datapackage['games'].keys())
+
+        msg = f"The datapackage provided has data for:\n\n{", ".join(games)}\n\nImport in progress..."
+        if len(msg) > 2000:
+            msg = f"The datapackage provided has data for {len(games)} games. Import in progress..."
+        await newpost.edit(content=msg)
+
+        loop = asyncio.get_running_loop()
+        progress_edits = []
+
+        def report(done: int):
+            # Called from the import thread, so hand the edit back to the event loop
+            next_game = games[done] if done < len(games) else None
+            content = f"Staged {done} of {len(games)} games{f', working on {next_game}' if next_game else ', merging'}..."
+            progress_edits.append(asyncio.run_coroutine_threadsafe(newpost.edit(content=content), loop))
+
+        def import_games(cursor):
+            # Stage everything in temp tables with COPY, then merge each table with a single upsert.
+            # It's one transaction, so a failed import leaves the tables as they were
+            cursor.execute("CREATE TEMP TABLE import_items (game text, item text) ON COMMIT DROP;")
+            cursor.execute("CREATE TEMP TABLE import_locations (game text, location text) ON COMMIT DROP;")
+
+            item_count = location_count = 0
+            for start in range(0, len(games), IMPORT_PROGRESS_EVERY):
+                batch = games[start:start + IMPORT_PROGRESS_EVERY]
+                item_count += pool.copy_rows(cursor, 'import_items', ('game', 'item'),
+                    ((game, item) for game in batch for item in datapackage['games'][game]['item_name_groups']['Everything']))
+                location_count += pool.copy_rows(cursor, 'import_locations', ('game', 'location'),
+                    ((game, location) for game in batch for location in datapackage['games'][game]['location_name_groups']['Everywhere']))
+                report(start + len(batch))
+
+            cursor.execute(
+                "INSERT INTO archipelago.item_classifications (game, item, classification) "
+                "SELECT DISTINCT game, item, NULL FROM import_items "
+                "ON CONFLICT (game, item) DO NOTHING;")
+            new_items = cursor.rowcount
+            # Any location that shows up in the datapackage appears to be checkable
+            cursor.execute(
+                "INSERT INTO archipelago.game_locations (game, location, is_checkable) "
+                "SELECT DISTINCT game, location, TRUE FROM import_locations "
+                "ON CONFLICT (game, location) DO UPDATE SET is_checkable = EXCLUDED.is_checkable "
+                "WHERE archipelago.game_locations.is_checkable IS DISTINCT FROM TRUE;")
+            changed_locations = cursor.rowcount
+            for game in games:
+                notify_changed(cursor, CLASSIFICATION_CHANNEL, game)
+                notify_changed(cursor, LOCATION_CHANNEL, game)
+            logger.info(f"Imported datapackage: {item_count} items ({new_items} new) and {location_count} locations ({changed_locations} new or now checkable) across {len(games)} games")
+            return item_count, new_items, location_count, changed_locations
+
+        start_time = time.time()
+        try:
+            item_count, new_items, location_count, changed_locations = await asyncdb.with_cursor(import_games)
+        except psql.Error as e:
+            logger.error(f"Datapackage import failed: {e}")
+            return await newpost.edit(content=f"**Error**: the import failed, nothing was changed.\n\n```{e}```")
+        finally:
+            # Don't let a late progress update overwrite the result
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in progress_edits), return_exceptions=True)
+        # Only once it's committed, or an autocomplete could reload the old rows in the meantime
+        for game in games:
+            completion_index.invalidate(game)
+
+        return await newpost.edit(content=f"Import complete in {time.time() - start_time:.1f}s! "
+                                          f"{item_count} items ({new_items} new) and {location_count} locations ({changed_locations} new or now checkable) from {len(games)} games.")
     
     @is_aphost()
     @db.command()
@@ -392,38 +423,25 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
         deferpost = await interaction.response.defer(ephemeral=True, thinking=True,)
         newpost = await interaction.original_response()
 
-        comm_classification_table = {}
-
-        def fetch_classifications(game: str):
-            nonlocal comm_classification_table
-            community_progression = requests.get(f"https://raw.githubusercontent.com/silasary/world_data/refs/heads/main/worlds/{game}/progression.txt")
-            if community_progression.status_code == 200:
-                comm_classification_table[game] = {}
-                for line in community_progression.text.splitlines():
-                    # Each line is in the format 'Item Name: classification'
-                    # Interpret everything up to the final ':' as the item name
-                    if ':' in line:
-                        comm_classification_table[game][line.rsplit(':', 1)[0].strip()] = line.rsplit(':', 1)[1].strip().lower()
-                logger.info(f"Retrieved community classifications for {game} from world_data repository.")
-
         # Get a list of games in our database
         if not bool(game):
-            with sqlcon.cursor() as cursor:
-                    cursor.execute("SELECT DISTINCT game FROM archipelago.item_classifications;")
-                    db_games = [row[0] for row in cursor.fetchall()]
-
-            for game in db_games:
-                fetch_classifications(game)
+            rows = await asyncdb.run("SELECT DISTINCT game FROM archipelago.item_classifications;", fetch='all')
+            db_games = [row[0] for row in rows]
         else:
-            fetch_classifications(game)
+            db_games = [game]
+
+        fetcher = WorldDataFetcher(cfg['bot']['archipelago'].get('world_data', WORLD_DATA_URL))
+        comm_classification_table = await asyncio.to_thread(fetcher.fetch_all, db_games)
 
-        
         # Update the item_classifications table with the community classifications
         skipped = 0
         processed = 0
+        updated = 0
 
-        with sqlcon.cursor() as cursor:
+        def update_classifications(cursor):
+            nonlocal skipped, processed, updated
             for game, classifications in comm_classification_table.items():
+                rows = []
                 for item, classification in classifications.items():
                     if classification not in ["mcguffin", "progression", "conditional progression", "useful", "currency", "filler", "trap"]:
                         logger.warning(f"Invalid classification '{classification}' for {game}: {item}. Skipping.")
@@ -431,18 +449,25 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
                         continue
                     if classification == "mcguffin":
                         classification = "progression"
-                    if skip_classified:
-                        cursor.execute(
-                            "UPDATE archipelago.item_classifications SET classification = %s where game = %s and item = %s and classification is null;",
-                            (classification, game, item))
-                    else:
-                        cursor.execute(
-                            "UPDATE archipelago.item_classifications SET classification = %s where game = %s and item = %s;",
-                            (classification, game, item))
-                    processed += 1
-                    logger.info(f"Updated {game}: {item} to {classification} in item_classifications table.")
-
-        return await newpost.edit(content=f"Import of community classifications complete! Processed {processed} items, skipped {skipped} items (bad classifications).")
+                    rows.append((game, item, classification))
+                if not rows:
+                    continue
+                # The whole game in one statement
+                execute_values(cursor,
+                    "UPDATE archipelago.item_classifications AS ic SET classification = v.classification "
+                    "FROM (VALUES %s) AS v(game, item, classification) "
+                    f"WHERE ic.game = v.game AND ic.item = v.item{' AND ic.classification IS NULL' if skip_classified else ''};",
+                    rows, page_size=len(rows))
+                processed += len(rows)
+                updated += cursor.rowcount
+                logger.info(f"Updated {cursor.rowcount} of {len(rows)} community classifications for {game}.")
+                notify_changed(cursor, CLASSIFICATION_CHANNEL, game)
+
+        await asyncdb.with_cursor(update_classifications)
+        for game in comm_classification_table:
+            completion_index.invalidate(game)
+
+        return await newpost.edit(content=f"Import of community classifications complete! Processed {processed} items ({updated} updated), skipped {skipped} items (bad classifications).")
     
     @is_aphost()
     @db.command()
@@ -456,16 +481,34 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
         export_data = defaultdict(str)
 
-        with sqlcon.cursor() as cursor:
-            cursor.execute("SELECT item, classification FROM archipelago.item_classifications WHERE game = %s and classification IS NOT NULL ORDER BY item asc;", (game,))
-            for item, classification in cursor.fetchall():
-                export_data[item] = classification
+        rows = await asyncdb.run("SELECT item, classification FROM archipelago.item_classifications WHERE game = %s and classification IS NOT NULL ORDER BY item asc;", (game,), fetch='all')
+        for item, classification in rows:
+            export_data[item] = classification
 
         response = "\n".join([f"{item}: {classification}" for item, classification in export_data.items()])
 
         responsefile = bytes(response,encoding='UTF-8')
         return await interaction.response.send_message("Here's the result, as a file:",file=discord.File(BytesIO(responsefile), 'result.txt'),ephemeral=True)
 
+    @commands.is_owner()
+    @db.command(name='latency')
+    @app_commands.describe(public="publish the result?")
+    async def db_latency(self, interaction: discord.Interaction, public: bool = False):
+        """Show how long each command has spent waiting on the database, and the slowest queries."""
+
+        commands_table = tabulate([(command, count, f"{avg:.1f}", f"{slowest:.1f}") for command, count, avg, slowest in asyncdb.latency_table()[:15]],
+                                  headers=["Command", "Queries", "Avg ms", "Max ms"])
+        queries = sorted(pool.query_stats.items(), key=lambda q: q[1][1], reverse=True)[:10]
+        queries_table = tabulate([(query[:50], count, f"{total / count * 1000:.1f}", f"{slowest * 1000:.1f}") for query, (count, total, slowest) in queries],
+                                 headers=["Query", "Runs", "Avg ms", "Max ms"])
+
+        str_response = f"```\n{commands_table}\n\n{queries_table}\n```"
+        try:
+            await interaction.response.send_message(str_response,ephemeral=not public)
+        except discord.errors.HTTPException:
+            responsefile = bytes(f"{commands_table}\n\n{queries_table}",encoding='UTF-8')
+            await interaction.response.send_message("Here's the result, as a file:",file=discord.File(BytesIO(responsefile), 'latency.txt'),ephemeral=not public)
+
                 
 
     aproom = app_commands.Group(name="room",description="Commands to do with the current room")
@@ -473,17 +516,16 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     async def link_slot_unlinked_complete(self, ctx: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         """Complete the slot name for linking, only showing unlinked slots."""
         players = []
-        with sqlcon.cursor() as cursor:
-            cursor.execute("""
-                SELECT player_name 
-                FROM pepper.ap_room_players 
-                WHERE guild = %s 
-                AND player_name IN (
-                    SELECT player_name FROM pepper.ap_players WHERE discord_user IS NULL
-                )
-            """, (ctx.guild_id,))
-            for row in cursor.fetchall():
-                players.append(row[0])
+        rows = await asyncdb.run("""
+            SELECT player_name 
+            FROM pepper.ap_room_players 
+            WHERE guild = %s 
+            AND player_name IN (
+                SELECT player_name FROM pepper.ap_players WHERE discord_user IS NULL
+            )
+        """, (ctx.guild_id,), fetch='all')
+        for row in rows:
+            players.append(row[0])
 
         # permitted_values = self.ctx.extras['ap_rooms'][ctx.guild_id]['players']
         if len(current) == 0:
@@ -493,7 +535,7 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
     async def link_slot_complete(self, ctx: discord.Interaction, current: str) -> typing.List[app_commands.Choice[str]]:
         if not self.ctx.extras.get('ap_rooms'):
-            self.fetch_guild_room(ctx.guild_id)
+            await self.fetch_guild_room(ctx.guild_id)
         permitted_values = self.ctx.extras['ap_rooms'][ctx.guild_id]['players']
         if len(current) == 0:
             return [app_commands.Choice(name=opt,value=opt) for opt in permitted_values]
@@ -509,9 +551,7 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
             user = interaction.user
 
         cmd = "UPDATE pepper.ap_players SET discord_user = %s WHERE player_name = %s"
-        with sqlcon.cursor() as cursor:
-            cursor.execute(cmd, (user.id, slot_name))
-            # sqlcon.commit()
+        await asyncdb.run(cmd, (user.id, slot_name))
 
         logger.info(f"Linked {slot_name} to {user.display_name} ({user.id}) in {interaction.guild.name} ({interaction.guild.id})")
         return await interaction.response.send_message(f"Linked **{slot_name}** to **{user.display_name}**!",ephemeral=True)
@@ -555,32 +595,31 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
         for p in api_data['players']:
             players.append(p[0])
 
-        with sqlcon.cursor() as cursor:
-            commands = [
-                (
-                    # This is a PostgreSQL function that deals with updating
-                    # all the various tables that need to be updated
-                    # Master room table: pepper.ap_all_rooms
-                    # Master players table: pepper.ap_players
-                    # Active rooms/players table: pepper.ap_room_players
-                    '''SELECT pepper.create_aproom(%s, %s, %s, %s, %s);''',
-                    (room_id, interaction.guild_id, players, hostname, room_port)
-                ),
-            ]
-            # When we're ready
-            for command in commands:
-                logger.info(f"Executing SQL: {command[0]} with {command[1]}")
-                cmd, params = command
-                try:
-                    cursor.execute(cmd, params)
-                except psql.Error as e:
-                    logger.error(f"Error executing SQL command: {e}")
-                    await newpost.edit(content=f"**Error**: there was a problem executing the SQL command. Please try again later.\n\n```{e}```")
-                    return
+        commands = [
+            (
+                # This is a PostgreSQL function that deals with updating
+                # all the various tables that need to be updated
+                # Master room table: pepper.ap_all_rooms
+                # Master players table: pepper.ap_players
+                # Active rooms/players table: pepper.ap_room_players
+                '''SELECT pepper.create_aproom(%s, %s, %s, %s, %s);''',
+                (room_id, interaction.guild_id, players, hostname, room_port)
+            ),
+        ]
+        # When we're ready
+        for command in commands:
+            logger.info(f"Executing SQL: {command[0]} with {command[1]}")
+            cmd, params = command
+            try:
+                await asyncdb.run(cmd, params)
+            except psql.Error as e:
+                logger.error(f"Error executing SQL command: {e}")
+                await newpost.edit(content=f"**Error**: there was a problem executing the SQL command. Please try again later.\n\n```{e}```")
+                return
 
         logger.info("SQL commands executed.")
         logger.info("Setting up room data...")
-        self.fetch_guild_room(interaction.guild_id)
+        await self.fetch_guild_room(interaction.guild_id)
 
         logger.info(f"Set room for {interaction.guild.name} ({interaction.guild.id}) to {room_url}")
         await newpost.edit(content=f"Set room for {interaction.guild.name} to {room_url} !")
@@ -593,16 +632,15 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
         if not self.ctx.extras.get('ap_rooms'):
             self.ctx.extras['ap_rooms'] = {}
-            self.fetch_guild_room(interaction.guild_id)
+            await self.fetch_guild_room(interaction.guild_id)
             if not self.ctx.extras['ap_rooms'].get(interaction.guild_id):
                 return await newpost.edit(content="No Archipelago room is currently set for this server.")
 
         room = self.ctx.extras['ap_rooms'].get(interaction.guild_id)
-        api_port = room['flask_port']
         if not room:
             return await newpost.edit(content="No Archipelago room is currently set for this server.")
 
-        game_table = requests.get(f"http://localhost:{api_port}/inspectgame", timeout=10).json()
+        game_table = await self.fetch_game_table(room)
 
         if not game_table:
             return await newpost.edit(content="Couldn't fetch the game table from the running Archipelago game.")
@@ -611,13 +649,11 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
         msg_lines.append(f"## Archipelago Room Status")
 
-        with sqlcon.cursor() as cursor:
-            try:
-                cursor.execute("SELECT room_id, host, port from pepper.ap_all_rooms WHERE active = 'true' AND guild = %s;", (interaction.guild_id,))
-                room_id, host, port = cursor.fetchone()
-                msg_lines.append(f"**Room ID** [{room_id}](<https://{host}/room/{room_id}>) (`{host}:{port}`)")
-            except psql.Error as e:
-                pass
+        try:
+            room_id, host, port = await asyncdb.run("SELECT room_id, host, port from pepper.ap_all_rooms WHERE active = 'true' AND guild = %s;", (interaction.guild_id,), fetch='one')
+            msg_lines.append(f"**Room ID** [{room_id}](<https://{host}/room/{room_id}>) (`{host}:{port}`)")
+        except psql.Error as e:
+            pass
 
         msg_lines.append(f"This game is {round(game_table['collection_percentage'],2)}% complete. ({game_table['collected_locations']} out of {game_table['total_locations']} locations checked.)")
         if game_table['running'] is False:
@@ -648,26 +684,27 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
         if not self.ctx.extras.get('ap_rooms'):
             self.ctx.extras['ap_rooms'] = {}
-            self.fetch_guild_room(interaction.guild_id)
+            await self.fetch_guild_room(interaction.guild_id)
             if not self.ctx.extras['ap_rooms'].get(interaction.guild_id):
                 return await newpost.edit(content="No Archipelago room is currently set for this server.")
 
         room = self.ctx.extras['ap_rooms'].get(interaction.guild_id)
-        api_port = room['flask_port']
         if not room:
             return await newpost.edit(content="No Archipelago room is currently set for this server.")
 
-        game_table = requests.get(f"http://localhost:{api_port}/inspectgame", timeout=10).json()
-
         linked_slots = []
-        with sqlcon.cursor() as cursor:
-            cursor.execute(
-                "SELECT rp.player_name FROM pepper.ap_room_players rp JOIN pepper.ap_players p ON rp.player_name = p.player_name WHERE rp.room_id = %s AND rp.guild = %s AND p.discord_user = %s;",
-                (room["room_id"], interaction.guild_id, interaction.user.id),
-            )
-            linked_slots = [row[0] for row in cursor.fetchall()]
+        rows = await asyncdb.run(
+            "SELECT rp.player_name FROM pepper.ap_room_players rp JOIN pepper.ap_players p ON rp.player_name = p.player_name WHERE rp.room_id = %s AND rp.guild = %s AND p.discord_user = %s;",
+            (room["room_id"], interaction.guild_id, interaction.user.id),
+            fetch='all')
+        linked_slots = [row[0] for row in rows]
         if len(linked_slots) == 0:
             return await newpost.edit(content=self.messages['no_slots_linked'])
+
+        # Only our slots' inventories come across
+        game_table = await self.fetch_game_table(room, linked_slots, ['inventory'])
+        if not game_table:
+            return await newpost.edit(content="Couldn't fetch the game table from the running Archipelago game.")
         
         player_table = {}
 
@@ -843,29 +880,29 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
         if not self.ctx.extras.get('ap_rooms'):
             self.ctx.extras['ap_rooms'] = {}
-            self.fetch_guild_room(interaction.guild_id)
+            await self.fetch_guild_room(interaction.guild_id)
             if not self.ctx.extras['ap_rooms'].get(interaction.guild_id):
                 return await newpost.edit(content="No Archipelago room is currently set for this server.")
 
         room = self.ctx.extras['ap_rooms'].get(interaction.guild_id)
-        api_port = room['flask_port']
         if not room:
             return await newpost.edit(content="No Archipelago room is currently set for this server.")
 
         room_slots = requests.get(f"https://{room['host']}/api/room_status/{room['room_id']}", timeout=10).json()['players']
 
         linked_slots = []
-        with sqlcon.cursor() as cursor:
-            cursor.execute(
-                "SELECT rp.player_name FROM pepper.ap_room_players rp JOIN pepper.ap_players p ON rp.player_name = p.player_name WHERE rp.room_id = %s AND rp.guild = %s AND p.discord_user = %s;",
-                (room["room_id"], interaction.guild_id, interaction.user.id),
-            )
-            linked_slots = [row[0] for row in cursor.fetchall()]
+        rows = await asyncdb.run(
+            "SELECT rp.player_name FROM pepper.ap_room_players rp JOIN pepper.ap_players p ON rp.player_name = p.player_name WHERE rp.room_id = %s AND rp.guild = %s AND p.discord_user = %s;",
+            (room["room_id"], interaction.guild_id, interaction.user.id),
+            fetch='all')
+        linked_slots = [row[0] for row in rows]
         if len(linked_slots) == 0:
             return await newpost.edit(content=self.messages['no_slots_linked'])
 
-        # Get the game table
-        game_table = requests.get(f"http://localhost:{api_port}/inspectgame", timeout=10).json()
+        # Get the game table (with hints for our slots only)
+        game_table = await self.fetch_game_table(room, linked_slots, ['hints'])
+        if not game_table:
+            return await newpost.edit(content="Couldn't fetch the game table from the running Archipelago game.")
 
         # Build the hint table
         hint_table = {}
@@ -878,7 +915,7 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
                     if item['classification'] in ["trap", "filler", "currency"]: continue
                     if any([game_table['players'][item['receiver']]['released'],game_table['players'][item['receiver']]['goaled']]): continue
                     hint_table[slot].update({
-                        item['location']: {"item": item['name'],
+                        (item['sender'], item['location']): {"item": item['name'],
                                     "sender": item['sender'],
                                     "receiver": item['receiver'],
                                     "classification": item['classification'],
@@ -891,7 +928,7 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
                     if item['sender'] in linked_slots: continue
                     if any([game_table['players'][item['receiver']]['released'],game_table['players'][item['receiver']]['goaled']]): continue
                     hint_table[slot].update({
-                        item['location']: {"item": item['name'],
+                        (item['sender'], item['location']): {"item": item['name'],
                                     "sender": item['sender'],
                                     "receiver": item['receiver'],
                                     "classification": item['classification'],
@@ -902,7 +939,7 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
         # Format the hint table
         hint_table_list = []
         for slot, hints in hint_table.items():
-            for location, details in hints.items():
+            for (sender, location), details in hints.items():
                 hint_table_list.append({
                     "Slot": slot,
                     "Item": details["item"],
@@ -942,6 +979,26 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
 
         await newpost.edit(content=hints_list)
 
+    @aproom.command(name="workers")
+    @is_aphost()
+    @app_commands.default_permissions(manage_messages=True)
+    @app_commands.describe(public="publish the result?")
+    async def room_workers(self, interaction: discord.Interaction, public: bool = False):
+        """Show the itemlog worker processes, and how much CPU and memory each is using."""
+
+        if self.supervisor is None or not self.supervisor.workers:
+            return await interaction.response.send_message("No itemlog workers are running.", ephemeral=True)
+
+        # watch_workers keeps the numbers fresh; waits if it's in the middle of a check
+        rows = await asyncio.to_thread(self.supervisor.table)
+        table = tabulate(rows, headers=["Guilds", "PID", "State", "Up", "Restarts", "CPU %", "RSS MiB", "Limit MiB", "Last exit"])
+        str_response = f"```\n{table}\n```"
+        try:
+            await interaction.response.send_message(str_response,ephemeral=not public)
+        except discord.errors.HTTPException:
+            responsefile = bytes(table,encoding='UTF-8')
+            await interaction.response.send_message("Here's the result, as a file:",file=discord.File(BytesIO(responsefile), 'workers.txt'),ephemeral=not public)
+
     # itemlogging = app_commands.Group(name="itemlog",description="Manage an item logging webhook")
 
     """ (2025-03-15)
@@ -961,7 +1018,23 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
     - Running it DOES NOT work
     """
 
-    def fetch_guild_room(self, guild_id: int) -> dict:
+    async def fetch_game_table(self, room: dict, slots: list[str] = None, include: list[str] = None) -> dict:
+        """Ask the room's tracker for its progress and every player's summary, plus
+        inventories and/or hints for just the given slots. Returns {} if the tracker can't be reached.
+        A hibernating room wakes up when asked, which can take a little while for big ones."""
+        for _ in range(WAKE_ATTEMPTS):
+            try:
+                response = await ipc.request(room['room_id'], {'get': 'players', 'names': slots or [], 'include': include or []})
+            except (ConnectionError, asyncio.TimeoutError) as e:
+                logger.error(f"Couldn't get the game table for room {room['room_id']}: {e}")
+                return {}
+            if not response.get('waking'):
+                return {**response['game'], 'players': response['players']}
+            logger.info(f"Room {room['room_id']} is waking up from hibernation, asking again.")
+        logger.error(f"Room {room['room_id']} didn't wake up in time to get its game table.")
+        return {}
+
+    async def fetch_guild_room(self, guild_id: int) -> dict:
         room = self.ctx.extras['ap_rooms'].get(guild_id, {})
         if room and room.get('last_activity'):
             if time.time() - room['last_activity'] < 3600:
@@ -973,27 +1046,25 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
         elif room:
             return room
         else:
-            with sqlcon.cursor() as cursor:
-                cursor.execute("SELECT * FROM pepper.ap_all_rooms WHERE guild = %s and active = 'true' LIMIT 1", (guild_id,))
-                result = cursor.fetchone()
-                if result:
-                    roomdict = {
-                        'room_id': result[0],
-                        'seed': result[1],
-                        'guild_id': result[2],
-                        'active': result[3],
-                        'host': result[4],
-                        'players': result[5],
-                        'version': result[6],
-                        'last_line': result[7],
-                        'last_activity': result[8],
-                        'port': result[9],
-                        'flask_port': result[10],
-                    }
-                    self.ctx.extras['ap_rooms'][guild_id] = roomdict
-                    return roomdict
-                else:
-                    return {}
+            result = await asyncdb.run("SELECT * FROM pepper.ap_all_rooms WHERE guild = %s and active = 'true' LIMIT 1", (guild_id,), fetch='one')
+            if result:
+                roomdict = {
+                    'room_id': result[0],
+                    'seed': result[1],
+                    'guild_id': result[2],
+                    'active': result[3],
+                    'host': result[4],
+                    'players': result[5],
+                    'version': result[6],
+                    'last_line': result[7],
+                    'last_activity': result[8],
+                    'port': result[9],
+                    'flask_port': result[10],
+                }
+                self.ctx.extras['ap_rooms'][guild_id] = roomdict
+                return roomdict
+            else:
+                return {}
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -1006,7 +1077,7 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
             for guilds in self.ctx.guilds:
                 if not self.ctx.extras['ap_rooms'].get(guilds.id):
                     self.ctx.extras['ap_rooms'][guilds.id] = {}
-                    self.fetch_guild_room(guilds.id)
+                    await self.fetch_guild_room(guilds.id)
 
         # self.ctx.extras['ap_channel'] = next((chan for chan in self.ctx.spotzone.text_channels if chan.id == 1163808574045167656))
         # while testing
@@ -1015,23 +1086,23 @@ class Archipelago(commands.GroupCog, group_name="archipelago"):
         # if len(self.ctx.extras['ap_webhook']) == 1: self.ctx.extras['ap_webhook'] = self.ctx.extras['ap_webhook'][0]
 
         # Run itemlogs if any are configured
-        if len(cfg['bot']['archipelago']['itemlogs']) > 0:
+        # Rooms are shared out between worker processes, rooms_per_worker at a time,
+        # and each worker tracks its rooms side by side (see ap_itemlog.run_rooms)
+        # on_ready fires again after reconnecting, so only ever start them once
+        itemlogs = cfg['bot']['archipelago']['itemlogs']
+        if len(itemlogs) > 0 and self.supervisor is None:
             logger.info("Starting saved itemlog processes.")
-            for log in cfg['bot']['archipelago']['itemlogs']:
-                logger.info(f"Starting itemlog for guild ID {log['guild']}")
-                # logger.info(f"Info: {json.dumps(log)}")
-                env = os.environ.copy()
-
-                env['LOG_URL'] = log['log_url']
-                env['WEBHOOK_URL'] = log['webhooks'][0] if len(log['webhooks']) > 0 else None
-                env['SESSION_COOKIE'] = log['session_cookie']
-                env['SPOILER_URL'] = log['spoiler_url'] if log['spoiler_url'] else None
-                env['MSGHOOK_URL'] = log['msghooks'][0] if len(log['msghooks']) > 0 else None
+            self.ctx.extras['ap_supervisor'] = Supervisor(cfg['bot']['archipelago'].get('memory_per_room_mb', MEMORY_PER_ROOM_MB))
+            rooms_per_worker = max(cfg['bot']['archipelago'].get('rooms_per_worker', ROOMS_PER_WORKER), 1)
+            for i in range(0, len(itemlogs), rooms_per_worker):
+                guilds = [log['guild'] for log in itemlogs[i:i + rooms_per_worker]]
+                logger.info(f"Starting itemlog worker for guild IDs {', '.join(str(g) for g in guilds)}")
 
                 try:
                     script_path = os.path.join(os.path.dirname(__file__), '..', 'ap_itemlog.py')
-                    process = subprocess.Popen([sys.executable, script_path], env=env)
-                    self.ctx.procs['archipelago'][log['guild']] = process
+                    worker = self.supervisor.add(guilds, [sys.executable, script_path, '--guilds', *[str(g) for g in guilds]])
+                    for guild in guilds:
+                        self.ctx.procs['archipelago'][guild] = worker.process
                 except:
                     logger.error("Error starting log:",exc_info=True)
 
@@ -0,0 +1,87 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import discord
+
+from cmds.db_helpers import pool
+
+# Database access for cogs. psycopg2 blocks, so every query runs on a small thread pool
+# (no bigger than the connection pool) instead of on the event loop, where one slow query
+# would hold up every guild. Time spent waiting on the database is tallied per command.
+
+logger = logging.getLogger('discord.db')
+
+pool.load_config() # For POOL_MAX; cogs always have a config.yaml
+executor = ThreadPoolExecutor(max_workers=pool.POOL_MAX, thread_name_prefix='db')
+
+# Which command (or autocomplete) the current task is handling, set by begin_command
+current_command = contextvars.ContextVar('current_command', default='(no command)')
+
+# Per-command database time: command -> [queries, total seconds, slowest]
+command_stats: dict[str, list] = {}
+_stats_lock = threading.Lock()
+
+
+def begin_command(interaction: discord.Interaction):
+    """Note which command this interaction is for, so its database time is counted against it.
+    Called from the bot's command tree before any command or autocomplete runs."""
+    if interaction.command is not None:
+        name = interaction.command.qualified_name
+    else:
+        name = interaction.data.get('custom_id', interaction.type.name) if interaction.data else interaction.type.name
+    if interaction.type is discord.InteractionType.autocomplete:
+        name = f"{name} (autocomplete)"
+    current_command.set(name)
+
+
+def record_command(elapsed: float):
+    command = current_command.get()
+    with _stats_lock:
+        stats = command_stats.setdefault(command, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+async def call(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking database function on the database threads and wait for it."""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    finally:
+        record_command(time.perf_counter() - start)
+
+
+async def available() -> bool:
+    """pool.available(), without blocking the event loop if it has to try connecting."""
+    return await asyncio.get_running_loop().run_in_executor(executor, pool.available)
+
+
+async def run(query: str, args=None, fetch: str = None) -> Any:
+    """Run one statement and return fetch='one'/'all' results (or the row count). See pool.run."""
+    return await call(pool.run, query, args, fetch)
+
+
+async def with_cursor(func: Callable, *args, autocommit: bool = False) -> Any:
+    """Run func(cursor, *args) on a pooled cursor, for anything that needs more than one statement.
+    It all happens in one transaction unless autocommit is set."""
+    def work():
+        with pool.cursor(autocommit) as cursor:
+            return func(cursor, *args)
+    return await call(work)
+
+
+def latency_table() -> list[tuple]:
+    """(command, queries, average ms, slowest ms) rows, slowest total first."""
+    with _stats_lock:
+        rows = [(command, count, total / count * 1000, slowest * 1000) for command, (count, total, slowest) in command_stats.items()]
+        rows.sort(key=lambda r: r[1] * r[2], reverse=True)
+    return rows
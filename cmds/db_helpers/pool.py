@@ -0,0 +1,240 @@
+import io
+import logging
+import threading
+import time
+import yaml
+import psycopg2 as psql
+import psycopg2.extensions
+import psycopg2.pool
+
+from contextlib import contextmanager
+
+# One pool of Postgres connections per process, shared by everything that needs the database.
+# Connections are checked before they're handed out, and replaced if the server dropped them.
+
+logger = logging.getLogger('discord.db')
+
+# config.yaml's bot.psql, read by load_config the first time the database is needed (not on import),
+# along with the pool_min, pool_max and slow_query_ms settings below
+sqlcfg: dict = None
+
+POOL_MIN = 1
+POOL_MAX = 8
+# Connections idle for longer than this get a SELECT 1 before they're handed out
+HEALTH_CHECK_AFTER = 30 # seconds
+# Queries slower than this are logged
+SLOW_QUERY = 0.5
+# How long to wait before trying to reach the server again after it was unreachable
+RETRY_AFTER = 30 # seconds
+# How long to wait for a free connection once all POOL_MAX are lent out
+POOL_WAIT = 30 # seconds
+
+_pool: psql.pool.ThreadedConnectionPool = None
+_pool_lock = threading.Lock()
+# One slot per connection: ThreadedConnectionPool raises PoolError when it's empty, so borrowers wait on this first
+_slots: threading.BoundedSemaphore = None
+_last_failure: float = 0
+_last_used: dict[int, float] = {} # id(connection) -> when it was last returned to the pool
+
+# Per-query timings: query (first 80 chars) -> [count, total seconds, slowest]
+query_stats: dict[str, list] = {}
+_stats_lock = threading.Lock()
+
+
+def load_config(path: str = 'config.yaml') -> dict:
+    """Read the database settings, once. Raises OperationalError if there aren't any,
+    so callers treat it the same as an unreachable server."""
+    global sqlcfg, POOL_MIN, POOL_MAX, SLOW_QUERY
+    if sqlcfg is None:
+        try:
+            with open(path, 'r', encoding='UTF-8') as file:
+                cfg = yaml.safe_load(file)
+            settings = cfg['bot']['psql']
+        except (OSError, KeyError, TypeError) as e:
+            raise psql.OperationalError(f"No database configured in {path}: {e!r}") from e
+        POOL_MIN = settings.get('pool_min', POOL_MIN)
+        POOL_MAX = settings.get('pool_max', POOL_MAX)
+        SLOW_QUERY = settings.get('slow_query_ms', SLOW_QUERY * 1000) / 1000
+        sqlcfg = settings
+    return sqlcfg
+
+
+def connect(autocommit: bool = False):
+    """A new connection outside the pool, for things that hold one for good (like LISTEN)."""
+    load_config()
+    con = psql.connect(
+        dbname=sqlcfg['database'],
+        user=sqlcfg['user'],
+        password=sqlcfg['password'] if 'password' in sqlcfg else None,
+        host=sqlcfg['host'],
+        port=sqlcfg['port'],
+        cursor_factory=TimedCursor
+    )
+    con.set_session(autocommit=autocommit)
+    return con
+
+
+def get_pool() -> psql.pool.ThreadedConnectionPool:
+    """The process's pool, created the first time it's needed. Raises OperationalError if the server is unreachable."""
+    global _pool, _slots, _last_failure
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            if time.time() - _last_failure < RETRY_AFTER:
+                raise psql.OperationalError("Database was unreachable a moment ago, not trying again yet")
+            try:
+                load_config()
+                _pool = psql.pool.ThreadedConnectionPool(
+                    POOL_MIN, POOL_MAX,
+                    dbname=sqlcfg['database'],
+                    user=sqlcfg['user'],
+                    password=sqlcfg['password'] if 'password' in sqlcfg else None,
+                    host=sqlcfg['host'],
+                    port=sqlcfg['port'],
+                    cursor_factory=TimedCursor
+                )
+                _slots = threading.BoundedSemaphore(POOL_MAX)
+            except psql.OperationalError as e:
+                _last_failure = time.time()
+                logger.error(f"Couldn't connect to the database: {e}")
+                raise
+    return _pool
+
+
+def available() -> bool:
+    """Whether we can reach the database (replaces the old `if not sqlcon` checks)."""
+    try:
+        get_pool()
+        return True
+    except psql.OperationalError:
+        return False
+
+
+def _healthy(con) -> bool:
+    if con.closed:
+        return False
+    if time.time() - _last_used.get(id(con), 0) < HEALTH_CHECK_AFTER:
+        return True
+    try:
+        with con.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        con.rollback()
+        return True
+    except (psql.OperationalError, psql.InterfaceError):
+        return False
+
+
+@contextmanager
+def connection(autocommit: bool = False):
+    """Borrow a connection from the pool. Commits when the block finishes, rolls back if it raises.
+    A connection the server has dropped is thrown away and replaced before you get it.
+    If they're all in use, waits (up to POOL_WAIT) for one to come back."""
+    pool = get_pool()
+    if not _slots.acquire(timeout=POOL_WAIT):
+        raise psql.OperationalError(f"All {POOL_MAX} database connections stayed busy for {POOL_WAIT}s")
+    try:
+        for attempt in range(3):
+            con = pool.getconn()
+            if _healthy(con):
+                break
+            logger.warning("Dropping a dead database connection from the pool.")
+            pool.putconn(con, close=True)
+        else:
+            raise psql.OperationalError("Couldn't get a working database connection")
+    except BaseException:
+        _slots.release()
+        raise
+
+    broken = False
+    try:
+        con.autocommit = autocommit
+        yield con
+        if not autocommit:
+            con.commit()
+    except (psql.OperationalError, psql.InterfaceError):
+        broken = True
+        raise
+    except BaseException:
+        if not con.closed:
+            con.rollback()
+        raise
+    finally:
+        _last_used[id(con)] = time.time()
+        pool.putconn(con, close=broken or bool(con.closed))
+        _slots.release()
+
+
+@contextmanager
+def cursor(autocommit: bool = False):
+    """A cursor on a pooled connection: `with pool.cursor() as cursor:`. Commits when the block finishes."""
+    with connection(autocommit) as con:
+        with con.cursor() as cur:
+            yield cur
+
+
+def run(query: str, args=None, fetch: str = None, retries: int = 1):
+    """Run one statement on its own and return fetch='one'/'all' results.
+    If the connection drops partway, it's tried again on a fresh one."""
+    for attempt in range(retries + 1):
+        try:
+            with cursor() as cur:
+                cur.execute(query, args)
+                if fetch == 'one':
+                    return cur.fetchone()
+                if fetch == 'all':
+                    return cur.fetchall()
+                return cur.rowcount
+        except (psql.OperationalError, psql.InterfaceError) as e:
+            if attempt >= retries:
+                raise
+            logger.warning(f"Database connection failed ({e}), retrying.")
+
+
+def copy_rows(cursor, table: str, columns: tuple[str, ...], rows) -> int:
+    """Load rows into a table with COPY, which is far quicker than INSERTing them one by one.
+    Returns how many rows were sent. None values go in as NULL."""
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write('\t'.join(r'\N' if value is None else _copy_escape(str(value)) for value in row))
+        buffer.write('\n')
+        count += 1
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return count
+
+
+def _copy_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor that keeps track of how long each query takes."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+
+def record_query(query, elapsed: float):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', errors='replace')
+    key = ' '.join(str(query).split())[:80]
+    with _stats_lock:
+        stats = query_stats.setdefault(key, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+    if elapsed > SLOW_QUERY:
+        logger.warning(f"Slow query ({elapsed * 1000:.0f} ms): {key}")
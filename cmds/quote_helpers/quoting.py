@@ -6,6 +6,8 @@ import re
 import asyncio
 import logging
 
+from cmds.db_helpers import pool
+
 with open('config.yaml', 'r') as file:
     cfg = yaml.safe_load(file)
 
@@ -13,7 +15,6 @@ with open('config.yaml', 'r') as file:
 logger = logging.getLogger('discord.quotes.helpers')
 
 qcfg = cfg['bot']['quoting']
-sqlcfg = cfg['bot']['psql']
 
 def format_quote(content,timestamp,authorID=None,authorName=None,bot=None,source=None,format: str='plain'):
     quote_string_id = '''"{0}"
@@ -71,15 +72,6 @@ def format_quote(content,timestamp,authorID=None,authorName=None,bot=None,source
 ### SQL FUNCTIONS
 
 def random_quote(gid: int = None,uid: int = None,sort_order: str = "random()"):
-    con = psycopg2.connect(
-        database=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port'],
-)
-    cur = con.cursor()
-    
     where_filter = []
     if bool(gid): where_filter.append(f"guild='{str(gid)}'")
     if bool(uid): where_filter.append(f"authorid {('= ' + str(uid) + '') if type(uid) == int else ('= ' + str(uid[0]) + '') if len(uid) == 1 else ('=ANY ' +  str(uid))}")
@@ -88,51 +80,28 @@ def random_quote(gid: int = None,uid: int = None,sort_order: str = "random()"):
     query = f"SELECT id,content,authorid,authorname,timestamp,karma,source FROM sanford.quotes {'WHERE ' + ' AND '.join(where_filter) if bool(uid) or bool(gid) else ''} ORDER BY {sort_order} LIMIT 1"
     logger.debug(query)
     # Fetch a random quote from the SQL database
-    try:
-        cur.execute(query)
-        id,content,aID,aName,timestamp,karma,source = cur.fetchone()
-    except TypeError as error:
-        if bool(uid) and "NoneType object" in str(error):
-            raise LookupError("Sorry, that user doesn't have any quotes saved in this server yet!")
-    cur.close()
-    con.close()
+    with pool.cursor() as cur:
+        try:
+            cur.execute(query)
+            id,content,aID,aName,timestamp,karma,source = cur.fetchone()
+        except TypeError as error:
+            if bool(uid) and "NoneType object" in str(error):
+                raise LookupError("Sorry, that user doesn't have any quotes saved in this server yet!")
     return (id, content, aID, aName, timestamp, karma, source)
 
 def insert_quote(quote_data: tuple):
-    con = psycopg2.connect(
-        database=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port']
-    )
-    cur = con.cursor()
-    
     # Validate quote tuple first
     if len(quote_data) != 8:
         raise Exception(f"Quote object has {len(quote_data)} items (should be 8)")
     
-    
-    cur.execute("INSERT INTO sanford.quotes (content, authorid, authorname, addedby, guild, msgid, timestamp, source) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id, karma;", quote_data)
-    returning = cur.fetchone()
-    con.commit()
-    cur.close()
-    con.close()
+    with pool.cursor() as cur:
+        cur.execute("INSERT INTO sanford.quotes (content, authorid, authorname, addedby, guild, msgid, timestamp, source) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id, karma;", quote_data)
+        returning = cur.fetchone()
     return returning
 
 def update_karma(qid,karma):
-    con = psycopg2.connect(
-        database=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port']
-    )
-    cur = con.cursor()
-    cur.execute("UPDATE sanford.quotes SET karma= %s WHERE id= %s", (karma, qid))
-    con.commit()
-    cur.close()
-    con.close()
+    with pool.cursor() as cur:
+        cur.execute("UPDATE sanford.quotes SET karma= %s WHERE id= %s", (karma, qid))
 
 
     
@@ -14,7 +14,6 @@ import isodate
 import dateparser
 import validators
 from io import BytesIO
-import psycopg2 as psql
 from psycopg2.extras import Json as psql_json
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
@@ -27,6 +26,7 @@ from discord.ext.commands import Context
 from discord.ext.commands._types import BotT
 
 from cmds.quote_helpers.quoting import *
+from cmds.db_helpers import asyncdb
 
 from datetime import date, timezone, timedelta as td
 
@@ -37,20 +37,6 @@ logger = logging.getLogger('discord.quotes')
 with open('config.yaml', 'r', encoding='UTF-8') as file:
     cfg = yaml.safe_load(file)
 
-sqlcfg = cfg['bot']['psql']
-try:
-    sqlcon = psql.connect(
-        dbname=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port']
-    )
-    sqlcon.set_session(autocommit=True)
-except psql.OperationalError:
-    # TODO Disable commands that need SQL connectivity
-    sqlcon = False
-
 qcfg = cfg['bot']['quoting']
 qvote_timeout = qcfg['vote_timeout']
 
@@ -76,18 +62,18 @@ class Quotes(commands.GroupCog, group_name="quote"):
             if all_servers:
                 if interaction.user.id == 49288117307310080:
                     if bool(user):
-                        qid,content,aID,aName,timestamp,karma,source = random_quote(None, user.id)
+                        qid,content,aID,aName,timestamp,karma,source = await asyncdb.call(random_quote, None, user.id)
                     else: 
-                        qid,content,aID,aName,timestamp,karma,source = random_quote(None, None)
+                        qid,content,aID,aName,timestamp,karma,source = await asyncdb.call(random_quote, None, None)
                 else:
-                    qid,content,aID,aName,timestamp,karma,source = random_quote(None, user.id)
+                    qid,content,aID,aName,timestamp,karma,source = await asyncdb.call(random_quote, None, user.id)
                     # await newpost.edit(content=
                     # ":no_entry_sign: Just FYI, `all_servers` will only work if you're exposing yourself.")
                     # return
             elif isinstance(interaction.channel, discord.abc.PrivateChannel) and bool(user):
-                qid,content,aID,aName,timestamp,karma,source = random_quote(None, user.id)
+                qid,content,aID,aName,timestamp,karma,source = await asyncdb.call(random_quote, None, user.id)
             elif bool(user):
-                qid,content,aID,aName,timestamp,karma,source = random_quote(interaction.guild_id, user.id)
+                qid,content,aID,aName,timestamp,karma,source = await asyncdb.call(random_quote, interaction.guild_id, user.id)
             elif isinstance(interaction.channel, discord.abc.PrivateChannel):
                 # Discord can't support this for user apps!
                 # Reason being, it cannot access the list of recipients in a channel, in a user app context
@@ -101,7 +87,7 @@ class Quotes(commands.GroupCog, group_name="quote"):
                     )
                 return
             else:
-                qid,content,aID,aName,timestamp,karma,source = random_quote(interaction.guild_id, None)
+                qid,content,aID,aName,timestamp,karma,source = await asyncdb.call(random_quote, interaction.guild_id, None)
         except LookupError as error:
             await newpost.edit(content=str(error))
             return
@@ -155,7 +141,7 @@ class Quotes(commands.GroupCog, group_name="quote"):
             
             try:
                 quoteview.set_footer(text=f"Score: {'+' if newkarma[1] > 0 else ''}{newkarma[1]} ({'went up by +{karmadiff} pts'.format(karmadiff=karmadiff) if karmadiff > 0 else 'went down by {karmadiff} pts'.format(karmadiff=karmadiff) if karmadiff < 0 else 'did not change'} this time).")
-                update_karma(qid,newkarma[1])
+                await asyncdb.call(update_karma, qid,newkarma[1])
                 logger.info(f"Quote {qid} karma updated to {newkarma[1]} in guild {interaction.guild_id}")
                 await qmsg.edit(embed=quoteview)
                 await qmsg.clear_reactions()
@@ -188,7 +174,7 @@ class Quotes(commands.GroupCog, group_name="quote"):
                 source if validators.url(source) else None
             )
             
-            qid,karma = insert_quote(sql_values)
+            qid,karma = await asyncdb.call(insert_quote, sql_values)
 
             logger.info("Quote saved successfully")
             logger.debug(format_quote(content, authorName=author.name, timestamp=int(datetime.timestamp(timestamp))))
@@ -220,7 +206,7 @@ class Quotes(commands.GroupCog, group_name="quote"):
                 
                 try:
                     quote.set_footer(text=f"Score: {'+' if newkarma[1] > 0 else ''}{newkarma[1]} ({'went up by +{karmadiff} pts'.format(karmadiff=karmadiff) if karmadiff > 0 else 'went down by {karmadiff} pts'.format(karmadiff=karmadiff) if karmadiff < 0 else 'did not change'} this time).")
-                    update_karma(qid,newkarma[1])
+                    await asyncdb.call(update_karma, qid,newkarma[1])
                     logger.info(f"Quote {qid} karma updated to {newkarma[1]} in guild {interaction.guild_id}")
                     await qmsg.edit(embed=quote)
                     await qmsg.clear_reactions()
@@ -242,25 +228,14 @@ async def quote_save(interaction: discord.Interaction, message: discord.Message)
     newpost = await interaction.original_response()
 
     try:
-        con = psycopg2.connect(
-        database=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port']
-    )
-        cur = con.cursor()
-
         # Strip any mention from the beginning of the message
         strippedcontent = None
         if message.content.startswith('<@'):
             strippedcontent = re.sub(r'^\s*<@!?[0-9]+>\s*', '', message.content)
 
         # Check for duplicates first
-        cur.execute("SELECT 1 from sanford.quotes WHERE msgID='" + str(message.id) + "'")
-        if cur.fetchone() is not None:
+        if await asyncdb.run("SELECT 1 from sanford.quotes WHERE msgID=%s", (str(message.id),), fetch='one') is not None:
             raise LookupError('This quote is already in the database.')
-        con.close()
 
         sql_values = (
             strippedcontent if bool(strippedcontent) else message.content,
@@ -273,7 +248,7 @@ async def quote_save(interaction: discord.Interaction, message: discord.Message)
             message.jump_url
             )
 
-        qid,karma = insert_quote(sql_values)
+        qid,karma = await asyncdb.call(insert_quote, sql_values)
         if karma == None: karma = 1
 
         quote = format_quote(message.content, authorID=message.author.id, timestamp=int(message.created_at.timestamp()), format='discord_embed')
@@ -305,7 +280,7 @@ async def quote_save(interaction: discord.Interaction, message: discord.Message)
             
             try:
                 quote.set_footer(text=f"Score: {'+' if newkarma[1] > 0 else ''}{newkarma[1]} ({'went up by +{karmadiff} pts'.format(karmadiff=karmadiff) if karmadiff > 0 else 'went down by {karmadiff} pts'.format(karmadiff=karmadiff) if karmadiff < 0 else 'did not change'} this time).")
-                update_karma(qid,newkarma[1])
+                await asyncdb.call(update_karma, qid,newkarma[1])
                 logger.info(f"Quote {qid} karma updated to {newkarma[1]} in guild {interaction.guild_id}")
                 await qmsg.edit(embed=quote)
                 await qmsg.clear_reactions()
@@ -314,7 +289,6 @@ async def quote_save(interaction: discord.Interaction, message: discord.Message)
                 logger.error(f"Error updating karma for quote {qid} in guild {interaction.guild_id}: {error}")
                 await qmsg.edit(embed=quote)
         
-        con.close()
     except psycopg2.DatabaseError as error:
         await interaction.response.send_message(f'Error: SQL Failed due to:\n```{str(error.with_traceback)}```',ephemeral=True)
         logger.error("QUOTE SQL ERROR:\n" + str(error.with_traceback))
@@ -12,7 +12,6 @@ import typing
 import datetime
 import isodate
 from io import BytesIO
-import psycopg2 as psql
 from psycopg2.extras import Json as psql_json
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
@@ -26,6 +25,8 @@ from discord.ext.commands._types import BotT
 
 from datetime import date, timezone, timedelta as td
 
+from cmds.db_helpers import pool, asyncdb
+
 cfg = None
 
 logger = logging.getLogger('discord.raocow')
@@ -35,20 +36,6 @@ executor = ThreadPoolExecutor(max_workers=5)
 with open('config.yaml', 'r', encoding='UTF-8') as file:
     cfg = yaml.safe_load(file)
 
-sqlcfg = cfg['bot']['psql']
-try:
-    sqlcon = psql.connect(
-        dbname=sqlcfg['database'],
-        user=sqlcfg['user'],
-        password=sqlcfg['password'] if 'password' in sqlcfg else None,
-        host=sqlcfg['host'],
-        port=sqlcfg['port']
-    )
-    sqlcon.set_session(autocommit=True)
-except psql.OperationalError:
-    # TODO Disable commands that need SQL connectivity
-    sqlcon = False
-
 def join_words(words):
     if len(words) > 2:
         return '%s, and %s' % ( ', '.join(words[:-1]), words[-1] )
@@ -96,11 +83,9 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
 
         results = None
 
-        if not sqlcon:
+        if not await asyncdb.available():
             return []
-        with sqlcon.cursor() as cursor:
-            cursor.execute("SELECT series_name FROM pepper.raocow_series order by series_name asc")
-            results = cursor.fetchall()
+        results = await asyncdb.run("SELECT series_name FROM pepper.raocow_series order by series_name asc", fetch='all')
 
         if len(current) == 0:
             return [app_commands.Choice(name=opt[0][:100],value=opt[0]) for opt in results][:25]
@@ -112,11 +97,9 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
 
         results = None
 
-        if not sqlcon:
+        if not await asyncdb.available():
             return []
-        with sqlcon.cursor() as cursor:
-            cursor.execute("SELECT playlist_id, title, alias FROM pepper.raocow_playlists where visible = 'true' order by datestamp desc")
-            results = cursor.fetchall()
+        results = await asyncdb.run("SELECT playlist_id, title, alias FROM pepper.raocow_playlists where visible = 'true' order by datestamp desc", fetch='all')
 
         options = []
         for result in results:
@@ -132,11 +115,9 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
 
         results = None
 
-        if not sqlcon:
+        if not await asyncdb.available():
             return []
-        with sqlcon.cursor() as cursor:
-            cursor.execute("SELECT playlist_id, title, alias FROM pepper.raocow_playlists order by datestamp desc")
-            results = cursor.fetchall()
+        results = await asyncdb.run("SELECT playlist_id, title, alias FROM pepper.raocow_playlists order by datestamp desc", fetch='all')
         
         options = []
         for result in results:
@@ -157,38 +138,34 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
 
         result = None
 
-        if not sqlcon:
+        if not await asyncdb.available():
             await interaction.followup.send("Database connection is not available.",ephemeral=True)
             return
 
         if search is None:
             logger.info("Playlist: Fetching a random playlist.")
-            with sqlcon.cursor() as cursor:
-                cursor.execute("SELECT * FROM pepper.raocow_playlists where visible = 'true' ORDER BY RANDOM() LIMIT 1")
-                result = cursor.fetchone()
+            result = await asyncdb.run("SELECT * FROM pepper.raocow_playlists where visible = 'true' ORDER BY RANDOM() LIMIT 1", fetch='one')
 
-                if not result:
-                    logger.error("No playlists found in the database.")
-                    await interaction.followup.send("No playlists found in the database.", ephemeral=True)
-                    return
+            if not result:
+                logger.error("No playlists found in the database.")
+                await interaction.followup.send("No playlists found in the database.", ephemeral=True)
+                return
 
-                logger.info(f"Playlist: Found random playlist {result[1]} ({result[0]})")
+            logger.info(f"Playlist: Found random playlist {result[1]} ({result[0]})")
         else:
-            with sqlcon.cursor() as cursor:
-                if search.startswith("PL") and " " not in search:
-                    # Choice returns the playlist ID
-                    logger.info(f"Playlist: Searching for playlist ID {search}")
-                    cursor.execute("SELECT * FROM pepper.raocow_playlists WHERE playlist_id = %s and visible = 'true'", (search,))
-                else:
-                    # Search for the playlist title
-                    logger.info(f"Playlist: Searching for playlist title matching {search}")
-                    cursor.execute("SELECT * FROM pepper.raocow_playlists WHERE title ILIKE %s and visible = 'true' order by datestamp desc", (search,))
-                result = cursor.fetchone()
+            if search.startswith("PL") and " " not in search:
+                # Choice returns the playlist ID
+                logger.info(f"Playlist: Searching for playlist ID {search}")
+                result = await asyncdb.run("SELECT * FROM pepper.raocow_playlists WHERE playlist_id = %s and visible = 'true'", (search,), fetch='one')
+            else:
+                # Search for the playlist title
+                logger.info(f"Playlist: Searching for playlist title matching {search}")
+                result = await asyncdb.run("SELECT * FROM pepper.raocow_playlists WHERE title ILIKE %s and visible = 'true' order by datestamp desc", (search,), fetch='one')
 
-                if not result:
-                    logger.error(f"No playlists found matching {search}")
-                    await interaction.followup.send("No playlists found.",ephemeral=True)
-                    return
+            if not result:
+                logger.error(f"No playlists found matching {search}")
+                await interaction.followup.send("No playlists found.",ephemeral=True)
+                return
 
         # Format the results
         id, title, datestamp, length, duration, visibility, thumbnail, game_link, latest_video, alias, series, channel_id = result
@@ -252,25 +229,22 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
         """Edit a playlist in Pepper's database with new information."""
         await interaction.response.defer(thinking=True,ephemeral=True)
 
-        if not sqlcon:
+        if not await asyncdb.available():
             await interaction.followup.send("Database connection is not available.",ephemeral=True)
             return
 
         search_result = None
 
-        with sqlcon.cursor() as cursor:
-            # Update the playlist in the database
-            cursor.execute(f'''
-                UPDATE pepper.raocow_playlists
-                SET title = COALESCE(%s, title),
-                    datestamp = COALESCE(%s, datestamp),
-                    visible = COALESCE(%s, visible),
-                    game_link = COALESCE({"E%s" if new_game_link else "%s"}, game_link)
-                WHERE playlist_id = %s
-                RETURNING *
-            ''', (new_title, new_datestamp, visible, new_game_link, search))
-            sqlcon.commit()
-            search_result = cursor.fetchone()
+        # Update the playlist in the database
+        search_result = await asyncdb.run(f'''
+            UPDATE pepper.raocow_playlists
+            SET title = COALESCE(%s, title),
+                datestamp = COALESCE(%s, datestamp),
+                visible = COALESCE(%s, visible),
+                game_link = COALESCE({"E%s" if new_game_link else "%s"}, game_link)
+            WHERE playlist_id = %s
+            RETURNING *
+        ''', (new_title, new_datestamp, visible, new_game_link, search), fetch='one')
 
         id, new_title, datestamp, length, duration, visibility, thumbnail, game_link, latest_video, alias, series, channel_id = search_result
 
@@ -288,13 +262,11 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
         """Get a list of playlists for a specific series."""
         await interaction.response.defer(thinking=True,ephemeral=not public)
 
-        if not sqlcon:
+        if not await asyncdb.available():
             await interaction.followup.send("Database connection is not available.",ephemeral=not public)
             return
 
-        with sqlcon.cursor() as cursor:
-            cursor.execute("SELECT * FROM pepper.raocow_playlists WHERE series = %s and visible = 'true' ORDER BY datestamp ASC", (series_name,))
-            results = cursor.fetchall()
+        results = await asyncdb.run("SELECT * FROM pepper.raocow_playlists WHERE series = %s and visible = 'true' ORDER BY datestamp ASC", (series_name,), fetch='all')
 
         if not results:
             await interaction.followup.send(f"No playlists found for series '{series_name}'.",ephemeral=not public)
@@ -423,7 +395,7 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
             channel_id = None
 
             # Fetch playlist from database
-            with sqlcon.cursor() as cursor:
+            with pool.cursor(autocommit=True) as cursor:
                 cursor.execute("SELECT * FROM pepper.raocow_playlists WHERE playlist_id = %s", (playlist_id,))
                 result = cursor.fetchone()
                 pl_id, title, datestamp, length, duration, visibility, thumbnail, game_link, latest_video, alias, series, channel_id = result
@@ -538,7 +510,6 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
                                     ) AS sub
                                     WHERE pepper.raocow_playlists.playlist_id = sub.playlist_id
                                     ''', (playlist_id,))
-                    sqlcon.commit()
                     logger.info(f"Inserted playlist {playlist_id} into database.")
                 except Exception as e:
                     logger.error(f"Error processing playlist {playlist_id}: {e}", e, exc_info=True)
@@ -551,7 +522,7 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
                 playlists = ytc.get_playlists(channel_id=channel_id, count=playlist_count, return_json=True)
 
                 # Store the playlists in the database
-                with sqlcon.cursor() as cursor:
+                with pool.cursor(autocommit=True) as cursor:
                     for item in playlists['items']:
                         # Skip existing playlists
                         if skip_existing:
@@ -680,7 +651,6 @@ class Raocmds(commands.GroupCog, group_name="raocow"):
                                            ) AS sub
                                            WHERE pepper.raocow_playlists.playlist_id = sub.playlist_id
                                            ''', (playlist_id,))
-                            sqlcon.commit()
                             logger.info(f"Inserted playlist {playlist_id} into database.")
                         except Exception as e:
                             logger.error(f"Error processing playlist {playlist_id}: {e}", e, exc_info=True)
@@ -0,0 +1,5 @@
+-- Byte offset of pepper.ap_all_rooms.last_line in the room's log, so a restarted tracker
+-- can ask the server for just the rest of it. Run once, as the table's owner:
+--     psql -f migrations/001_ap_all_rooms_log_offset.sql
+-- Trackers check for the column on startup and go by line count alone until it's there.
+ALTER TABLE pepper.ap_all_rooms ADD COLUMN IF NOT EXISTS log_offset bigint;
@@ -9,6 +9,8 @@ import yaml
 from discord import app_commands
 from discord.ext import commands
 
+from cmds.db_helpers import asyncdb
+
 # setup logging
 logger = logging.getLogger('discord')
 handler = logging.StreamHandler()
@@ -26,6 +28,12 @@ with open('config.yaml', 'r', encoding='UTF-8') as file:
 # configure subscribed intents
 intents = discord.Intents.default()
 
+class SplatTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Runs before every command and autocomplete, so database time can be put down to the right one
+        asyncdb.begin_command(interaction)
+        return True
+
 class Splatbot(commands.Bot):
     procs: dict = {}
     extras: dict = {}
@@ -34,6 +42,7 @@ class Splatbot(commands.Bot):
         super().__init__(
             command_prefix="!",
             intents=intents,
+            tree_cls=SplatTree,
             allowed_contexts=app_commands.AppCommandContext(guild=True, dm_channel=True, private_channel=True),
             allowed_installs=app_commands.AppInstallationType(guild=True, user=True)
         )
@@ -44,6 +53,14 @@ class Splatbot(commands.Bot):
         self.tree.add_command(settings)
         await self.tree.sync()
 
+    async def close(self) -> None:
+        # Cogs are unloaded on reload too, so the itemlog workers are only stopped here, when we're shutting down
+        supervisor = self.extras.get('ap_supervisor')
+        if supervisor is not None:
+            logger.info("Stopping itemlog workers.")
+            await asyncio.to_thread(supervisor.stop_all)
+        await super().close()
+
     def to_thread(self, func: typing.Callable) -> typing.Coroutine:
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):